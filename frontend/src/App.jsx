@@ -1,6 +1,15 @@
 import { useState, useEffect, useRef } from "react";
 import { marked } from "marked";
 
+// Placeholder text shown while the server works on an answer
+const STAGE_LABELS = {
+  loading: "Starting up...",
+  rewriting: "Reading your question...",
+  routing: "Reading your question...",
+  retrieving: "Searching the club's knowledge base...",
+  generating: "Writing the answer...",
+};
+
 function App() {
   // 'useState' is a React Hook to manage data that changes over time.
   // 'messages' will hold our array of chat messages.
@@ -13,6 +22,9 @@ function App() {
   // 'input' will hold the text the user is currently typing.
   const [input, setInput] = useState("");
   const messagesEndRef = useRef(null);
+  // The server keeps the conversation under this id, so each request only
+  // carries the new question instead of the whole history.
+  const sessionId = useRef(crypto.randomUUID());
 
   // This function automatically scrolls the chat to the latest message.
   const scrollToBottom = () => {
@@ -46,31 +58,57 @@ function App() {
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           question: input,
-          // *** THE FIX IS HERE ***
-          // Send the complete history UP TO the user's current question.
-          chat_history: updatedMessagesWithUser.map((msg) => ({
-            role: msg.role === "user" ? "human" : "ai",
-            content: msg.content,
-          })),
+          session_id: sessionId.current,
         }),
       });
 
+      // Errors are sent as an "error" event (a busy server answers 429 with one);
+      // anything else that is not an event stream is reported as a failure
+      if (!response.ok && !response.headers.get("content-type")?.startsWith("text/event-stream")) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
       let fullResponse = "";
+      let buffer = "";
 
+      // Replace the content of the last message (the bot's placeholder)
+      const showInBubble = (content) => {
+        setMessages((currentMessages) => {
+          const updatedMessages = [...currentMessages];
+          updatedMessages[updatedMessages.length - 1].content = content;
+          return updatedMessages;
+        });
+      };
+
+      // The server sends server-sent events: "event: <kind>\ndata: <json>\n\n"
       while (true) {
         const { value, done } = await reader.read();
         if (done) break;
 
-        fullResponse += decoder.decode(value);
+        buffer += decoder.decode(value, { stream: true });
+        const blocks = buffer.split("\n\n");
+        buffer = blocks.pop(); // Keep the incomplete event for the next read
 
-        // Update the last message (the bot's placeholder) with the streaming content
-        setMessages((currentMessages) => {
-          const updatedMessages = [...currentMessages];
-          updatedMessages[updatedMessages.length - 1].content = fullResponse;
-          return updatedMessages;
-        });
+        for (const block of blocks) {
+          let event = "message";
+          let data = null;
+          for (const line of block.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data = JSON.parse(line.slice(6));
+          }
+          if (data === null) continue; // Keep-alive comment
+
+          if (event === "stage" && !fullResponse) {
+            showInBubble(STAGE_LABELS[data.stage] ?? "...");
+          } else if (event === "token") {
+            fullResponse += data.text;
+            showInBubble(fullResponse);
+          } else if (event === "error") {
+            showInBubble(data.message);
+          }
+        }
       }
     } catch (error) {
       console.error("Failed to fetch chat response:", error);
@@ -1,20 +1,35 @@
 import asyncio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware # Import the middleware
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 # Import your chatbot logic
-from src.r41_bot.chains import build_rag_chain, build_router_chain, build_query_rewriter_chain
-from src.r41_bot.retriever import get_retriever
+from src.r41_bot.admission import ADMISSION, LLMBusy
+from src.r41_bot.config import RETRIEVER_K, WARMUP_ON_STARTUP
+from src.r41_bot.faq_fastpath import fastpath_metrics
+from src.r41_bot.registry import Registry
+from src.r41_bot.metrics import render_metrics
+from src.r41_bot.sessions import get_session_store
+from src.r41_bot.sse import STAGE, TOKEN, format_event, with_heartbeats
 
 # --- 1. Initialize Chatbot Components ---
-# This is done once when the server starts
-retriever = get_retriever(k=6)
-rag_chain = build_rag_chain(retriever)
-router_chain = build_router_chain()
-rewriter_chain = build_query_rewriter_chain()
+# Components (LLM client, embedder, indexes) are built lazily by the registry,
+# in a background warm-up task started with the server, so importing this
+# module and (re)starting uvicorn stay fast.
+registry = Registry(k=RETRIEVER_K)
+# Conversation turns of clients that send a session_id (see ChatRequest)
+sessions = get_session_store()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up = asyncio.create_task(registry.warm_up()) if WARMUP_ON_STARTUP else None
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
 
 # --- 2. Define API Data Models ---
 class ChatMessage(BaseModel):
@@ -22,11 +37,18 @@ class ChatMessage(BaseModel):
     content: str
 
 class ChatRequest(BaseModel):
+    """
+    Either send the whole `chat_history` with every question (stateless), or
+    a `session_id` and only the new question: the server then keeps the
+    history itself and the request stays the same size however long the
+    conversation gets.
+    """
     question: str
-    chat_history: List[ChatMessage]
+    chat_history: List[ChatMessage] = []
+    session_id: Optional[str] = Field(default=None, max_length=128)
 
 # --- 3. Create FastAPI App ---
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # --- ADD THIS SECTION FOR CORS ---
 # This allows your React frontend (running on port 5173) to make requests to this backend.
@@ -40,36 +62,117 @@ app.add_middleware(
 # ---------------------------------
 
 # --- 4. Define the Streaming Chat Endpoint ---
-async def chat_stream_generator(request: ChatRequest):
+def busy_event(retry_after: float) -> str:
+    """SSE error event for a question the LLM had no capacity for (see admission.py)."""
+    return format_event("error", {
+        "message": "We're getting a lot of questions right now. Please try again in a moment.",
+        "status": 429,
+        "retry_after": round(retry_after, 1),
+    })
+
+async def chat_events(request: ChatRequest):
     """
     This generator function handles the core logic of rewriting, routing,
-    and invoking the RAG chain, yielding tokens as they are generated.
+    and invoking the RAG chain, yielding SSE events as it goes:
+
+    - `stage`: {"stage": "loading" | "rewriting" | "routing" | "retrieving" | "generating"}
+    - `token`: {"text": ...}, a piece of the answer
+    - `done`: {"total_ms", "ttft_ms", "stages": {stage: ms}}
+    - `error`: {"message": ...}; with "status": 429 and "retry_after" (seconds)
+      when the LLM had no capacity in time (admission control, see admission.py)
+
+    Every step is awaited, so the event loop keeps serving other requests
+    while Gemini and the retriever are working.
     """
+    start = time.perf_counter()
     q = request.question
-    # Pydantic v2+ requires .model_dump() instead of .dict()
-    chat_history = [msg.model_dump() for msg in request.chat_history]
-
-    # --- THIS IS THE UPDATED LOGIC ---
-    # Rewrite the question, now WITH history
-    rewritten_q = rewriter_chain.invoke({"question": q, "chat_history": chat_history})
-    
-    # Route the question, also WITH history
-    route_decision = router_chain.invoke({"question": rewritten_q, "chat_history": chat_history})
-    route = route_decision.get("route")
-    # ---------------------------------
-
-    if route == "irrelevant":
-        yield "I can only answer questions about the R41 club. How can I help you with that?"
+    session_id = request.session_id
+
+    stages = {}
+    current, current_start = None, start
+
+    def enter(stage):
+        nonlocal current, current_start
+        now = time.perf_counter()
+        if current is not None:
+            stages[current] = round((now - current_start) * 1000, 1)
+        current, current_start = stage, now
+
+    if not registry.status()["ready"]:
+        enter("loading")
+        yield format_event("stage", {"stage": "loading"})
+    pipeline = await registry.apipeline()
+
+    history_offset = None
+    if session_id is not None:
+        history_offset, chat_history = await asyncio.to_thread(sessions.get_window, session_id)
+    else:
+        # Pydantic v2+ requires .model_dump() instead of .dict()
+        chat_history = [msg.model_dump() for msg in request.chat_history]
+
+    chunks = []
+    ttft = None
+    try:
+        async for kind, data in pipeline.aevents(q, chat_history, session_id=session_id, history_offset=history_offset):
+            if kind == STAGE:
+                enter(data)
+                yield format_event("stage", {"stage": data})
+            elif kind == TOKEN:
+                if ttft is None:
+                    ttft = round((time.perf_counter() - start) * 1000, 1)
+                chunks.append(data)
+                yield format_event("token", {"text": data})
+    except LLMBusy as e:
+        print(f"[Chat request rejected: {e}]")
+        yield busy_event(e.retry_after)
+        return
+    except Exception as e:
+        print(f"[Chat request failed: {e}]")
+        yield format_event("error", {"message": "Something went wrong while answering. Please try again."})
         return
+    enter(None)
 
-    if route == "vector_search":
-        # Use .astream() for asynchronous streaming
-        # The RAG chain already correctly receives the history
-        async for chunk in rag_chain.astream({"question": rewritten_q, "chat_history": chat_history}):
-            yield chunk
+    # Only completed turns are recorded (a disconnect closes the generator before this)
+    if session_id is not None:
+        await asyncio.to_thread(sessions.append_turn, session_id, q, "".join(chunks))
+
+    total = round((time.perf_counter() - start) * 1000, 1)
+    yield format_event("done", {"total_ms": total, "ttft_ms": ttft, "stages": stages})
 
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest):
-    return StreamingResponse(chat_stream_generator(request), media_type="text/event-stream")
+    if ADMISSION.saturated():
+        # The LLM queue is full: fail fast rather than open a stream that would wait.
+        # Still an event stream, so the chat UI shows the message like any other error
+        retry_after = ADMISSION.retry_after()
+        return PlainTextResponse(
+            busy_event(retry_after),
+            status_code=429,
+            media_type="text/event-stream",
+            headers={"Retry-After": str(retry_after), "Cache-Control": "no-cache"},
+        )
+    # Starlette cancels the response when the client disconnects; with_heartbeats
+    # then cancels the pipeline step in flight (and the Gemini stream with it).
+    return StreamingResponse(
+        with_heartbeats(chat_events(request)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/ready")
+async def ready_endpoint():
+    """Readiness probe: 200 once every component is loaded, 503 before that."""
+    status = registry.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/faq/metrics")
+async def faq_metrics_endpoint():
+    """Hit rate of the FAQ fast path and the latency it saved."""
+    return fastpath_metrics()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Per-stage latency, token and cache metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
-# The old static file serving logic has been removed, as the Vite server now handles the frontend.
\ No newline at end of file
+# The old static file serving logic has been removed, as the Vite server now handles the frontend.
@@ -0,0 +1,94 @@
+"""
+Compares the three-chain pre-pass (rewriter -> router -> decomposition) with the
+single-pass planner, using the scripted fake LLM (see fake_llm.py): it
+records every prompt and sleeps a fixed latency per call.
+
+Usage: python scripts/bench_planner.py [--latency 0.3]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain.docstore.document import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.r41_bot import chains
+from src.r41_bot.chains import estimate_tokens
+from src.r41_bot.fake_llm import ScriptedChatModel
+from src.r41_bot.pipeline import ChatPipeline
+
+QUESTIONS = [
+    "who is the current president?",
+    "what formations happened last year and who mentored them?",
+    "how do I join the club?",
+]
+
+HISTORY = [
+    {"role": "user", "content": "what is R41?"},
+    {"role": "assistant", "content": "R41 is the robotics and AI club of ENSA Berrechid."},
+]
+
+
+# The fake LLM's replies, by prompt kind (see fake_llm.PROMPT_KINDS)
+REPLIES = {
+    "plan": '{"question": "who is the president for 2025-2026?", "route": "vector_search", "questions": ["Who is the president for 2025-2026?"]}',
+    "rewrite": "who is the president for 2025-2026?",
+    "route": '{"route": "vector_search"}',
+    "decomposition": '{"questions": ["Who is the president for 2025-2026?"]}',
+    "answer": "The president for 2025-2026 is listed in the bureau file.",
+}
+
+
+class StaticRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager):
+        return [Document(page_content="- **President** ...")]
+
+
+async def run_mode(planner: bool, latency: float) -> dict:
+    llm = ScriptedChatModel(latency=latency, token_delay=0, replies=REPLIES)
+    chains.get_llm = lambda: llm
+    pipeline = ChatPipeline(StaticRetriever(), planner=planner)
+
+    ttfts, totals = [], []
+    for q in QUESTIONS:
+        start = time.perf_counter()
+        first = None
+        async for _ in pipeline.astream(q, HISTORY):
+            if first is None:
+                first = time.perf_counter() - start
+        ttfts.append(first)
+        totals.append(time.perf_counter() - start)
+
+    n = len(QUESTIONS)
+    return {
+        "llm_calls_per_question": len(llm.prompts) / n,
+        "prompt_tokens_per_question": sum(estimate_tokens(p) for p in llm.prompts) / n,
+        "ttft_s": sum(ttfts) / n,
+        "total_s": sum(totals) / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake LLM latency per call (seconds)")
+    args = parser.parse_args()
+
+    results = {
+        "three-chain": asyncio.run(run_mode(planner=False, latency=args.latency)),
+        "planner": asyncio.run(run_mode(planner=True, latency=args.latency)),
+    }
+
+    print(f"{'mode':<12} {'calls/q':>8} {'prompt tok/q':>13} {'TTFT (s)':>9} {'total (s)':>10}")
+    for mode, r in results.items():
+        print(
+            f"{mode:<12} {r['llm_calls_per_question']:>8.1f} {r['prompt_tokens_per_question']:>13.0f}"
+            f" {r['ttft_s']:>9.2f} {r['total_s']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
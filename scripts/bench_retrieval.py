@@ -0,0 +1,246 @@
+"""
+Offline retrieval benchmark: quality and latency of the hybrid retriever
+over data/knowledge_base for a labeled query set.
+
+Each query in data/eval/retrieval_queries.jsonl names the knowledge-base file
+that answers it and a string the answering chunk contains. A retrieved
+document is relevant if it comes from that file and contains the string.
+For every configuration the script reports recall@k, MRR@k, the mean size
+of the top-k context sent to the LLM and the p50/p95 latency of one
+retrieval (query embedding + dense + BM25 + fusion).
+
+It also checks the relevance floor (RETRIEVAL_SCORE_FLOOR): `early_exits`
+counts labeled queries left with no chunk (they would get the canned "no
+info" reply, so it must stay 0), and `rejected` the share of the
+UNANSWERABLE questions that do get it. Raise the floor while early_exits
+stays 0.
+
+Configurations vary one knob at a time from the defaults used by
+get_retriever: ensemble weights, k, heading-aware vs character chunking,
+chunk size, BM25 over chunks vs over whole files, category/academic-year
+pre-filtering and the score thresholds. Each configuration
+is indexed in memory (NumPy dense index, exact search) so nothing is written
+to the live index; `--live` also runs get_retriever itself on the published
+index.
+
+Runs offline with the local FastEmbed model (it must be in the FastEmbed
+cache); `--embedding fake` uses deterministic random embeddings instead,
+which only makes the BM25 side meaningful but needs no model.
+
+Usage: python scripts/bench_retrieval.py [--configs default k=3 ...] [--live] [--output results.json]
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import TextLoader
+
+from src.r41_bot.bm25_index import BM25Index, BM25IndexRetriever
+from src.r41_bot.config import RETRIEVAL_SCORE_FLOOR, RETRIEVAL_SCORE_GAP
+from src.r41_bot.chunking import split_documents
+from src.r41_bot.dense_index import DenseIndex
+from src.r41_bot.metadata import extract_filters, path_metadata
+from src.r41_bot.retriever import HybridRetriever, embed_queries
+
+KNOWLEDGE_BASE_DIR = os.path.join(ROOT, "data", "knowledge_base")
+QUERIES_PATH = os.path.join(ROOT, "data", "eval", "retrieval_queries.jsonl")
+
+DEFAULT = {
+    "weights": [0.5, 0.5], "k": 3, "chunker": "markdown", "chunk_size": 1000, "bm25": "chunks", "filters": True,
+    "score_floor": RETRIEVAL_SCORE_FLOOR, "score_gap": RETRIEVAL_SCORE_GAP,
+}
+
+# name -> overrides of DEFAULT
+CONFIGS = {
+    "default": {},
+    "dense_only": {"weights": [1.0, 0.0]},
+    "bm25_only": {"weights": [0.0, 1.0]},
+    "dense_0.7": {"weights": [0.7, 0.3]},
+    "dense_0.3": {"weights": [0.3, 0.7]},
+    "k=2": {"k": 2},
+    "k=6": {"k": 6},
+    "recursive": {"chunker": "recursive"},
+    "recursive_k=6": {"chunker": "recursive", "k": 6},
+    "chunk=300": {"chunker": "recursive", "chunk_size": 300},
+    "chunk=500": {"chunker": "recursive", "chunk_size": 500},
+    "chunk=2000": {"chunker": "recursive", "chunk_size": 2000},
+    "bm25_files": {"bm25": "files"},
+    "no_filters": {"filters": False},
+    "no_thresholds": {"score_floor": 0.0, "score_gap": 1.0},
+    "floor=0.1": {"score_floor": 0.1},
+}
+
+# Questions the knowledge base has no answer to
+UNANSWERABLE = [
+    "Did the club win a robotics competition in 2019?",
+    "When is the next hackathon?",
+    "Who is the dean of ENSA?",
+    "What is the weather in Berrechid?",
+    "How do I apply for a scholarship abroad?",
+    "What is the club's budget?",
+]
+
+
+def load_queries(path: str = QUERIES_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_files() -> list:
+    paths = sorted(glob.glob(os.path.join(KNOWLEDGE_BASE_DIR, "**", "*.md"), recursive=True))
+    files = [doc for p in paths for doc in TextLoader(p, encoding="utf-8").load()]
+    for doc in files:
+        doc.metadata.update(path_metadata(doc.metadata["source"], doc.page_content))
+    return files
+
+
+def split(files: list, chunker: str, chunk_size: int) -> list:
+    if chunker == "markdown":
+        # Same chunker as scripts/index_faq.py; chunk_size caps oversized entries
+        return split_documents(files, chunk_size)
+    # The former character splitter, overlap scaled with the chunk size
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_size // 10)
+    return splitter.split_documents(files)
+
+
+def get_benchmark_embedding(kind: str):
+    if kind == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=384)
+    from src.r41_bot.retriever import BatchingEmbedder, get_embedding
+    embedding = get_embedding()
+    # Time the model itself, not the query-vector cache
+    return embedding.embedding if isinstance(embedding, BatchingEmbedder) else embedding
+
+
+def is_relevant(doc, query: dict) -> bool:
+    source = doc.metadata.get("source", "").replace(os.sep, "/")
+    return source.endswith(query["source"]) and query["expect"].lower() in doc.page_content.lower()
+
+
+def evaluate(retriever, queries: list, k: int, repeat: int = 1, filters: bool = True) -> dict:
+    """
+    recall@k, MRR@k, context size, early exits and single-retrieval latency
+    percentiles over `queries`.
+    """
+    hits, reciprocal_ranks, latencies, context_chars, early_exits = 0, [], [], [], 0
+    for query in queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            question_filters = extract_filters(query["question"]) if filters else None
+            docs = retriever.rank_many([query["question"]], question_filters)
+            latencies.append((time.perf_counter() - start) * 1000)
+        ranks = [i for i, doc in enumerate(docs[:k], start=1) if is_relevant(doc, query)]
+        context_chars.append(sum(len(doc.page_content) for doc in docs[:k]))
+        early_exits += not docs
+        hits += bool(ranks)
+        reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+
+    latencies.sort()
+    return {
+        "recall_at_k": hits / len(queries),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "context_chars": statistics.mean(context_chars),
+        "early_exits": early_exits,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+        "misses": [q["question"] for q, rr in zip(queries, reciprocal_ranks) if rr == 0],
+    }
+
+
+def rejected_share(retriever, questions: list = UNANSWERABLE, filters: bool = True) -> float:
+    """Share of `questions` for which nothing clears the relevance floor."""
+    rejected = 0
+    for question in questions:
+        rejected += not retriever.rank_many([question], extract_filters(question) if filters else None)
+    return rejected / len(questions)
+
+
+class Corpus:
+    """Chunks and their embeddings per chunk size, computed once per run."""
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+        self.files = load_files()
+        self._chunks = {}
+
+    def chunks(self, chunker: str, chunk_size: int):
+        key = (chunker, chunk_size)
+        if key not in self._chunks:
+            chunks = split(self.files, chunker, chunk_size)
+            vectors = self.embedding.embed_documents([c.page_content for c in chunks])
+            self._chunks[key] = (chunks, vectors)
+        return self._chunks[key]
+
+
+def build_retriever(corpus: Corpus, config: dict) -> HybridRetriever:
+    chunks, vectors = corpus.chunks(config["chunker"], config["chunk_size"])
+    dense = DenseIndex.build(chunks, vectors, [str(i) for i in range(len(chunks))])
+    bm25_docs = chunks if config["bm25"] == "chunks" else corpus.files
+    keyword = BM25IndexRetriever(index=BM25Index.build(bm25_docs), k=config["k"])
+    return HybridRetriever(
+        vectorstore=dense,
+        keyword_retriever=keyword,
+        embedding=corpus.embedding,
+        k=config["k"],
+        weights=config["weights"],
+        score_floor=config["score_floor"],
+        score_gap=config["score_gap"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency.")
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument("--embedding", choices=["fastembed", "fake"], default="fastembed")
+    parser.add_argument("--queries", default=QUERIES_PATH, help="Labeled query set (JSONL)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed retrievals per query")
+    parser.add_argument("--live", action="store_true", help="Also evaluate get_retriever on the live index")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    corpus = Corpus(get_benchmark_embedding(args.embedding))
+    # Load the model and warm up ONNX before timing anything
+    embed_queries(corpus.embedding, ["warm up"])
+
+    results = []
+    for name in args.configs:
+        config = {**DEFAULT, **CONFIGS[name]}
+        retriever = build_retriever(corpus, config)
+        row = {"config": name, **config, "chunks": len(corpus.chunks(config["chunker"], config["chunk_size"])[0])}
+        row.update(evaluate(retriever, queries, config["k"], args.repeat, config["filters"]))
+        row["rejected"] = rejected_share(retriever, filters=config["filters"])
+        results.append(row)
+
+    if args.live:
+        from src.r41_bot.retriever import get_retriever
+        retriever = get_retriever(DEFAULT["k"])
+        row = {"config": "live", "k": DEFAULT["k"]}
+        row.update(evaluate(retriever, queries, DEFAULT["k"], args.repeat))
+        row["rejected"] = rejected_share(retriever)
+        results.append(row)
+
+    for row in results:
+        print(
+            f"{row['config']:<14} recall@{row['k']:<2} {row['recall_at_k']:.3f}  MRR {row['mrr']:.3f}  "
+            f"context {row['context_chars']:>5.0f} chars  "
+            f"early exits {row['early_exits']}  rejected {row['rejected']:.2f}  "
+            f"p50 {row['p50_ms']:.2f} ms  p95 {row['p95_ms']:.2f} ms"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"embedding": args.embedding, "queries": len(queries), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Tracks API startup cost: import time of main.py, component load time, and
+latency of the first /chat request on a cold process.
+
+The first-request measurement runs the real pipeline, so it needs the
+embedding model and GOOGLE_API_KEY; use --skip-request to only time imports
+and warm-up.
+
+Usage: python scripts/bench_startup.py [--runs 5] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def measure_import(runs: int) -> list:
+    """Imports main.py in fresh interpreters so nothing is cached between runs."""
+    times = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def measure_first_request(question: str) -> dict:
+    from fastapi.testclient import TestClient
+    import main
+
+    # No lifespan: the request itself pays for loading the components
+    client = TestClient(main.app)
+    start = time.perf_counter()
+    first_byte = None
+    with client.stream("POST", "/chat", json={"question": question, "chat_history": []}) as response:
+        for _ in response.iter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return {
+        "first_byte_s": first_byte,
+        "total_s": total,
+        "component_load_s": main.registry.status()["load_seconds"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API import time and first-request latency.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of cold imports to time")
+    parser.add_argument("--question", default="who is the president of the club?")
+    parser.add_argument("--skip-request", action="store_true", help="Only time imports")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    import_times = measure_import(args.runs)
+    results = {
+        "import_main_s": {
+            "median": statistics.median(import_times),
+            "min": min(import_times),
+            "max": max(import_times),
+        }
+    }
+    if not args.skip_request:
+        results["first_request"] = measure_first_request(args.question)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmarks the dense search backends (Chroma vs the in-process NumPy
+DenseIndex) at 1x, 10x and 100x the current knowledge base.
+
+The corpus is the knowledge base chunked the same way as the indexer,
+replicated to each scale, with random unit vectors standing in for the
+embeddings (search cost doesn't depend on their values). Each backend is
+loaded and queried in a fresh subprocess so memory numbers are isolated.
+
+Usage: python scripts/bench_vector_backend.py [--scales 1 10 100] [--queries 200]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+DIM = 384
+K = 6
+SUB_QUESTIONS = 4
+
+
+def rss_mb() -> float:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def base_chunks() -> list:
+    import glob
+    from langchain_community.document_loaders import TextLoader
+    from src.r41_bot.chunking import split_documents
+    from src.r41_bot.metadata import path_metadata
+
+    paths = sorted(glob.glob(os.path.join(ROOT, "data", "knowledge_base", "**", "*.md"), recursive=True))
+    docs = [doc for p in paths for doc in TextLoader(p, encoding="utf-8").load()]
+    # One chunk per entry, with the filter metadata, as in scripts/index_faq.py
+    for doc in docs:
+        doc.metadata.update(path_metadata(os.path.relpath(doc.metadata["source"], ROOT), doc.page_content))
+    return split_documents(docs)
+
+
+def build(scale: int, directory: str):
+    """Writes the scaled corpus as both a Chroma store and a DenseIndex."""
+    from langchain_chroma import Chroma
+    from src.r41_bot.dense_index import DenseIndex, DENSE_DIR
+
+    chunks = base_chunks() * scale
+    ids = [f"c{i}" for i in range(len(chunks))]
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(len(chunks), DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    DenseIndex.build(chunks, vectors, ids).save(os.path.join(directory, DENSE_DIR))
+
+    store = Chroma(persist_directory=os.path.join(directory, "chroma"), collection_metadata={"hnsw:space": "cosine"})
+    batch = 4000
+    for start in range(0, len(chunks), batch):
+        store._collection.add(
+            ids=ids[start:start + batch],
+            embeddings=vectors[start:start + batch].tolist(),
+            documents=[c.page_content for c in chunks[start:start + batch]],
+            metadatas=[c.metadata for c in chunks[start:start + batch]],
+        )
+    return len(chunks)
+
+
+def measure(backend: str, directory: str, n_queries: int) -> dict:
+    """Runs in a subprocess: loads one backend and times single and batched queries."""
+    before = rss_mb()
+    start = time.perf_counter()
+    if backend == "numpy":
+        from src.r41_bot.dense_index import DenseIndex, DENSE_DIR
+        store = DenseIndex.load(os.path.join(directory, DENSE_DIR))
+    else:
+        from langchain_chroma import Chroma
+        store = Chroma(persist_directory=os.path.join(directory, "chroma"))
+    load_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    queries = rng.normal(size=(n_queries, DIM)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    single = []
+    for q in queries:
+        t = time.perf_counter()
+        store.similarity_search_by_vector(q.tolist(), k=K)
+        single.append((time.perf_counter() - t) * 1000)
+
+    batched = []
+    for i in range(0, n_queries - SUB_QUESTIONS + 1, SUB_QUESTIONS):
+        group = [q.tolist() for q in queries[i:i + SUB_QUESTIONS]]
+        t = time.perf_counter()
+        if backend == "numpy":
+            store.similarity_search_many_by_vector(group, k=K)
+        else:
+            for q in group:
+                store.similarity_search_by_vector(q, k=K)
+        batched.append((time.perf_counter() - t) * 1000)
+
+    single.sort()
+    return {
+        "load_s": load_s,
+        "rss_delta_mb": rss_mb() - before,
+        "query_p50_ms": statistics.median(single),
+        "query_p95_ms": single[int(len(single) * 0.95) - 1],
+        f"batch_of_{SUB_QUESTIONS}_p50_ms": statistics.median(batched),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs the NumPy dense index.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--measure", nargs=2, metavar=("BACKEND", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure[0], args.measure[1], args.queries)))
+        return
+
+    results = []
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as directory:
+            n_chunks = build(scale, directory)
+            for backend in ("chroma", "numpy"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--measure", backend, directory, "--queries", str(args.queries)],
+                    capture_output=True, text=True, check=True,
+                )
+                row = {"scale": scale, "chunks": n_chunks, "backend": backend}
+                row.update(json.loads(out.stdout.strip().splitlines()[-1]))
+                results.append(row)
+                print(
+                    f"{scale:>4}x {n_chunks:>7} chunks  {backend:<7} load {row['load_s']:.3f}s  "
+                    f"RSS +{row['rss_delta_mb']:.1f} MB  p50 {row['query_p50_ms']:.3f} ms  "
+                    f"p95 {row['query_p95_ms']:.3f} ms  batch p50 {row[f'batch_of_{SUB_QUESTIONS}_p50_ms']:.3f} ms"
+                )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
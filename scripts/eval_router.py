@@ -0,0 +1,141 @@
+"""
+Offline evaluation of the local router (src/r41_bot/router.py) against the
+LLM router on the held-out questions of data/eval/route_queries.jsonl.
+
+The local router is trained like scripts/index_faq.py trains it (labeled
+questions of data/router/examples.jsonl + knowledge-base chunks) but in
+memory, so nothing is written to the live index. The script reports:
+
+- local: accuracy and p50/p95 latency of embedding + classification,
+- for each confidence threshold (ROUTER_IRRELEVANT_CONFIDENCE still
+  applies to `irrelevant`): the share of questions deferred to the
+  LLM, the accuracy of the questions kept local, and (with --llm) the
+  accuracy of local + LLM fallback,
+- with --llm: accuracy and p50/p95 latency of the LLM router alone
+  (LLM_PROVIDER selects the model; the fake provider needs no network).
+
+`--embedding fake` (random embeddings, meaningless accuracy) only checks
+that the script runs without the FastEmbed model.
+
+Usage: python scripts/eval_router.py [--llm] [--thresholds 0.6 0.8 0.9] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from scripts.bench_retrieval import get_benchmark_embedding, load_files, split
+from src.r41_bot.router import ROUTE_EXAMPLES_PATH, LocalRouter, load_route_examples
+
+QUERIES_PATH = os.path.join(ROOT, "data", "eval", "route_queries.jsonl")
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9]
+
+
+def percentiles(latencies: list) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+    }
+
+
+def evaluate_local(router: LocalRouter, queries: list) -> list:
+    """[(route, confidence, ms)] per query."""
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        route, confidence = router.route(query["question"])
+        results.append((route, confidence, (time.perf_counter() - start) * 1000))
+    return results
+
+
+def evaluate_llm(queries: list) -> list:
+    """[(route, ms)] per query from the LLM router chain."""
+    from src.r41_bot.chains import build_router_chain
+    chain = build_router_chain()
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        route = chain.invoke({"question": query["question"], "chat_history": []}).get("route")
+        results.append((route, (time.perf_counter() - start) * 1000))
+    return results
+
+
+def threshold_report(router: LocalRouter, queries: list, local: list, llm: list, threshold: float) -> dict:
+    router.threshold = threshold
+    kept = [(q, route) for q, (route, confidence, _) in zip(queries, local) if router.confident(route, confidence)]
+    row = {
+        "threshold": threshold,
+        "deferred": 1 - len(kept) / len(queries),
+        "local_accuracy": sum(route == q["route"] for q, route in kept) / len(kept) if kept else None,
+    }
+    if llm:
+        combined = [
+            route if router.confident(route, confidence) else llm_route
+            for (route, confidence, _), (llm_route, _) in zip(local, llm)
+        ]
+        row["combined_accuracy"] = sum(route == q["route"] for q, route in zip(queries, combined)) / len(queries)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the local router with the LLM router.")
+    parser.add_argument("--queries", default=QUERIES_PATH, help="Held-out labeled questions (JSONL)")
+    parser.add_argument("--examples", default=os.path.join(ROOT, ROUTE_EXAMPLES_PATH), help="Training questions (JSONL)")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=THRESHOLDS)
+    parser.add_argument("--embedding", choices=["fastembed", "fake"], default="fastembed")
+    parser.add_argument("--llm", action="store_true", help="Also run the LLM router (network call per question)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    queries = load_route_examples(args.queries)
+    embedding = get_benchmark_embedding(args.embedding)
+    chunks = split(load_files(), "markdown", 1000)
+    router = LocalRouter.train(embedding, load_route_examples(args.examples), chunks)
+    # Load the model and warm up ONNX before timing anything
+    router.route("warm up")
+
+    local = evaluate_local(router, queries)
+    llm = evaluate_llm(queries) if args.llm else []
+
+    results = {
+        "queries": len(queries),
+        "local": {
+            "accuracy": sum(route == q["route"] for q, (route, _, _) in zip(queries, local)) / len(queries),
+            **percentiles([ms for _, _, ms in local]),
+        },
+        "thresholds": [threshold_report(router, queries, local, llm, t) for t in args.thresholds],
+        "errors": [
+            {"question": q["question"], "expected": q["route"], "local": route, "confidence": round(confidence, 3)}
+            for q, (route, confidence, _) in zip(queries, local) if route != q["route"]
+        ],
+    }
+    if llm:
+        results["llm"] = {
+            "accuracy": sum(route == q["route"] for q, (route, _) in zip(queries, llm)) / len(queries),
+            **percentiles([ms for _, ms in llm]),
+        }
+
+    for name in ("local", "llm"):
+        if name in results:
+            row = results[name]
+            print(f"{name:<6} accuracy {row['accuracy']:.3f}  p50 {row['p50_ms']:.2f} ms  p95 {row['p95_ms']:.2f} ms")
+    for row in results["thresholds"]:
+        local_accuracy = "-" if row["local_accuracy"] is None else f"{row['local_accuracy']:.3f}"
+        combined = f"  combined accuracy {row['combined_accuracy']:.3f}" if "combined_accuracy" in row else ""
+        print(f"threshold {row['threshold']:.2f}  deferred to LLM {row['deferred']:.2f}  local accuracy {local_accuracy}{combined}")
+    for error in results["errors"]:
+        print(f"  miss: {error['question']!r} -> {error['local']} ({error['confidence']}), expected {error['expected']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,106 @@
+"""
+Incrementally indexes data/knowledge_base into the Chroma vector store.
+
+Every file and chunk is content-hashed and recorded in a manifest stored with
+the index. Files are split into one chunk per markdown entry (see
+src/r41_bot/chunking.py). On each run only new or changed chunks are
+embedded, chunks of removed or edited files are deleted, BM25 and NumPy dense
+indexes, the fact table (see src/r41_bot/facts.py) and the local router
+(see src/r41_bot/router.py) are built over the same chunks, and the result is published as a new index generation with an atomic
+swap (see src/r41_bot/index_store.py), so the API never sees a half-built
+store.
+
+Usage: python scripts/index_faq.py [--full]
+"""
+import argparse
+import glob
+import hashlib
 import os
 import shutil
-from dotenv import load_dotenv
-from langchain_community.document_loaders import DirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_community.document_loaders import TextLoader
 from langchain_chroma import Chroma
 from langchain_community.embeddings import FastEmbedEmbeddings
+from langchain.docstore.document import Document
 
-load_dotenv()
+from src.r41_bot.bm25_index import BM25Index, BM25_DIR
+from src.r41_bot.chunking import MAX_CHUNK_CHARS, split_documents
+from src.r41_bot.dense_index import DenseIndex, DENSE_DIR
+from src.r41_bot.facts import FACTS_FILE, extract_facts, save_facts
+from src.r41_bot.router import ROUTE_EXAMPLES_PATH, ROUTER_FILE, LocalRouter, load_route_examples
+from src.r41_bot.config import VECTOR_DIR
+from src.r41_bot.index_store import LEASES_DIR, live_index_dir, read_current, load_manifest, save_manifest, publish
+from src.r41_bot.metadata import path_metadata
 
-VECTOR_DIR = ".chroma"
 KNOWLEDGE_BASE_DIR = "data/knowledge_base"
+# Chunks embedded per FastEmbed call
+EMBED_BATCH_SIZE = 64
+# Bumped whenever chunk contents or metadata change; older indexes are rebuilt in full
+CHUNKING_VERSION = 3
+
+
+def sha256(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_id(source: str, content: str) -> str:
+    """Chunks are identified by their content, so unchanged chunks keep their id."""
+    return sha256(f"{source}\0{content}")[:32]
+
+
+def list_knowledge_files():
+    paths = glob.glob(os.path.join(KNOWLEDGE_BASE_DIR, "**", "*.md"), recursive=True)
+    # POSIX-style relative paths keep the manifest stable across platforms
+    return sorted(os.path.relpath(p).replace(os.sep, "/") for p in paths)
+
+
+def split_file(path: str, max_chars: int = MAX_CHUNK_CHARS):
+    """Loads and splits one file into one chunk per entry; returns {chunk_id: Document}."""
+    documents = TextLoader(path, encoding="utf-8").load()
+    for doc in documents:
+        doc.metadata["source"] = path
+        # category and academic_year, used as retrieval filters
+        doc.metadata.update(path_metadata(path, doc.page_content))
+    chunks = {}
+    for chunk in split_documents(documents, max_chars):
+        chunks[chunk_id(path, chunk.page_content)] = chunk
+    return chunks
+
+
+def plan_changes(old_manifest: dict, max_chars: int = MAX_CHUNK_CHARS):
+    """
+    Compares the knowledge base with the manifest of the live index.
+    Returns (new manifest, chunks to add as {id: Document}, ids to delete).
+    """
+    old_files = old_manifest.get("files", {})
+    new_files = {}
+    new_chunks = {}
+
+    for path in list_knowledge_files():
+        with open(path, "rb") as f:
+            file_hash = sha256(f.read())
+
+        old_entry = old_files.get(path)
+        if old_entry is not None and old_entry["hash"] == file_hash:
+            new_files[path] = old_entry
+            continue
+
+        chunks = split_file(path, max_chars)
+        new_files[path] = {"hash": file_hash, "chunks": sorted(chunks)}
+        new_chunks.update(chunks)
+
+    old_ids = {cid for entry in old_files.values() for cid in entry["chunks"]}
+    new_ids = {cid for entry in new_files.values() for cid in entry["chunks"]}
+
+    to_add = {cid: doc for cid, doc in new_chunks.items() if cid not in old_ids}
+    to_delete = sorted(old_ids - new_ids)
+    return {"chunking": CHUNKING_VERSION, "files": new_files}, to_add, to_delete
 
 
 def main():
@@ -17,39 +108,89 @@ def main():
     Main function to ingest data from the knowledge base directory
     into the Chroma vector store.
     """
+    parser = argparse.ArgumentParser(description="Index the knowledge base into the vector store.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and rebuild from scratch")
+    args = parser.parse_args()
+
     if not os.path.exists(KNOWLEDGE_BASE_DIR):
         print(f"Error: Knowledge base directory not found at '{KNOWLEDGE_BASE_DIR}'")
         return
 
-    # Load all .md files from the knowledge base directory
-    print(f"Loading documents from '{KNOWLEDGE_BASE_DIR}'...")
-    loader = DirectoryLoader(KNOWLEDGE_BASE_DIR, glob="**/*.md", show_progress=True)
-    documents = loader.load()
-    print(f"Loaded {len(documents)} documents.")
+    os.makedirs(VECTOR_DIR, exist_ok=True)
+    # Only generation-based indexes carry a manifest we can build on
+    incremental = read_current(VECTOR_DIR) is not None and not args.full
+    live_dir = live_index_dir(VECTOR_DIR)
+    old_manifest = load_manifest(live_dir) if incremental else {"files": {}}
+    if incremental and old_manifest.get("chunking") != CHUNKING_VERSION:
+        print("The live index was chunked differently, rebuilding it from scratch.")
+        incremental = False
+        old_manifest = {"files": {}}
 
-    # Split documents into smaller chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    splits = text_splitter.split_documents(documents)
-    print(f"Split documents into {len(splits)} chunks.")
+    manifest, to_add, to_delete = plan_changes(old_manifest)
+    print(
+        f"{len(manifest['files'])} files: {len(to_add)} chunks to embed, "
+        f"{len(to_delete)} chunks to delete."
+    )
+
+    if incremental and not to_add and not to_delete and manifest == old_manifest:
+        print("Index is already up to date.")
+        return
+
+    # Build the new generation next to the live one; the live index is never touched
+    generation = f"gen-{time.time_ns()}"
+    new_dir = os.path.join(VECTOR_DIR, generation)
+    if incremental:
+        print(f"Copying live index '{live_dir}' to '{new_dir}'...")
+        # The leases belong to the processes serving the live generation, not to the copy
+        shutil.copytree(live_dir, new_dir, ignore=shutil.ignore_patterns(LEASES_DIR))
+    else:
+        os.makedirs(new_dir)
 
-    # Initialize the embedding model
     print("Initializing embedding model...")
     embeddings = FastEmbedEmbeddings(model_name="BAAI/bge-small-en-v1.5")
+    vectorstore = Chroma(persist_directory=new_dir, embedding_function=embeddings)
 
-    # Delete the old vector store if it exists
-    if os.path.exists(VECTOR_DIR):
-        print(f"Deleting old vector store at '{VECTOR_DIR}'...")
-        shutil.rmtree(VECTOR_DIR)
+    if to_delete:
+        print(f"Deleting {len(to_delete)} stale chunks...")
+        vectorstore.delete(ids=to_delete)
 
-    # Create and persist the new vector store
-    print(f"Creating and persisting vector store at '{VECTOR_DIR}'...")
-    vectorstore = Chroma.from_documents(
-        documents=splits, embedding=embeddings, persist_directory=VECTOR_DIR
-    )
+    ids = list(to_add)
+    for start in range(0, len(ids), EMBED_BATCH_SIZE):
+        batch = ids[start:start + EMBED_BATCH_SIZE]
+        vectorstore.add_documents([to_add[cid] for cid in batch], ids=batch)
+        print(f"Embedded {start + len(batch)}/{len(ids)} chunks")
+
+    # The keyword and in-process dense indexes need no new embeddings, so they
+    # are always rebuilt over every chunk
+    print("Building BM25 and dense indexes...")
+    stored = vectorstore.get(include=["documents", "metadatas", "embeddings"])
+    all_docs = [
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(stored["documents"], stored["metadatas"])
+    ]
+    BM25Index.build(all_docs, ids=stored["ids"]).save(os.path.join(new_dir, BM25_DIR))
+    DenseIndex.build(all_docs, stored["embeddings"], ids=stored["ids"]).save(os.path.join(new_dir, DENSE_DIR))
+    roles, entries = extract_facts(all_docs)
+    save_facts(os.path.join(new_dir, FACTS_FILE), roles, entries)
+    print(f"Fact index: {len(roles)} bureau roles, {len(entries)} formations and events.")
+    if os.path.exists(ROUTE_EXAMPLES_PATH):
+        # Labeled questions + every chunk as on-topic samples, embedded as queries
+        examples = load_route_examples(ROUTE_EXAMPLES_PATH)
+        router = LocalRouter.train(embeddings, examples, all_docs)
+        router.save(os.path.join(new_dir, ROUTER_FILE))
+        print(f"Local router trained on {len(examples)} labeled questions and {len(all_docs)} chunks.")
+    else:
+        print(f"No '{ROUTE_EXAMPLES_PATH}': questions will be routed by the LLM.")
+
+    save_manifest(new_dir, manifest)
+
+    # Atomically switch the API over to the new generation
+    publish(generation, VECTOR_DIR)
 
+    total = sum(len(entry["chunks"]) for entry in manifest["files"].values())
     print("\nIngestion complete!")
-    print(f"Vector store created with {len(splits)} chunks from the knowledge base.")
+    print(f"Live index '{generation}' holds {total} chunks from the knowledge base.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
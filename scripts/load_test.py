@@ -0,0 +1,296 @@
+"""
+Load generator for the /chat API (main.py:app).
+
+Starts the API with the scripted fake LLM (LLM_PROVIDER=fake, see
+src/r41_bot/fake_llm.py) unless --url points at a running server, then runs
+many concurrent simulated conversations against it. Each conversation uses a
+server-side session and asks --turns questions from the labeled retrieval
+query set. Everything except the LLM is real (embedding, retrieval, history,
+SSE), so the numbers measure our own overhead.
+
+Reports throughput, time to first token (first `token` event) and total
+latency percentiles as seen by the clients, plus the CPU and memory of the
+server processes. Memory is reported as RSS and as PSS (proportional set
+size, Linux), which counts pages shared between workers, such as the
+memory-mapped indexes, once.
+
+`--workers 1 2 4` runs the test once per worker count against the
+production launcher (serve.py) to show how the deployment scales.
+
+Usage: python scripts/load_test.py [--conversations 50] [--turns 3] [--concurrency 50] [--workers 1 2 4] [--output load.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+
+QUERIES_PATH = os.path.join(ROOT, "data", "eval", "retrieval_queries.jsonl")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def load_questions() -> list:
+    with open(QUERIES_PATH, encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(int(len(values) * q) - 1, 0)]
+
+
+# --- Server process sampling ---
+
+def _proc_children(pid: int) -> list:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def process_tree(pid: int) -> list:
+    """`pid` and all its descendants (the uvicorn supervisor and its workers)."""
+    pids, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        pids.append(current)
+        queue.extend(_proc_children(current))
+    return pids
+
+
+def _proc_usage(pid: int):
+    """(CPU seconds, RSS in MB, PSS in MB) of one process, from /proc."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    with open(f"/proc/{pid}/statm") as f:
+        rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    pss = rss
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1]) / 1024
+                    break
+    except OSError:
+        pass
+    return cpu, rss, pss
+
+
+def process_usage(pid: int):
+    """Returns (CPU seconds used so far, RSS in MB, PSS in MB) for `pid` and its children."""
+    totals = [0.0, 0.0, 0.0]
+    for p in process_tree(pid):
+        try:
+            usage = _proc_usage(p)
+        except OSError:
+            # Exited between listing and reading
+            continue
+        totals = [t + u for t, u in zip(totals, usage)]
+    return tuple(totals)
+
+
+async def sample_server(pid: int, samples: list, interval: float = 0.5):
+    while True:
+        samples.append((time.perf_counter(), *process_usage(pid)))
+        await asyncio.sleep(interval)
+
+
+def start_server(args, workers: int = None) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKEN_DELAY": str(args.token_delay),
+        # Every request should go through the whole pipeline
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        # Nor share the work of identical concurrent questions (see coalesce.py)
+        "COALESCE_REQUESTS": "true" if args.coalesce else "false",
+    }
+    if workers:
+        command = [sys.executable, "serve.py", "--workers", str(workers), "--port", str(args.port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, timeout: float, workers: int = 1):
+    """Waits until /ready succeeds; with several workers, until `workers` distinct ones did."""
+    deadline = time.perf_counter() + timeout
+    status, ready_pids = None, set()
+    while time.perf_counter() < deadline:
+        try:
+            response = await client.get(f"{url}/ready")
+            status = response.json()
+            if response.status_code == 200:
+                ready_pids.add(status.get("pid"))
+                if len(ready_pids) >= workers:
+                    return status
+                continue
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"Server not ready after {timeout:.0f}s: {status}")
+
+
+# --- Simulated conversations ---
+
+async def ask(client: httpx.AsyncClient, url: str, question: str, session_id: str) -> dict:
+    start = time.perf_counter()
+    ttft = None
+    tokens = 0
+    async with client.stream("POST", f"{url}/chat", json={"question": question, "session_id": session_id}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line == "event: token":
+                tokens += 1
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+            elif line == "event: error":
+                raise RuntimeError("server sent an error event")
+    return {"ttft": ttft, "total": time.perf_counter() - start, "tokens": tokens}
+
+
+async def conversation(client, url, questions, turns, semaphore, results, errors):
+    session_id = str(uuid.uuid4())
+    async with semaphore:
+        for question in random.choices(questions, k=turns):
+            try:
+                results.append(await ask(client, url, question, session_id))
+            except Exception as e:
+                errors.append(repr(e))
+
+
+async def run(args, workers: int = None) -> dict:
+    server = None if args.url else start_server(args, workers)
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        # A fresh connection per /ready probe, so the probes reach every worker
+        async with httpx.AsyncClient(timeout=10, limits=httpx.Limits(max_keepalive_connections=0)) as probe:
+            ready = await wait_ready(probe, url, args.ready_timeout, workers or 1)
+        async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+            pid = server.pid if server else args.server_pid
+
+            questions = load_questions()
+            semaphore = asyncio.Semaphore(args.concurrency)
+            results, errors, samples = [], [], []
+            sampler = asyncio.create_task(sample_server(pid, samples)) if pid else None
+
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                conversation(client, url, questions, args.turns, semaphore, results, errors)
+                for _ in range(args.conversations)
+            ))
+            wall = time.perf_counter() - start
+
+            if sampler is not None:
+                sampler.cancel()
+                samples.append((time.perf_counter(), *process_usage(pid)))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    ttfts = [r["ttft"] for r in results if r["ttft"] is not None]
+    totals = [r["total"] for r in results]
+    report = {
+        "workers": workers or 1,
+        "conversations": args.conversations,
+        "turns": args.turns,
+        "concurrency": args.concurrency,
+        "llm_latency_s": args.llm_latency,
+        "server_load_seconds": ready.get("load_seconds"),
+        "requests": len(results),
+        "errors": len(errors),
+        "wall_s": wall,
+        "throughput_rps": len(results) / wall if wall else 0.0,
+        "ttft_p50_ms": percentile(ttfts, 0.5) * 1000,
+        "ttft_p95_ms": percentile(ttfts, 0.95) * 1000,
+        "total_p50_ms": percentile(totals, 0.5) * 1000,
+        "total_p95_ms": percentile(totals, 0.95) * 1000,
+    }
+    if len(samples) >= 2:
+        (t0, cpu0, _, _), (t1, cpu1, _, _) = samples[0], samples[-1]
+        report["server_cpu_percent"] = 100 * (cpu1 - cpu0) / (t1 - t0)
+        report["server_rss_peak_mb"] = max(rss for _, _, rss, _ in samples)
+        report["server_rss_mean_mb"] = statistics.mean(rss for _, _, rss, _ in samples)
+        report["server_pss_peak_mb"] = max(pss for _, _, _, pss in samples)
+        report["pss_per_worker_mb"] = report["server_pss_peak_mb"] / (workers or 1)
+    if errors:
+        report["first_errors"] = errors[:5]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /chat with simulated conversations.")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3, help="Questions per conversation")
+    parser.add_argument("--concurrency", type=int, default=50, help="Conversations in flight at once")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Fake LLM latency per call (s)")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Fake LLM delay between tokens (s)")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on")
+    parser.add_argument("--coalesce", action="store_true", help="Keep the coalescing of identical concurrent questions on")
+    parser.add_argument("--workers", type=int, nargs="+", help="Spawn serve.py with each of these worker counts in turn")
+    parser.add_argument("--port", type=int, default=0, help="Port for the spawned server (default: a free one)")
+    parser.add_argument("--url", help="Drive an already running server instead of spawning one")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server, for CPU/memory sampling")
+    parser.add_argument("--ready-timeout", type=float, default=180)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.url and args.workers:
+        parser.error("--workers spawns its own servers; it can't be combined with --url")
+
+    reports = []
+    requested_port = args.port
+    for workers in args.workers or [None]:
+        random.seed(args.seed)
+        args.port = requested_port
+        if not args.url and not args.port:
+            with socket.socket() as s:
+                s.bind(("127.0.0.1", 0))
+                args.port = s.getsockname()[1]
+
+        report = asyncio.run(run(args, workers))
+        for key, value in report.items():
+            print(f"{key:<22} {value:.2f}" if isinstance(value, float) else f"{key:<22} {value}")
+        print()
+        reports.append(report)
+
+    if args.workers:
+        print("workers  throughput_rps  ttft_p95_ms  total_p95_ms  pss_per_worker_mb  server_rss_peak_mb")
+        for r in reports:
+            print(
+                f"{r['workers']:>7}  {r['throughput_rps']:>14.2f}  {r['ttft_p95_ms']:>11.0f}  {r['total_p95_ms']:>12.0f}  "
+                f"{r.get('pss_per_worker_mb', 0.0):>17.1f}  {r.get('server_rss_peak_mb', 0.0):>18.1f}"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports if args.workers else reports[0], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
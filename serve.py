@@ -0,0 +1,112 @@
+"""
+Production launcher for the API (main.py:app): several uvicorn workers
+serving one prebuilt, read-only index.
+
+run_dev.py is for development (auto-reload, Vite dev server). This script:
+
+1. checks that the live index generation has the NumPy dense index and the
+   BM25 postings (built by scripts/index_faq.py, once, with --build-index),
+2. makes every worker serve from them (VECTOR_BACKEND=numpy): vectors and
+   postings are memory-mapped read-only, so the workers share one copy in
+   the page cache instead of each running a Chroma client,
+3. gives each worker's embedding session an equal share of the CPU cores
+   (EMBEDDING_THREADS, OMP_NUM_THREADS) so the workers don't oversubscribe
+   the machine,
+4. keeps chat sessions in SQLite (SESSION_STORE=sqlite), so a conversation
+   can continue on any worker,
+5. splits the LLM admission limits (LLM_MAX_CONCURRENCY, LLM_RATE_LIMITS)
+   between the workers: they are set for the whole deployment, but each
+   worker enforces its share on its own (at least one call in flight),
+6. starts uvicorn with --workers and without reload.
+
+Other variables already set in the environment take precedence.
+Measure a deployment with scripts/load_test.py --workers 1 2 4.
+
+Usage: python serve.py [--workers 4] [--host 0.0.0.0] [--port 8000] [--build-index]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+import uvicorn
+
+from src.r41_bot.admission import parse_rate_limits
+from src.r41_bot.bm25_index import BM25_DIR
+from src.r41_bot.config import LLM_MAX_CONCURRENCY, LLM_RATE_LIMITS, VECTOR_DIR
+from src.r41_bot.dense_index import DENSE_DIR
+from src.r41_bot.index_store import live_index_dir, read_current
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def shared_index_ready(vector_dir: str = VECTOR_DIR) -> bool:
+    """Whether the live index generation has the memory-mappable indexes."""
+    if read_current(vector_dir) is None:
+        return False
+    index_dir = live_index_dir(vector_dir)
+    return all(os.path.isdir(os.path.join(index_dir, name)) for name in (DENSE_DIR, BM25_DIR))
+
+
+def worker_environment(workers: int, cpus: int = None) -> dict:
+    """Settings every worker inherits, per-process thread budget included."""
+    cpus = cpus or os.cpu_count() or 1
+    threads = str(max(1, cpus // workers))
+    return {
+        "VECTOR_BACKEND": "numpy",
+        "SESSION_STORE": "sqlite",
+        "EMBEDDING_THREADS": threads,
+        # BLAS threads of the dense matrix multiply
+        "OMP_NUM_THREADS": threads,
+        "OPENBLAS_NUM_THREADS": threads,
+    }
+
+
+def admission_environment(workers: int, max_concurrency: int = LLM_MAX_CONCURRENCY, rate_limits: str = LLM_RATE_LIMITS) -> dict:
+    """Each worker's share of the deployment-wide LLM admission limits."""
+    limits = parse_rate_limits(rate_limits)
+    return {
+        "LLM_MAX_CONCURRENCY": str(max(1, max_concurrency // workers)),
+        "LLM_RATE_LIMITS": ",".join(f"{call_type}={rpm / workers:g}" for call_type, rpm in limits.items()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with several workers sharing one index.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--build-index", action="store_true", help="Run scripts/index_faq.py first")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if args.build_index:
+        subprocess.run([sys.executable, os.path.join(ROOT, "scripts", "index_faq.py")], cwd=ROOT, check=True)
+    if not shared_index_ready():
+        sys.exit(
+            f"No generation index with '{DENSE_DIR}/' and '{BM25_DIR}/' in '{VECTOR_DIR}'. "
+            "Run scripts/index_faq.py (or pass --build-index) first."
+        )
+
+    # Workers are spawned processes: they read their configuration from the environment
+    for name, value in worker_environment(args.workers).items():
+        os.environ.setdefault(name, value)
+    # Always split: the configured limits are for all the workers together
+    os.environ.update(admission_environment(args.workers))
+    print(
+        f"Serving {live_index_dir()} with {args.workers} workers, "
+        f"{os.environ['EMBEDDING_THREADS']} embedding threads each."
+    )
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        # Let streaming answers finish on shutdown
+        timeout_graceful_shutdown=30,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Admission control for the upstream LLM (Gemini).
+
+Every question fans out into several LLM calls (rewrite, route,
+decomposition, generation, sometimes a history summary). Under a burst,
+sending them all upstream at once only earns rate-limit errors, so every
+call of the async path goes through the process-wide ADMISSION controller:
+
+1. a token bucket per call type caps its request rate (LLM_RATE_LIMITS),
+2. a priority semaphore caps the calls in flight (LLM_MAX_CONCURRENCY);
+   waiting calls are served by call type (generation, the answer a student
+   is waiting for, before the pre-pass calls, before background summaries),
+   then in arrival order,
+3. at most LLM_QUEUE_LIMIT calls wait, each for at most LLM_QUEUE_TIMEOUT
+   seconds in total; past that the call fails fast with LLMBusy, which the
+   API reports as 429 / "busy" instead of stalling,
+4. upstream rate-limit errors are retried with full-jitter exponential
+   backoff, outside the semaphore; a stream is only retried before its first
+   chunk.
+
+The call type of an LLM call is the tag of the chain stage it runs in (see
+chains.py); AdmittedChatModel (admitted_llm.py) applies the controller to
+the shared chat model. Kept dependency-free so that main.py can import it.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+
+from .config import (
+    LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES, LLM_QUEUE_LIMIT, LLM_QUEUE_TIMEOUT, LLM_RATE_LIMITS,
+    LLM_RETRY_BASE, LLM_RETRY_MAX,
+)
+from .metrics import LLM_ADMISSION_SECONDS, LLM_REJECTED, LLM_RETRIES
+
+# Call types, most urgent first
+CALL_TYPES = ("generation", "prepass", "background")
+DEFAULT_CALL_TYPE = "prepass"
+
+
+class LLMBusy(Exception):
+    """No upstream capacity before the queue deadline."""
+
+    def __init__(self, message: str = "The LLM is busy", retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether `error` is an upstream rate-limit / quota error (HTTP 429)."""
+    if getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429:
+        return True
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests", "RateLimitError"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "resource exhausted" in message or "resource_exhausted" in message
+
+
+def parse_rate_limits(spec: str) -> dict:
+    """"generation=60,prepass=120" -> {"generation": 60.0, "prepass": 120.0} (requests per minute)."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        call_type, _, rpm = item.partition("=")
+        limits[call_type.strip()] = float(rpm)
+    return limits
+
+
+class TokenBucket:
+    """Request-rate limit: `rate` requests per second, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self, max_wait: float) -> float:
+        """
+        Takes a token and returns how long to wait until it is valid, or
+        raises LLMBusy (taking nothing) if that is longer than `max_wait`.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > max_wait:
+            raise LLMBusy("LLM rate limit reached", retry_after=wait)
+        self.tokens -= 1
+        return wait
+
+
+class PrioritySemaphore:
+    """Semaphore whose waiters are woken by (priority, arrival order)."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self._waiters = []
+        self._order = itertools.count()
+
+    async def acquire(self, priority: int, timeout: float):
+        """Raises asyncio.TimeoutError if no slot frees up within `timeout` seconds."""
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max(timeout, 0))
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Granted while timing out or being cancelled: pass the slot on
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot goes straight to the next waiter
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    """Concurrency, rate and queueing limits for the LLM calls of one process."""
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        rate_limits: dict = None,
+        queue_limit: int = LLM_QUEUE_LIMIT,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_base: float = LLM_RETRY_BASE,
+        retry_max: float = LLM_RETRY_MAX,
+    ):
+        rate_limits = parse_rate_limits(LLM_RATE_LIMITS) if rate_limits is None else rate_limits
+        self.semaphore = PrioritySemaphore(max_concurrency)
+        # Requests per minute; bursts of up to 10 seconds' worth
+        self.buckets = {
+            call_type: TokenBucket(rpm / 60, max(1.0, rpm / 6))
+            for call_type, rpm in rate_limits.items() if rpm > 0
+        }
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+    def saturated(self) -> bool:
+        """Whether a new call would be rejected at once (the queue is full)."""
+        return self.semaphore.waiting >= self.queue_limit
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, for the Retry-After header."""
+        return max(1, math.ceil(self.queue_timeout))
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(retry_max, retry_base * 2^attempt)]."""
+        return random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+
+    def _reject(self, call_type: str, reason: str, retry_after: float = None):
+        LLM_REJECTED.inc(call_type, reason)
+        print(f"[LLM call rejected: {call_type}, {reason}]")
+        return LLMBusy(f"LLM busy ({reason})", retry_after or self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self, call_type: str = DEFAULT_CALL_TYPE):
+        """Holds one upstream slot for `call_type`, or raises LLMBusy."""
+        if call_type not in CALL_TYPES:
+            call_type = DEFAULT_CALL_TYPE
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        if self.saturated():
+            raise self._reject(call_type, "queue_full")
+
+        bucket = self.buckets.get(call_type)
+        if bucket is not None:
+            try:
+                await asyncio.sleep(bucket.reserve(deadline - time.monotonic()))
+            except LLMBusy as e:
+                raise self._reject(call_type, "rate_limit", e.retry_after) from None
+        try:
+            await self.semaphore.acquire(CALL_TYPES.index(call_type), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            raise self._reject(call_type, "deadline") from None
+        LLM_ADMISSION_SECONDS.observe(time.monotonic() - start, call_type)
+        try:
+            yield
+        finally:
+            self.semaphore.release()
+
+    async def call(self, call_type: str, make_call):
+        """Awaits `make_call()` in a slot, retrying upstream rate-limit errors."""
+        for attempt in itertools.count():
+            async with self.slot(call_type):
+                try:
+                    return await make_call()
+                except Exception as e:
+                    self._check_retry(call_type, e, attempt)
+            await asyncio.sleep(self.backoff(attempt))
+
+    async def stream(self, call_type: str, make_stream):
+        """Yields from `make_stream()` in a slot; retried like `call` until the first chunk."""
+        for attempt in itertools.count():
+            async with self.slot(call_type):
+                started = False
+                try:
+                    async for chunk in make_stream():
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    if started:
+                        raise
+                    self._check_retry(call_type, e, attempt)
+            await asyncio.sleep(self.backoff(attempt))
+
+    def _check_retry(self, call_type: str, error: Exception, attempt: int):
+        """Re-raises `error` unless it is an upstream rate limit with retries left."""
+        if not is_rate_limited(error):
+            raise error
+        if attempt >= self.max_retries:
+            raise self._reject(call_type, "upstream_rate_limit") from error
+        LLM_RETRIES.inc(call_type)
+        print(f"[LLM rate-limited ({call_type}), retry {attempt + 1}/{self.max_retries}]")
+
+
+ADMISSION = AdmissionController()
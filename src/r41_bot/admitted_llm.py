@@ -0,0 +1,101 @@
+"""
+Chat model wrapper that sends every call through admission control
+(admission.py).
+
+The call type comes from the tags of the chain stage the call runs in:
+chains.py tags each stage with one of CALL_TYPES, e.g. the generation
+stage with "generation". Untagged calls count as DEFAULT_CALL_TYPE.
+BaseChatModel.(a)stream does not hand the run manager (and its tags) to
+_(a)stream, so `stream` and `astream` resolve the call type themselves and
+pass it down.
+
+The sync path (the CLI) has no event loop to queue on: it only gets the
+retries with backoff.
+"""
+import itertools
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import ensure_config
+
+from .admission import CALL_TYPES, DEFAULT_CALL_TYPE
+
+
+def call_type_of(tags) -> str:
+    """The first admission call type among `tags`."""
+    for tag in tags or []:
+        if tag in CALL_TYPES:
+            return tag
+    return DEFAULT_CALL_TYPE
+
+
+class AdmittedChatModel(BaseChatModel):
+    """`llm`, with its calls admitted by `admission` (an AdmissionController)."""
+
+    llm: Any
+    admission: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"admitted-{self.llm._llm_type}"
+
+    def _inner_config(self) -> dict:
+        # The wrapper's own run is the one traced; the inner call stays silent
+        return {"callbacks": []}
+
+    @staticmethod
+    def _config_call_type(config) -> str:
+        # Tags of the enclosing stages live on the inherited callback manager
+        tags = list(config.get("tags") or []) + list(getattr(config.get("callbacks"), "tags", None) or [])
+        return call_type_of(tags)
+
+    def stream(self, input, config=None, *, stop=None, **kwargs):
+        config = ensure_config(config)
+        yield from super().stream(input, config, stop=stop, call_type=self._config_call_type(config), **kwargs)
+
+    async def astream(self, input, config=None, *, stop=None, **kwargs):
+        config = ensure_config(config)
+        async for chunk in super().astream(input, config, stop=stop, call_type=self._config_call_type(config), **kwargs):
+            yield chunk
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        call_type = call_type_of(getattr(run_manager, "tags", None))
+        for attempt in itertools.count():
+            try:
+                message = self.llm.invoke(messages, self._inner_config(), stop=stop, **kwargs)
+                return ChatResult(generations=[ChatGeneration(message=message)])
+            except Exception as e:
+                self.admission._check_retry(call_type, e, attempt)
+            time.sleep(self.admission.backoff(attempt))
+
+    def _stream(self, messages, stop=None, run_manager=None, call_type=DEFAULT_CALL_TYPE, **kwargs):
+        for attempt in itertools.count():
+            started = False
+            try:
+                for chunk in self.llm.stream(messages, self._inner_config(), stop=stop, **kwargs):
+                    started = True
+                    yield ChatGenerationChunk(message=chunk)
+                return
+            except Exception as e:
+                if started:
+                    raise
+                self.admission._check_retry(call_type, e, attempt)
+            time.sleep(self.admission.backoff(attempt))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        message = await self.admission.call(
+            call_type_of(getattr(run_manager, "tags", None)),
+            lambda: self.llm.ainvoke(messages, self._inner_config(), stop=stop, **kwargs),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, call_type=DEFAULT_CALL_TYPE, **kwargs):
+        stream = self.admission.stream(
+            call_type,
+            lambda: self.llm.astream(messages, self._inner_config(), stop=stop, **kwargs),
+        )
+        async for chunk in stream:
+            # BaseChatModel.astream reports the tokens to the callbacks
+            yield ChatGenerationChunk(message=chunk)
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import (
+    ANSWER_CACHE_PATH,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL,
+)
+from .index_store import index_version
+from .metadata import extract_filters
+from .retriever import RETRIEVAL_EXECUTOR, aembed_queries
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    Semantic cache of final answers, keyed on the embedding of the rewritten
+    question. A lookup hits when a cached question is within `threshold`
+    cosine similarity of the new one and names the same academic years and
+    category (metadata.extract_filters): "president in 2023-2024" and
+    "president in 2024-2025" embed almost identically but must not share
+    an answer.
+
+    Entries are evicted least-recently-used beyond `max_entries` and after
+    `ttl` seconds. The cache is persisted to a JSON file so it survives
+    restarts. It serves one index generation (`version`, default: the live
+    one): entries saved against another generation are dropped on load, and
+    the Registry builds a fresh cache with the pipeline of each new generation.
+    """
+
+    def __init__(
+        self,
+        embedding,
+        path: str = ANSWER_CACHE_PATH,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl: float = ANSWER_CACHE_TTL,
+        version: str = None,
+    ):
+        self.embedding = embedding
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        # question -> {"vector": np.ndarray, "filters": dict, "answer": str, "created_at": float}
+        self._entries = OrderedDict()
+        # Stacked vectors and their questions, rebuilt lazily after inserts/evictions
+        self._matrix = None
+        self._keys = []
+        self._version = index_version() if version is None else version
+        self._save_lock = threading.Lock()
+        self._load()
+
+    # --- Embedding ---
+
+    def embed(self, question: str) -> np.ndarray:
+        """Returns the normalized embedding of `question`."""
+        return _normalize(self.embedding.embed_query(question))
+
+    async def aembed(self, question: str) -> np.ndarray:
+        vectors = await aembed_queries(self.embedding, [question])
+        return _normalize(vectors[0])
+
+    # --- Lookup / insert ---
+
+    def get(self, question: str, vector: np.ndarray):
+        """Returns the cached answer closest to `vector` (the embedding of `question`), or None on a miss."""
+        self._expire()
+        if not self._entries:
+            return None
+
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.stack([self._entries[q]["vector"] for q in self._keys])
+        scores = self._matrix @ vector
+        filters = extract_filters(question)
+        for best in np.argsort(-scores):
+            if scores[best] < self.threshold:
+                return None
+            cached = self._keys[best]
+            if self._entries[cached]["filters"] == filters:
+                self._entries.move_to_end(cached)
+                return self._entries[cached]["answer"]
+        return None
+
+    def put(self, question: str, vector: np.ndarray, answer: str):
+        """Stores `answer` for `question` and persists the cache."""
+        self._insert(question, vector, answer)
+        self._save()
+
+    async def aput(self, question: str, vector: np.ndarray, answer: str):
+        """Like `put`, but serializes the cache to disk off the event loop."""
+        self._insert(question, vector, answer)
+        snapshot = list(self._entries.items())
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(RETRIEVAL_EXECUTOR, self._save, snapshot)
+
+    def _insert(self, question: str, vector: np.ndarray, answer: str):
+        self._entries[question] = {
+            "vector": vector,
+            "filters": extract_filters(question),
+            "answer": answer,
+            "created_at": time.time(),
+        }
+        self._entries.move_to_end(question)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Eviction / invalidation ---
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [q for q, e in self._entries.items() if e["created_at"] < cutoff]
+        for q in expired:
+            del self._entries[q]
+        if expired:
+            self._matrix = None
+
+    # --- Persistence ---
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        # A cache written against another index is stale
+        if data.get("index_version") != self._version:
+            return
+
+        for item in data.get("entries", []):
+            self._entries[item["question"]] = {
+                "vector": np.asarray(item["vector"], dtype=np.float32),
+                "filters": extract_filters(item["question"]),
+                "answer": item["answer"],
+                "created_at": item["created_at"],
+            }
+        self._expire()
+
+    def _save(self, entries=None):
+        if entries is None:
+            entries = list(self._entries.items())
+        data = {
+            "index_version": self._version,
+            "entries": [
+                {
+                    "question": q,
+                    "vector": e["vector"].tolist(),
+                    "answer": e["answer"],
+                    "created_at": e["created_at"],
+                }
+                for q, e in entries
+            ],
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temp file and swap it in so a crash never leaves a truncated cache
+        # One temporary file per process: several workers may save at once
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._save_lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+
+def caches_as_typed(question: str, rewritten: str) -> bool:
+    """
+    Whether the answer to `rewritten` may also be cached under `question` as
+    typed. Not when the rewrite pinned it to academic years or a category it
+    does not name: "who is the current president?" means another bureau
+    after the academic-year rollover, and the raw lookup runs before the
+    rewrite that would tell.
+    """
+    return question != rewritten and extract_filters(question) == extract_filters(rewritten)
+
+
+def replay_stream(answer: str):
+    """Splits a cached answer into word chunks so it can be streamed like a live one."""
+    words = answer.split(" ")
+    for i, word in enumerate(words):
+        yield word if i == len(words) - 1 else word + " "
@@ -0,0 +1,218 @@
+"""
+Batch answering for the CLI: a whole question sheet through the pipeline.
+
+Used whenever the knowledge base changes, e.g. to pre-fill data/faq.csv or
+to answer an evaluation set. Questions are read from a CSV file (a
+"question" column, or the first one) or a JSONL file ({"question": ...};
+other fields are copied to the output), and answered without history
+through the async rewrite -> route -> RAG path:
+
+- at most `concurrency` questions are in flight at once; the LLM calls
+  they make still go through admission control (admission.py), and a
+  question refused as busy is retried after the advised delay,
+- the query embeddings of all in-flight questions and their sub-questions
+  share model calls: the BatchingEmbedder's window is widened for the run
+  (BATCH_EMBED_WAIT_MS), since throughput matters here, not latency,
+- each answer is appended to the output (JSONL, or CSV with the
+  question/answer columns of data/faq.csv) as soon as it is done, so an
+  interrupted run resumes where it stopped: questions already in the output
+  are skipped, failed ones are retried,
+- the report gives the throughput and the per-stage timings.
+
+The FAQ fast path is off: the answers are generated, never copied from
+data/faq.csv.
+"""
+import asyncio
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from .admission import LLMBusy
+from .config import BATCH_BUSY_RETRIES, BATCH_EMBED_WAIT_MS
+from .embedder import BatchingEmbedder
+from .sse import STAGE, TOKEN
+
+OUTPUT_FIELDS = ("question", "answer")
+
+
+def load_questions(path: str) -> list:
+    """[{"question": ..., **other fields}] from a CSV or JSONL file, blank questions skipped."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            reader = csv.DictReader(f)
+            column = "question" if "question" in (reader.fieldnames or []) else reader.fieldnames[0]
+            rows = [{**row, "question": row[column]} for row in reader]
+    return [{**row, "question": row["question"].strip()} for row in rows if (row.get("question") or "").strip()]
+
+
+def load_done(path: str) -> set:
+    """Questions already answered in the output file (a truncated last line is ignored)."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = []
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    for row in rows:
+        if row.get("question") and row.get("answer"):
+            done.add(row["question"].strip())
+    return done
+
+
+class BatchWriter:
+    """Appends one record per answered question and flushes it right away."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.csv = path.endswith(".csv")
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                # An interrupted run may have left a partial last line
+                partial = f.read(1) != b"\n"
+        self._file = open(path, "a", encoding="utf-8", newline="")
+        if not new and partial:
+            self._file.write("\n")
+        if self.csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=OUTPUT_FIELDS, extrasaction="ignore")
+            if new:
+                self._writer.writeheader()
+
+    def write(self, record: dict):
+        if self.csv:
+            self._writer.writerow(record)
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+@contextmanager
+def batch_embedding_window(embedding, max_wait: float, max_batch: int):
+    """Widens a BatchingEmbedder's batching window for the duration of a run."""
+    if not isinstance(embedding, BatchingEmbedder):
+        yield
+        return
+    saved = embedding.max_wait, embedding.max_batch
+    embedding.max_wait, embedding.max_batch = max_wait, max(max_batch, embedding.max_batch)
+    try:
+        yield
+    finally:
+        embedding.max_wait, embedding.max_batch = saved
+
+
+async def answer_one(pipeline, question: str) -> dict:
+    """The answer to `question` with its timings: total, time to first token and per stage (ms)."""
+    start = time.perf_counter()
+    stages, chunks, ttft = {}, [], None
+    current, current_start = None, start
+    async for kind, data in pipeline.aevents(question, []):
+        now = time.perf_counter()
+        if kind == STAGE:
+            if current is not None:
+                stages[current] = (now - current_start) * 1000
+            current, current_start = data, now
+        elif kind == TOKEN:
+            if ttft is None:
+                ttft = (now - start) * 1000
+            chunks.append(data)
+    end = time.perf_counter()
+    if current is not None:
+        stages[current] = (end - current_start) * 1000
+    return {
+        "answer": "".join(chunks),
+        "total_ms": round((end - start) * 1000, 1),
+        "ttft_ms": round(ttft, 1) if ttft is not None else None,
+        "stages": {stage: round(ms, 1) for stage, ms in stages.items()},
+    }
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _timing(values: list) -> dict:
+    return {"mean_ms": sum(values) / len(values), "p95_ms": _percentile(values, 0.95)}
+
+
+async def run_batch(pipeline, rows: list, output_path: str, concurrency: int, embedding=None) -> dict:
+    """Answers every row not yet in `output_path`, appending as they finish; returns the report."""
+    done = load_done(output_path)
+    todo = list({row["question"]: row for row in rows if row["question"] not in done}.values())
+    queue = asyncio.Queue()
+    for row in todo:
+        queue.put_nowait(row)
+    writer = BatchWriter(output_path)
+    results, failed = [], []
+
+    async def worker():
+        while not queue.empty():
+            row = queue.get_nowait()
+            for attempt in range(BATCH_BUSY_RETRIES + 1):
+                try:
+                    result = await answer_one(pipeline, row["question"])
+                    break
+                except LLMBusy as e:
+                    if attempt == BATCH_BUSY_RETRIES:
+                        failed.append((row["question"], e))
+                        result = None
+                    else:
+                        await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    print(f"[Batch question failed: {row['question']!r}: {e}]")
+                    failed.append((row["question"], e))
+                    result = None
+                    break
+            if result is not None:
+                writer.write({**row, **result})
+                results.append(result)
+                print(f"[{len(done) + len(results)}/{len(rows)}] {row['question']}")
+
+    start = time.perf_counter()
+    try:
+        with batch_embedding_window(embedding, BATCH_EMBED_WAIT_MS / 1000, concurrency * 4):
+            await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(todo))))))
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    stages = {}
+    for result in results:
+        for stage, ms in result["stages"].items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "questions": len(rows),
+        "skipped": len(rows) - len(todo),
+        "answered": len(results),
+        "failed": len(failed),
+        "elapsed_s": elapsed,
+        "throughput_qps": len(results) / elapsed if elapsed > 0 else 0.0,
+        "total": _timing([r["total_ms"] for r in results]) if results else None,
+        "stages": {stage: _timing(values) for stage, values in stages.items()},
+    }
+
+
+def print_report(report: dict):
+    print(
+        f"[Batch] {report['questions']} questions: {report['answered']} answered, "
+        f"{report['skipped']} already done, {report['failed']} failed "
+        f"in {report['elapsed_s']:.1f} s ({report['throughput_qps']:.2f} questions/s)"
+    )
+    rows = ([("total", report["total"])] if report["total"] else []) + list(report["stages"].items())
+    for name, timing in rows:
+        print(f"  {name:<11} mean {timing['mean_ms']:>8.0f} ms  p95 {timing['p95_ms']:>8.0f} ms")
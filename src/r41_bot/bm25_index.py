@@ -0,0 +1,186 @@
+"""
+Precomputed BM25 index over the same chunks as the vector store.
+
+The index is built by scripts/index_faq.py and stored in a directory of the
+index generation:
+
+    bm25/
+        vocab.json          sorted list of terms (term id = position)
+        term_offsets.npy    int64[V + 1], postings of term t are [offsets[t], offsets[t + 1])
+        postings_doc.npy    int32[P], chunk number of each posting
+        postings_tf.npy     float32[P], term frequency of each posting
+        doc_len.npy         float32[N], token count of each chunk
+        idf.npy             float32[V]
+        docs.json           [{"id", "page_content", "metadata"}] per chunk
+        params.json         {"k1", "b", "avgdl"}
+
+The numeric arrays are memory-mapped, so loading costs the same whatever the
+size of the knowledge base.
+"""
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .metadata import MetadataColumns
+
+BM25_DIR = "bm25"
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a CSR postings matrix."""
+
+    def __init__(self, vocab, term_offsets, postings_doc, postings_tf, doc_len, idf, docs, k1=1.5, b=0.75, avgdl=1.0):
+        self.vocab = vocab
+        self.term_ids = {term: i for i, term in enumerate(vocab)}
+        self.term_offsets = term_offsets
+        self.postings_doc = postings_doc
+        self.postings_tf = postings_tf
+        self.doc_len = doc_len
+        self.idf = idf
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.avgdl = avgdl
+        # Per-document length normalization, the only part of the score that doesn't depend on the query
+        self._norm = (k1 * (1 - b + b * doc_len / avgdl)).astype(np.float32)
+        self.columns = MetadataColumns(docs)
+
+    def __len__(self):
+        return len(self.docs)
+
+    @classmethod
+    def build(cls, documents: list, ids: list = None, k1: float = 1.5, b: float = 0.75):
+        """Builds the index from langchain Documents."""
+        ids = ids or [doc.metadata.get("id", str(i)) for i, doc in enumerate(documents)]
+        doc_terms = [Counter(tokenize(doc.page_content)) for doc in documents]
+
+        vocab = sorted({term for terms in doc_terms for term in terms})
+        term_ids = {term: i for i, term in enumerate(vocab)}
+
+        # Group postings by term (CSR layout)
+        postings = [[] for _ in vocab]
+        for doc_idx, terms in enumerate(doc_terms):
+            for term, tf in terms.items():
+                postings[term_ids[term]].append((doc_idx, tf))
+
+        lengths = [len(p) for p in postings]
+        term_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=term_offsets[1:])
+        postings_doc = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(term_offsets[-1]))
+        postings_tf = np.fromiter((tf for p in postings for _, tf in p), dtype=np.float32, count=int(term_offsets[-1]))
+
+        doc_len = np.array([sum(terms.values()) for terms in doc_terms], dtype=np.float32)
+        n_docs = len(documents)
+        avgdl = float(doc_len.mean()) if n_docs else 1.0
+        df = np.array(lengths, dtype=np.float64)
+        # Lucene-style IDF, always positive
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        docs = [
+            {"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata}
+            for doc_id, doc in zip(ids, documents)
+        ]
+        return cls(vocab, term_offsets, postings_doc, postings_tf, doc_len, idf, docs, k1=k1, b=b, avgdl=avgdl or 1.0)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+        with open(os.path.join(directory, "docs.json"), "w", encoding="utf-8") as f:
+            json.dump(self.docs, f, ensure_ascii=False)
+        with open(os.path.join(directory, "params.json"), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "avgdl": self.avgdl}, f)
+        for name in ("term_offsets", "postings_doc", "postings_tf", "doc_len", "idf"):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str):
+        """Loads a saved index, memory-mapping the numeric arrays."""
+        with open(os.path.join(directory, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(directory, "docs.json"), encoding="utf-8") as f:
+            docs = json.load(f)
+        with open(os.path.join(directory, "params.json"), encoding="utf-8") as f:
+            params = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in ("term_offsets", "postings_doc", "postings_tf", "doc_len", "idf")
+        }
+        return cls(vocab, docs=docs, **arrays, **params)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for `query`."""
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.term_ids.get(term)
+            if t is None:
+                continue
+            start, end = self.term_offsets[t], self.term_offsets[t + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end]
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        return scores
+
+    def max_score(self, query: str) -> float:
+        """
+        Upper bound of the score of `query`: every term at saturating term
+        frequency. Terms missing from the vocabulary count with the IDF of
+        the rarest known term, so a query about something the knowledge base
+        never mentions gets low normalized scores.
+        """
+        rarest = float(self.idf.max()) if len(self.idf) else 0.0
+        total = 0.0
+        for term in set(tokenize(query)):
+            t = self.term_ids.get(term)
+            total += (float(self.idf[t]) if t is not None else rarest) * (self.k1 + 1)
+        return total
+
+    def search(self, query: str, k: int, filters: dict = None):
+        """
+        Returns [(chunk number, score)] of the top-k matching chunks, best first.
+        `filters` (see metadata.extract_filters) restrict the candidate chunks.
+        """
+        scores = self.scores(query)
+        rows = self.columns.rows(filters)
+        if rows is not None:
+            scores = scores[rows]
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = top if rows is None else rows[top]
+        return [(int(i), float(scores[j])) for i, j in zip(ids, top) if scores[j] > 0]
+
+    def document(self, i: int) -> Document:
+        doc = self.docs[i]
+        return Document(page_content=doc["page_content"], metadata={**doc["metadata"], "id": doc["id"]})
+
+
+class BM25IndexRetriever(BaseRetriever):
+    """Keyword retriever backed by a precomputed BM25Index."""
+
+    index: BM25Index
+    k: int = 4
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.search(query)
+
+    def search(self, query: str, filters: dict = None) -> list:
+        return [doc for doc, _ in self.search_with_scores(query, filters)]
+
+    def search_with_scores(self, query: str, filters: dict = None) -> list:
+        """[(Document, score in [0, 1])]: BM25 scores divided by `max_score`."""
+        hits = self.index.search(query, self.k, filters)
+        bound = self.index.max_score(query) or 1.0
+        return [(self.index.document(i), score / bound) for i, score in hits]
@@ -1,34 +1,91 @@
+from functools import lru_cache
 from operator import itemgetter 
 from langchain.prompts import ChatPromptTemplate, PromptTemplate, MessagesPlaceholder
-from langchain.schema.runnable import RunnableLambda,RunnablePassthrough
+from langchain.schema.runnable import RunnableBranch, RunnableLambda,RunnablePassthrough
 from langchain.schema.output_parser import StrOutputParser
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema.messages import HumanMessage, AIMessage
 
 
-from .prompts import SYSTEM_PROMPT, USER_PROMPT, DECOMPOSITION_PROMPT , ROUTER_PROMPT , QUERY_REWRITER_PROMPT
-from .config import MODEL_NAME, GOOGLE_API_KEY
+from .prompts import SYSTEM_PROMPT, USER_PROMPT, DECOMPOSITION_PROMPT , ROUTER_PROMPT , QUERY_REWRITER_PROMPT, PLANNER_PROMPT, SUMMARY_PROMPT
+from .config import (
+    MODEL_NAME, GOOGLE_API_KEY, CONTEXT_TOKEN_BUDGET, LLM_PROVIDER, LLM_ADMISSION, DEBUG,
+    FAKE_LLM_LATENCY, FAKE_LLM_TOKEN_DELAY, FAKE_LLM_MAX_CONCURRENT, FAKE_LLM_ERROR_RATE,
+)
+from .metadata import extract_filters
+from .metrics import ROUTE_DECISIONS
+from .retriever import retrieve_many, aretrieve_many
 
 
-def get_llm():
-    """Initializes and returns the LLM."""
+def _gemini_llm():
     return ChatGoogleGenerativeAI(
         model=MODEL_NAME,
         temperature=0,
         convert_system_message_to_human=True,
         google_api_key=GOOGLE_API_KEY,
     )
+
+
+def _fake_llm():
+    # Scripted local stand-in: no network or API key (tests, load tests)
+    from .fake_llm import ScriptedChatModel
+    return ScriptedChatModel(
+        latency=FAKE_LLM_LATENCY,
+        token_delay=FAKE_LLM_TOKEN_DELAY,
+        max_concurrent=FAKE_LLM_MAX_CONCURRENT,
+        error_rate=FAKE_LLM_ERROR_RATE,
+    )
+
+
+# LLM_PROVIDER -> factory returning a langchain chat model
+LLM_PROVIDERS = {
+    "gemini": _gemini_llm,
+    "fake": _fake_llm,
+}
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    """
+    Initializes and returns the LLM selected by LLM_PROVIDER.
+    All chains share this one client (and its HTTP connection pool).
+    With LLM_ADMISSION, its calls go through the process-wide admission
+    controller (see admission.py); each chain tags its stage with the call type.
+    """
+    if LLM_PROVIDER not in LLM_PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {LLM_PROVIDER!r}, expected one of {sorted(LLM_PROVIDERS)}")
+    llm = LLM_PROVIDERS[LLM_PROVIDER]()
+    if LLM_ADMISSION:
+        from .admission import ADMISSION
+        from .admitted_llm import AdmittedChatModel
+        llm = AdmittedChatModel(llm=llm, admission=ADMISSION)
+    return llm
     
-def format_context(docs_list: list) -> str:
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def format_context(docs: list, max_tokens: int = CONTEXT_TOKEN_BUDGET) -> str:
     """
-    Flattens a list of document lists and formats them into a single string.
-    Also removes duplicate documents.
+    Formats a ranked list of documents into a single string, best first.
+    Documents are added while they fit in `max_tokens`, so the prompt stays
+    bounded however many sub-questions were retrieved.
     """
-    all_docs = [doc for sublist in docs_list for doc in sublist]
-    # Remove duplicates based on page_content
-    unique_docs = {doc.page_content: doc for doc in all_docs}.values()
-    return "\n\n".join(doc.page_content for doc in unique_docs)    
+    selected = []
+    used = 0
+    for doc in docs:
+        cost = estimate_tokens(doc.page_content)
+        if used + cost > max_tokens:
+            # Never send an empty context just because the best hit is long
+            if not selected:
+                selected.append(doc.page_content[: max_tokens * 4])
+                used = max_tokens
+            continue
+        selected.append(doc.page_content)
+        used += cost
+    return "\n\n".join(selected)
 
 # --- New Function Below ---
 def format_chat_history_for_prompt(chat_history: list) -> str:
@@ -54,10 +111,52 @@ def build_rag_chain(retriever):
     """
     Builds the main RAG chain with a decomposition step.
     This version is optimized for true end-to-end streaming.
+    If the input already carries "questions" (from the planner), the
+    decomposition LLM call is skipped.
+    """
+    # We use RunnablePassthrough.assign to run the retrieval chain
+    # and add its output ("context") to the input of the conversational chain.
+    rag_chain = RunnablePassthrough.assign(
+        context=build_retrieval_chain(retriever),
+    ) | build_answer_chain()
+
+    return rag_chain
+
+
+def build_retrieval_chain(retriever):
+    """
+    The retrieval half of the RAG chain: {"question", "questions"?} -> context string.
+    Metadata filters are extracted from the (rewritten) question.
+    ChatPipeline runs the two halves separately to report progress between them.
     """
-    llm = get_llm()
     decomposition_chain = build_decomposition_chain()
 
+    # This is a regular, non-streaming chain that just retrieves context
+    sub_questions = RunnableBranch(
+        (lambda x: bool(x.get("questions")), itemgetter("questions")),
+        itemgetter("question")
+        | decomposition_chain
+        | RunnableLambda(lambda x: x.get("questions", [])),
+    )
+
+    # Sub-questions are retrieved concurrently and merged into one ranking,
+    # restricted to the category/academic year named in the question
+    retrieve = RunnableLambda(
+        lambda x: retrieve_many(retriever, x["questions"], extract_filters(x["question"])),
+        afunc=lambda x: aretrieve_many(retriever, x["questions"], extract_filters(x["question"])),
+    )
+
+    return (
+        RunnablePassthrough.assign(questions=sub_questions)
+        | retrieve.with_config(run_name="retrieval")
+        | RunnableLambda(format_context).with_config(run_name="context")
+    )
+
+
+def build_answer_chain():
+    """The generation half of the RAG chain: {"question", "chat_history", "context"} -> answer."""
+    llm = get_llm()
+
     # The final prompt for the LLM, now including a placeholder for memory
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -67,32 +166,12 @@ def build_rag_chain(retriever):
         ]
     )
 
-    # This is a regular, non-streaming chain that just retrieves context
-    retrieval_chain = (
-        itemgetter("question")
-        | decomposition_chain
-        | RunnableLambda(lambda x: x.get("questions", []))
-        | retriever.map()
-        | RunnableLambda(format_context)
-    )
-
-    # This is the main chain that will handle the generation
-    # It passes the question and history directly to the prompt and LLM
-    conversational_rag_chain = (
+    # It passes the question, history and context directly to the prompt and LLM
+    return (
         prompt
         | llm
         | StrOutputParser()
-    )
-
-    # We use RunnablePassthrough.assign to run the retrieval chain in parallel
-    # and add its output ("context") to the input of the conversational chain.
-    # This allows the LLM to start generating a response immediately while context
-    # is still being fetched.
-    rag_chain = RunnablePassthrough.assign(
-        context=retrieval_chain,
-    ) | conversational_rag_chain
-
-    return rag_chain
+    ).with_config(run_name="generation", tags=["generation"])
 
 # --- New Function Below ---
 
@@ -103,14 +182,16 @@ def build_decomposition_chain():
     llm = get_llm()
     prompt = PromptTemplate.from_template(DECOMPOSITION_PROMPT)
     
-    decomposition_chain = prompt | llm | JsonOutputParser()
+    decomposition_chain = (prompt | llm | JsonOutputParser()).with_config(run_name="decomposition", tags=["prepass"])
     
     return decomposition_chain
 
 
-def build_router_chain():
+def build_router_chain(local_router=None):
     """
     Builds a chain that classifies a user's question. Now includes chat history.
+    With a LocalRouter (see router.py), its prediction is used when confident
+    and the LLM is only asked otherwise.
     """
     llm = get_llm()
     
@@ -121,7 +202,7 @@ def build_router_chain():
     )
 
     # We create a passthrough that formats the history before sending it to the prompt
-    router_chain = (
+    llm_router = (
         RunnablePassthrough.assign(
             chat_history=lambda x: format_chat_history_for_prompt(x["chat_history"])
         )
@@ -129,8 +210,29 @@ def build_router_chain():
         | llm
         | JsonOutputParser()
     )
+    if local_router is None:
+        return llm_router.with_config(run_name="route", tags=["prepass"])
+
+    def _decide(route, confidence):
+        if local_router.confident(route, confidence):
+            if DEBUG:
+                print(f"[Local route: {route} ({confidence:.2f})]")
+            ROUTE_DECISIONS.inc("local")
+            return {"route": route}
+        if DEBUG:
+            print(f"[Local route: {route} ({confidence:.2f}), asking the LLM]")
+        ROUTE_DECISIONS.inc("llm")
+        return None
+
+    def route(x, config):
+        decision = _decide(*local_router.route(x["question"]))
+        return decision or llm_router.invoke(x, config)
 
-    return router_chain
+    async def aroute(x, config):
+        decision = _decide(*await local_router.aroute(x["question"]))
+        return decision or await llm_router.ainvoke(x, config)
+
+    return RunnableLambda(route, afunc=aroute).with_config(run_name="route", tags=["prepass"])
 
 
 def build_query_rewriter_chain():
@@ -153,6 +255,66 @@ def build_query_rewriter_chain():
         | prompt
         | llm
         | StrOutputParser()
+    ).with_config(run_name="rewrite", tags=["prepass"])
+
+    return rewriter_chain
+
+
+def build_planner_chain():
+    """
+    Builds the single-pass planner: one LLM call that returns the rewritten
+    question, the route and the sub-questions as a JSON object.
+    """
+    llm = get_llm()
+
+    prompt = PromptTemplate(
+        template=PLANNER_PROMPT,
+        input_variables=["question", "chat_history"],
     )
 
-    return rewriter_chain
\ No newline at end of file
+    planner_chain = (
+        RunnablePassthrough.assign(
+            chat_history=lambda x: format_chat_history_for_prompt(x["chat_history"])
+        )
+        | prompt
+        | llm
+        | JsonOutputParser()
+        | RunnableLambda(validate_plan)
+    ).with_config(run_name="plan", tags=["prepass"])
+
+    return planner_chain
+
+
+def validate_plan(plan) -> dict:
+    """
+    Checks the planner's JSON output and normalizes it.
+    Raises ValueError if it is not a usable plan.
+    """
+    if not isinstance(plan, dict):
+        raise ValueError(f"Planner returned {type(plan).__name__}, expected an object")
+
+    question = plan.get("question")
+    route = plan.get("route")
+    questions = plan.get("questions", [])
+
+    if not isinstance(question, str) or not question.strip():
+        raise ValueError("Planner output is missing 'question'")
+    if route not in ("fact_lookup", "vector_search", "irrelevant"):
+        raise ValueError(f"Planner returned unknown route {route!r}")
+    if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+        raise ValueError("Planner 'questions' must be a list of strings")
+
+    return {"question": question.strip(), "route": route, "questions": questions}
+
+
+def build_summary_chain():
+    """
+    Builds a chain that folds new conversation lines into a running summary.
+    Expects 'summary' and 'new_lines'.
+    """
+    llm = get_llm()
+    prompt = PromptTemplate.from_template(SUMMARY_PROMPT)
+
+    summary_chain = (prompt | llm | StrOutputParser()).with_config(run_name="summary", tags=["background"])
+
+    return summary_chain
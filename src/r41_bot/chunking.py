@@ -0,0 +1,85 @@
+"""
+Heading-aware chunking of the markdown knowledge base.
+
+Every knowledge-base file is a `#` title followed by `##` entries (one
+workshop, event or topic each), or a short list such as a bureau. Splitting
+by characters cuts entries in half or glues unrelated ones together, so each
+`##` entry becomes one chunk with the file title prepended, which keeps the
+academic year in every chunk. `**Field:** value` lines of the entry (Date,
+Mentor, Location, Speakers, ...) are copied into the chunk metadata.
+
+Used by scripts/index_faq.py for both the dense and the BM25 indexes.
+"""
+import re
+
+from langchain.docstore.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Entries longer than this are split further, keeping their headings
+MAX_CHUNK_CHARS = 1000
+
+_FIELD_RE = re.compile(r"^\*\*([^*:\n]+):\*\*\s*(.+?)\s*$", re.MULTILINE)
+# Long free text that stays in the chunk only
+_SKIPPED_FIELDS = {"description"}
+
+
+def parse_fields(text: str) -> dict:
+    """`**Field:** value` lines of an entry as {"field": "value"}."""
+    fields = {}
+    for name, value in _FIELD_RE.findall(text):
+        key = name.strip().lower().replace(" ", "_")
+        if key not in _SKIPPED_FIELDS:
+            fields.setdefault(key, value)
+    return fields
+
+
+def _sections(text: str):
+    """Splits a file into (title line, text before the first entry, [(heading, entry text)])."""
+    title, preamble, sections = "", [], []
+    for line in text.splitlines():
+        if line.startswith("# ") and not title and not sections:
+            title = line.strip()
+        elif line.startswith("## "):
+            sections.append((line[3:].strip(), [line]))
+        elif sections:
+            sections[-1][1].append(line)
+        else:
+            preamble.append(line)
+    return title, "\n".join(preamble).strip(), [(h, "\n".join(lines).strip()) for h, lines in sections]
+
+
+def split_markdown(text: str, metadata: dict = None, max_chars: int = MAX_CHUNK_CHARS) -> list:
+    """Splits one markdown file into one Document per `##` entry."""
+    metadata = metadata or {}
+    title, preamble, sections = _sections(text)
+    if not sections:
+        # A single list (bureau files): the whole file is one entry
+        sections = [("", preamble)] if preamble else []
+    elif preamble:
+        sections.insert(0, ("", preamble))
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=max_chars, chunk_overlap=max_chars // 10)
+    chunks = []
+    for heading, body in sections:
+        chunk_metadata = {**metadata, **parse_fields(body), "section": heading}
+        content = f"{title}\n\n{body}" if title else body
+        if len(content) <= max_chars:
+            chunks.append(Document(page_content=content, metadata=chunk_metadata))
+            continue
+        # Oversized entry: split the text, repeating the headings on every piece
+        for i, piece in enumerate(splitter.split_text(body)):
+            if i and heading:
+                piece = f"## {heading}\n\n{piece}"
+            if title:
+                piece = f"{title}\n\n{piece}"
+            chunks.append(Document(page_content=piece, metadata=dict(chunk_metadata)))
+    return chunks
+
+
+def split_documents(documents: list, max_chars: int = MAX_CHUNK_CHARS) -> list:
+    """Splits loaded markdown files, keeping each file's metadata on its chunks."""
+    return [
+        chunk
+        for doc in documents
+        for chunk in split_markdown(doc.page_content, doc.metadata, max_chars)
+    ]
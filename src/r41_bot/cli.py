@@ -1,49 +1,70 @@
-import sys
-from langchain.memory import ConversationBufferMemory
-from .retriever import get_retriever
-from .chains import build_rag_chain, build_router_chain, build_query_rewriter_chain
+import argparse
+import asyncio
+import json
+from .batch import load_questions, print_report, run_batch
+from .retriever import get_retriever, get_embedding
+from .facts import load_fact_index
+from .router import load_local_router
+from .index_store import acquire_lease, live_index_dir
+from .pipeline import ChatPipeline
+from .config import BATCH_CONCURRENCY, DEBUG, LOCAL_ROUTER, RETRIEVER_K
 import langchain
 
-# ADD THESE TWO LINES TO ENABLE VERBOSE LOGGING
-langchain.debug = True
-langchain.verbose = True
+# Verbose logging dumps every chain step to stdout; opt in with R41_DEBUG=1
+langchain.debug = DEBUG
+langchain.verbose = DEBUG
 
-def main():
-    retriever = get_retriever(k=6)
-    rag_chain = build_rag_chain(retriever)
-    router_chain = build_router_chain()
-    rewriter_chain = build_query_rewriter_chain()
+def parse_args():
+    parser = argparse.ArgumentParser(description="R41 ENSAB Chatbot (CLI).")
+    parser.add_argument("question", nargs="*", help="Answer this single question and exit")
+    parser.add_argument("--batch", metavar="QUESTIONS", help="Answer every question of a CSV or JSONL file")
+    parser.add_argument("--output", help="Batch answers (JSONL, or CSV like data/faq.csv); resumed if it exists")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Batch questions in flight at once")
+    parser.add_argument("--report", help="Also write the batch report as JSON to this file")
+    args = parser.parse_args()
+    if args.batch and not args.output:
+        parser.error("--batch needs --output")
+    return args
 
-    # 1. Initialize conversation memory
-    memory = ConversationBufferMemory(return_messages=True, memory_key="chat_history")
 
-    def answer(q, chat_history):
-        # First, rewrite the question, now WITH history
-        rewritten_q = rewriter_chain.invoke({"question": q, "chat_history": chat_history})
-        print(f"[Rewritten Question: {rewritten_q}]") # For debugging
+def batch_main(args, retriever, facts, router):
+    # Generated answers only: the batch is often what data/faq.csv is filled from
+    pipeline = ChatPipeline(retriever, fastpath=False, facts=facts, router=router)
+    report = asyncio.run(
+        run_batch(pipeline, load_questions(args.batch), args.output, args.concurrency, embedding=get_embedding())
+    )
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+def main():
+    args = parse_args()
+    # A reindex must not delete the generation this run reads
+    index_dir = live_index_dir()
+    acquire_lease(index_dir)
+    retriever = get_retriever(k=RETRIEVER_K, index_dir=index_dir)
+    facts = load_fact_index(index_dir)
+    router = load_local_router(index_dir, get_embedding()) if LOCAL_ROUTER else None
+    if args.batch:
+        batch_main(args, retriever, facts, router)
+        return
 
-        # Then, use the router on the rewritten question, also WITH history
-        route_decision = router_chain.invoke({"question": rewritten_q, "chat_history": chat_history})
-        route = route_decision.get("route")
+    # The pipeline tries the FAQ fast path first, then rewrite -> route -> RAG
+    pipeline = ChatPipeline(retriever, facts=facts, router=router)
 
-        # Path 1: The question is irrelevant
-        if route == "irrelevant":
-            return "Hi!, I can only answer questions about the R41 club. How can I help you with that?"
+    # 1. Conversation so far; the pipeline only sends a bounded, summarized view of it to the LLM
+    chat_history = []
 
-        # Path 2: The question is relevant and requires vector search
-        if route == "vector_search":
-            print("[Routing to: Vector Search (RAG)]")
-            # Invoke the RAG chain with the REWRITTEN question AND the history
-            return rag_chain.invoke({"question": rewritten_q, "chat_history": chat_history})
-        
-        # Default fallback if router fails for some reason
-        return "I'm not sure how to handle that question. Please try rephrasing."
+    def answer(q, chat_history):
+        return pipeline.invoke(q, chat_history)
 
 
     # This part for single-shot questions will remain memoryless
-    if len(sys.argv) > 1:
+    if args.question:
         # Pass an empty history for single-shot questions
-        print(answer(" ".join(sys.argv[1:]), []))
+        print(answer(" ".join(args.question), []))
         return
 
     print("R41 ENSAB Chatbot (CLI). Type your question, or 'exit' to quit.")
@@ -51,18 +72,14 @@ def main():
         q = input("> ").strip()
         if q.lower() in {"exit", "quit"}:
             break
-        
-        # 2. Load the history from the memory object
-        chat_history = memory.load_memory_variables({}).get("chat_history", [])
 
-        # 3. Get the answer from the chain
+        # 2. Get the answer from the chain
         ans = answer(q, chat_history)
 
-        # 4. Save the original question and answer to memory for the next turn
-        # *** THE FIX IS HERE ***
-        # Use the default keys 'input' and 'output' for ConversationBufferMemory
-        memory.save_context({"input": q}, {"output": ans})
-        
+        # 3. Save the original question and answer for the next turn
+        chat_history.append({"role": "user", "content": q})
+        chat_history.append({"role": "assistant", "content": ans})
+
         print(ans)
 
 
@@ -0,0 +1,134 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When an announcement goes out, many students ask the same question within
+seconds. ChatPipeline shares the work of identical concurrent requests in
+two places:
+
+- planning (rewrite + route), keyed on the question as typed,
+- retrieval + generation, keyed on the rewritten question, so differently
+  worded questions that rewrite to the same one share an answer too.
+
+Both keys also hash the (bounded) chat history the step sees, so follow-up
+questions of different conversations never share an answer.
+
+The first request of a key (the leader) starts the step as a background
+task whose events are buffered in a `Flight`; requests arriving while it
+runs (followers) subscribe to it and get the buffered prefix replayed, then
+the remaining events as they come. The task outlives a disconnecting
+leader as long as someone is still subscribed, and is cancelled once
+nobody is. The flight ends with the step: later requests are served by the
+answer cache.
+
+Leaders and followers of each step are counted in
+r41_coalesced_requests_total, on /metrics.
+"""
+import asyncio
+import hashlib
+import json
+import re
+
+from .metrics import COALESCED_REQUESTS
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercased, whitespace-collapsed, without trailing punctuation."""
+    return _SPACES.sub(" ", question.lower()).strip().rstrip("?!. ")
+
+
+def flight_key(question: str, chat_history: list) -> str:
+    """Coalescing key of a question asked after `chat_history`."""
+    payload = json.dumps([normalize_question(question), chat_history], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """The buffered events of one in-flight step, replayed to every subscriber."""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.abandoned = False
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, event):
+        self.events.append(event)
+        self._notify()
+
+    def finish(self, error: BaseException = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        # Wake the current waiters; later ones wait on a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        """Yields every event from the first one, waiting for new ones until the step ends."""
+        self.subscribers += 1
+        try:
+            sent = 0
+            while True:
+                while sent < len(self.events):
+                    yield self.events[sent]
+                    sent += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                # Every client is gone: stop paying for the step
+                self.abandoned = True
+                self.task.cancel()
+
+
+class SingleFlight:
+    """Runs at most one step per key at a time and shares its events."""
+
+    def __init__(self, step: str):
+        self.step = step
+        self._flights = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    def join(self, key: str, produce) -> tuple:
+        """
+        Returns (Flight, leader). The leader's `produce()` (an async iterator
+        of events) is started as a task; followers get the running flight.
+        Iterate `flight.subscribe()` right away in both cases.
+        """
+        flight = self._flights.get(key)
+        if flight is not None and not flight.abandoned:
+            COALESCED_REQUESTS.inc(self.step, "follower")
+            return flight, False
+        COALESCED_REQUESTS.inc(self.step, "leader")
+        flight = self._flights[key] = Flight()
+        flight.task = asyncio.create_task(self._run(key, flight, produce))
+        return flight, True
+
+    async def _run(self, key: str, flight: Flight, produce):
+        try:
+            async for event in produce():
+                flight.publish(event)
+        except asyncio.CancelledError as e:
+            flight.finish(e)
+            raise
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
@@ -5,6 +5,109 @@ load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.5-flash")
+# "gemini", or "fake" for the scripted local stand-in (no network; tests and load tests)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+# Latency of the fake LLM: before the first token, and between streamed tokens (seconds)
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.3"))
+FAKE_LLM_TOKEN_DELAY = float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0.02"))
+# Fake LLM upstream limits: calls beyond this many in flight (0 = no limit), and this share of
+# all calls, fail with a 429 rate-limit error (exercises admission control, see admission.py)
+FAKE_LLM_MAX_CONCURRENT = int(os.getenv("FAKE_LLM_MAX_CONCURRENT", "0"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
 VECTOR_DIR = os.getenv("VECTOR_DIR", ".chroma")
 
+# ONNX threads of the FastEmbed session; 0 = one per core. serve.py splits the cores between workers
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Query embeddings are micro-batched: concurrent queries wait up to EMBED_BATCH_WAIT_MS (or until
+# EMBED_MAX_BATCH are queued) and share one model call; recent query vectors are kept in an LRU cache
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "true").lower() in ("1", "true", "yes")
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+# Size of the thread pool that runs blocking retrieval work (query embedding, BM25 scoring)
+RETRIEVAL_MAX_WORKERS = int(os.getenv("RETRIEVAL_MAX_WORKERS", "4"))
+# Single-pass planner: one LLM call returns the rewritten question, the route and the sub-questions
+PLANNER_MODE = os.getenv("PLANNER_MODE", "false").lower() in ("1", "true", "yes")
+
+# Semantic answer cache (keyed on embeddings of the rewritten question)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", ".cache/answer_cache.json")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+
+# FAQ fast path: minimum fuzzy-match score (0-100) to answer from data/faq.csv without the LLM
+FAQ_THRESHOLD = int(os.getenv("FAQ_THRESHOLD", "85"))
+
+# Load the models and indexes in a background task when the API starts (otherwise on the first request)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# Seconds between checks for a newly published index generation; the pipeline is then rebuilt
+# in the background and swapped in (0 = keep the generation loaded at startup)
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "5"))
+# Verbose logging: langchain's in the CLI, and the rewritten question, route and fact lookups of every request
+DEBUG = os.getenv("R41_DEBUG", "false").lower() in ("1", "true", "yes")
+
+# Chunks retrieved per search; one chunk is one knowledge-base entry (see chunking.py)
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "3"))
+# Hybrid retrieval scores each chunk in [0, 1]: weighted dense + BM25 relevance (see retriever.py).
+# Chunks under the floor are dropped (none left = canned "no info" reply, no generation call);
+# the ranking is cut at its largest drop if that is at least RETRIEVAL_SCORE_GAP. Calibrate with scripts/bench_retrieval.py
+RETRIEVAL_SCORE_FLOOR = float(os.getenv("RETRIEVAL_SCORE_FLOOR", "0.05"))
+RETRIEVAL_SCORE_GAP = float(os.getenv("RETRIEVAL_SCORE_GAP", "0.05"))
+# Cosine similarity of unrelated texts under the embedding model; maps to dense relevance 0
+DENSE_SCORE_BASELINE = float(os.getenv("DENSE_SCORE_BASELINE", "0.5"))
+# Route questions with the local embedding classifier (see router.py) when the index has one
+LOCAL_ROUTER = os.getenv("LOCAL_ROUTER", "true").lower() in ("1", "true", "yes")
+# Below this probability the local router defers to the LLM router
+ROUTER_CONFIDENCE = float(os.getenv("ROUTER_CONFIDENCE", "0.8"))
+# A local "irrelevant" turns the student away, so it needs more confidence
+ROUTER_IRRELEVANT_CONFIDENCE = float(os.getenv("ROUTER_IRRELEVANT_CONFIDENCE", "0.95"))
+# Identical concurrent questions share one rewrite/route and one retrieval + generation (see coalesce.py)
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() in ("1", "true", "yes")
+# Admission control of the LLM calls (see admission.py): calls in flight per process
+# (serve.py divides this and the rate limits between its workers),
+# requests per minute per call type ("generation=60,prepass=120,background=20", empty = unlimited),
+# calls allowed to wait, seconds a call may wait before failing with "busy"
+LLM_ADMISSION = os.getenv("LLM_ADMISSION", "true").lower() in ("1", "true", "yes")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+LLM_QUEUE_LIMIT = int(os.getenv("LLM_QUEUE_LIMIT", "64"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+# Retries of upstream rate-limit errors, with full-jitter exponential backoff (seconds)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "8"))
+# CLI batch mode (see batch.py): questions in flight, query-embedding batching window (ms),
+# retries of a question refused as "busy" by admission control
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_EMBED_WAIT_MS = float(os.getenv("BATCH_EMBED_WAIT_MS", "25"))
+BATCH_BUSY_RETRIES = int(os.getenv("BATCH_BUSY_RETRIES", "3"))
+# Reciprocal-rank fusion constant (higher = flatter fusion of ranks)
+RRF_C = int(os.getenv("RRF_C", "60"))
+# At most this many decomposed sub-questions are retrieved for one question
+MAX_SUB_QUESTIONS = int(os.getenv("MAX_SUB_QUESTIONS", "4"))
+# Upper bound on the retrieved context sent to the LLM, in (estimated) tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Dense vector backend: "chroma" or "numpy" (in-process, memory-mapped exact search)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+
+# Chat history sent to the LLM: the last N turns verbatim, older turns folded into a rolling summary
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "4"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "800"))
+HISTORY_SUMMARY_SESSIONS = int(os.getenv("HISTORY_SUMMARY_SESSIONS", "1024"))
+
+# Server-side chat sessions (clients send a session_id instead of the whole history)
+# "memory" (per-process LRU) or "sqlite" (shared by all workers on the machine)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", ".cache/sessions.sqlite3")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "50"))
+
+# /chat server-sent events: send a keep-alive comment after this many idle seconds
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+
+# Append one JSON line per answered question (stage timings, tokens, cache hits) to this file; empty = off
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")
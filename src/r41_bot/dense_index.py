@@ -0,0 +1,103 @@
+"""
+In-process dense index: an alternative to Chroma for small corpora.
+
+The knowledge base is a few hundred chunks, so exact search over a NumPy
+matrix is both simpler and faster than a SQLite-backed vector database.
+The index is built by scripts/index_faq.py into a directory of the index
+generation:
+
+    dense/
+        vectors.npy     float32[N, dim], L2-normalized chunk embeddings (memory-mapped)
+        docs.json       [{"id", "page_content", "metadata"}] per row
+
+Select it with VECTOR_BACKEND=numpy.
+"""
+import json
+import os
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from .metadata import MetadataColumns
+
+DENSE_DIR = "dense"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class DenseIndex:
+    """Exact cosine top-k search over a normalized embedding matrix."""
+
+    def __init__(self, vectors: np.ndarray, docs: list):
+        self.vectors = vectors
+        self.docs = docs
+        self.columns = MetadataColumns(docs)
+
+    def __len__(self):
+        return len(self.docs)
+
+    @classmethod
+    def build(cls, documents: list, embeddings: list, ids: list):
+        docs = [
+            {"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata}
+            for doc_id, doc in zip(ids, documents)
+        ]
+        return cls(_normalize(embeddings), docs)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        with open(os.path.join(directory, "docs.json"), "w", encoding="utf-8") as f:
+            json.dump(self.docs, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str):
+        """Loads a saved index, memory-mapping the embedding matrix."""
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "docs.json"), encoding="utf-8") as f:
+            docs = json.load(f)
+        return cls(vectors, docs)
+
+    def search_many(self, query_vectors, k: int, rows: np.ndarray = None) -> list:
+        """
+        Top-k rows for each query vector with a single matrix multiply.
+        `rows` restricts the search to those candidate rows.
+        Returns one [(row, score)] list per query, best first.
+        """
+        queries = _normalize(np.atleast_2d(query_vectors))
+        matrix = self.vectors if rows is None else self.vectors[rows]
+        k = min(k, len(matrix))
+        if k == 0:
+            return [[] for _ in queries]
+
+        scores = queries @ matrix.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_scores, row_top in zip(scores, top):
+            row_top = row_top[np.argsort(-row_scores[row_top])]
+            ids = row_top if rows is None else rows[row_top]
+            results.append([(int(i), float(row_scores[j])) for i, j in zip(ids, row_top)])
+        return results
+
+    def document(self, i: int) -> Document:
+        doc = self.docs[i]
+        return Document(page_content=doc["page_content"], metadata=doc["metadata"], id=doc["id"])
+
+    # Same method names as the langchain vector stores used by HybridRetriever
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, filters: dict = None) -> list:
+        return self.similarity_search_many_by_vector([embedding], k, filters)[0]
+
+    def similarity_search_many_by_vector(self, embeddings, k: int = 4, filters: dict = None) -> list:
+        """`filters` (see metadata.extract_filters) prune the candidates before scoring."""
+        results = self.similarity_search_many_with_scores(embeddings, k, filters)
+        return [[doc for doc, _ in hits] for hits in results]
+
+    def similarity_search_many_with_scores(self, embeddings, k: int = 4, filters: dict = None) -> list:
+        """Like `similarity_search_many_by_vector`, with the cosine similarity of each hit."""
+        rows = self.columns.rows(filters)
+        return [[(self.document(i), score) for i, score in hits] for hits in self.search_many(embeddings, k, rows)]
@@ -0,0 +1,172 @@
+"""
+Micro-batching query embedder.
+
+Every question, and every decomposed sub-question, needs a query embedding.
+One ONNX call per query pays the per-call overhead each time, which adds up
+when many students ask at once. `BatchingEmbedder` wraps the FastEmbed model:
+queries submitted from any thread or coroutine are queued, a background
+thread waits up to `max_wait` seconds (or until `max_batch` are queued), runs
+one batched inference and resolves each caller's future. Recently embedded
+queries are answered from an LRU cache without queueing at all.
+
+The sync methods (`embed_query`, `embed_many`) block on the future and serve
+the CLI and the retrieval executor; the async ones (`aembed_query`,
+`aembed_many`) await it without holding a thread.
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_community.embeddings import FastEmbedEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from .config import EMBED_BATCH_WAIT_MS, EMBED_CACHE_SIZE, EMBED_MAX_BATCH
+from .metrics import EMBED_BATCH_SIZE, EMBED_CACHE_LOOKUPS
+
+
+def embed_queries(embedding, questions: list) -> list:
+    """
+    Embeds several queries with a single model call when the embedder
+    supports it (FastEmbed), one by one otherwise.
+    """
+    if isinstance(embedding, BatchingEmbedder):
+        return embedding.embed_many(questions)
+    if isinstance(embedding, FastEmbedEmbeddings):
+        # The wrapper only embeds one query at a time; its `model` field (langchain-community
+        # >= 0.3) is the fastembed TextEmbedding, whose query_embed takes a list and adds
+        # the same query prefix
+        vectors = embedding.model.query_embed(questions, batch_size=embedding.batch_size, parallel=embedding.parallel)
+        return [vector.tolist() for vector in vectors]
+    return [embedding.embed_query(q) for q in questions]
+
+
+class BatchingEmbedder(Embeddings):
+    """Embeddings wrapper that batches concurrent query embeddings and caches recent ones."""
+
+    def __init__(
+        self,
+        embedding,
+        max_batch: int = EMBED_MAX_BATCH,
+        max_wait: float = EMBED_BATCH_WAIT_MS / 1000,
+        cache_size: int = EMBED_CACHE_SIZE,
+    ):
+        self.embedding = embedding
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    # --- Embeddings interface ---
+
+    def embed_documents(self, texts: list) -> list:
+        # Indexing-time calls are already batched by the caller
+        return self.embedding.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_many([text])[0]
+
+    async def aembed_query(self, text: str) -> list:
+        return (await self.aembed_many([text]))[0]
+
+    # --- Batched queries ---
+
+    def embed_many(self, texts: list) -> list:
+        return [future.result() for future in self.submit(texts)]
+
+    async def aembed_many(self, texts: list) -> list:
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in self.submit(texts))))
+
+    def submit(self, texts: list) -> list:
+        """Returns one Future per text, resolved from the cache or by the next batch."""
+        futures = []
+        for text in texts:
+            future = Future()
+            vector = self._cached(text)
+            if vector is not None:
+                future.set_result(vector)
+            else:
+                self._ensure_worker()
+                self._queue.put((text, future))
+            futures.append(future)
+        return futures
+
+    # --- LRU cache ---
+
+    def _cached(self, text: str):
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+        EMBED_CACHE_LOOKUPS.inc("hit" if vector is not None else "miss")
+        return vector.tolist() if vector is not None else None
+
+    def _remember(self, text: str, vector: list):
+        if self.cache_size <= 0:
+            return
+        # float32 arrays: a fraction of the memory of lists of Python floats
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._cache_lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- Background batching thread ---
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._worker.start()
+
+    def _next_batch(self) -> list:
+        """Blocks for the first query, then collects more for up to `max_wait`."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._embed_batch(batch)
+            except Exception as e:
+                # The thread serves every later query: never let it die
+                print(f"[Embedding batch failed: {e}]")
+
+    def _embed_batch(self, batch: list):
+        # Callers cancelled while queued (client disconnects) are dropped
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # The same question asked by several students is embedded once
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = dict(zip(texts, embed_queries(self.embedding, texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        EMBED_BATCH_SIZE.observe(len(texts))
+        for text, vector in vectors.items():
+            self._remember(text, vector)
+        for text, future in batch:
+            future.set_result(vectors[text])
@@ -0,0 +1,250 @@
+"""
+Structured facts of the knowledge base, for direct answers to lookups.
+
+Bureau files are lists of "- **Role** Name" lines and formation/event
+entries carry Date/Mentor/Speakers/Location fields (see chunking.py). The
+indexer extracts them from its chunks into a small SQLite file stored with
+each index generation:
+
+    facts.sqlite3
+        roles(academic_year, role, name)
+        entries(category, academic_year, title, date, mentor, speakers, location)
+
+Questions routed to `fact_lookup` ("who was treasurer in 2023-2024?", "when
+was Data Connect Day?") are answered from it with a template, without the
+retrieval and generation steps. `FactIndex.answer` returns None when the
+question doesn't match a record unambiguously; the pipeline then falls back
+to RAG.
+"""
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from .metadata import academic_years
+
+FACTS_FILE = "facts.sqlite3"
+
+_ROLE_LINE = re.compile(r"^\s*-\s*\*\*([^*]+?):?\*\*:?\s*(.+?)\s*$", re.MULTILINE)
+_WORD = re.compile(r"\w+")
+_STOPWORDS = {
+    "a", "an", "and", "at", "by", "de", "des", "for", "in", "of", "on", "the", "to", "with", "your",
+}
+# Title words that don't identify an entry on their own
+_GENERIC = {"session", "workshop", "training", "event", "day", "part"}
+# Share of a title's (or title part's) words the question must contain
+TITLE_MATCH = 0.75
+# Share of a role's words the question must contain
+ROLE_MATCH = 0.6
+
+# Question words -> the field asked about
+_FIELD_WORDS = {
+    "date": re.compile(r"\b(when|date|what day)\b"),
+    "location": re.compile(r"\b(where|location|room|salle)\b"),
+    "people": re.compile(r"\b(who|mentors?|mentored|taught|teach|speakers?|spoke|presented|ran|gave|led)\b"),
+}
+_UPCOMING = re.compile(r"\b(next|upcoming)\b")
+# "Machine Learning Saturday Nights: Session 3 - Deep Learning Basics" is also matched by its parts
+_TITLE_PARTS = re.compile(r":|\s[-–&]\s|\sand\s")
+
+
+def _words(text: str) -> list:
+    """Lowercased words, with a naive plural strip ("leads" -> "lead")."""
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _keywords(text: str) -> set:
+    return {w for w in _words(text) if w not in _STOPWORDS}
+
+
+def _overlap(keywords: set, question: set):
+    """(share of `keywords` in the question, number of them)."""
+    if not keywords:
+        return 0.0, 0
+    matched = len(keywords & question)
+    return matched / len(keywords), matched
+
+
+def _parse_date(text: str):
+    try:
+        return datetime.strptime(text.strip(), "%B %d, %Y")
+    except (ValueError, AttributeError):
+        return None
+
+
+# --- Extraction (indexer side) ---
+
+def extract_facts(chunks: list):
+    """
+    Role and entry records from knowledge-base chunks (chunking.split_markdown
+    output). Returns (roles, entries) as lists of dicts.
+    """
+    roles, entries = [], []
+    for chunk in chunks:
+        metadata = chunk.metadata
+        year = metadata.get("academic_year", "")
+        category = metadata.get("category", "")
+        if category == "bureau":
+            for role, name in _ROLE_LINE.findall(chunk.page_content):
+                roles.append({"academic_year": year, "role": role.strip(), "name": name.strip()})
+        elif category in ("formations", "events") and metadata.get("section"):
+            entries.append({
+                "category": category,
+                "academic_year": year,
+                "title": metadata["section"],
+                "date": metadata.get("date", ""),
+                "mentor": metadata.get("mentor") or metadata.get("mentors", ""),
+                "speakers": metadata.get("speakers") or metadata.get("speaker", ""),
+                "location": metadata.get("location", ""),
+            })
+    # Oversized entries come as several chunks with the same metadata
+    unique = {tuple(sorted(e.items())): e for e in entries}
+    return roles, list(unique.values())
+
+
+def save_facts(path: str, roles: list, entries: list):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.executescript(
+                """
+                CREATE TABLE roles (academic_year TEXT, role TEXT, name TEXT);
+                CREATE INDEX roles_year ON roles (academic_year);
+                CREATE TABLE entries (
+                    category TEXT, academic_year TEXT, title TEXT,
+                    date TEXT, mentor TEXT, speakers TEXT, location TEXT
+                );
+                CREATE INDEX entries_year ON entries (academic_year);
+                """
+            )
+            conn.executemany("INSERT INTO roles VALUES (:academic_year, :role, :name)", roles)
+            conn.executemany(
+                "INSERT INTO entries VALUES (:category, :academic_year, :title, :date, :mentor, :speakers, :location)",
+                entries,
+            )
+    finally:
+        conn.close()
+
+
+# --- Lookup (API side) ---
+
+class FactIndex:
+    """The fact tables of one index generation, loaded into memory (they are tiny)."""
+
+    def __init__(self, roles: list, entries: list):
+        self.roles = [{**r, "keywords": _keywords(r["role"])} for r in roles]
+        self.entries = [
+            {**e, "parts": [_keywords(p) for p in [e["title"], *_TITLE_PARTS.split(e["title"])]]}
+            for e in entries
+        ]
+
+    def __len__(self):
+        return len(self.roles) + len(self.entries)
+
+    @classmethod
+    def load(cls, path: str):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            roles = [dict(row) for row in conn.execute("SELECT * FROM roles")]
+            entries = [dict(row) for row in conn.execute("SELECT * FROM entries")]
+        finally:
+            conn.close()
+        return cls(roles, entries)
+
+    def answer(self, question: str):
+        """A templated answer to `question`, or None if no record matches it unambiguously."""
+        lowered = question.lower()
+        words = set(_words(question))
+        years = academic_years(question)
+
+        field = next((f for f, pattern in _FIELD_WORDS.items() if pattern.search(lowered)), None)
+        if field is not None:
+            entries = self._match_entries(words, years, upcoming=bool(_UPCOMING.search(lowered)))
+            if entries:
+                return _entry_answer(entries, field)
+        if "who" in words or "name" in words:
+            roles = self._match_roles(words, years)
+            if roles:
+                return "\n".join(f"{r['role']} of the R41 bureau ({r['academic_year']}): {r['name']}." for r in roles)
+        if "who" in words or "role" in words or "position" in words:
+            roles = self._match_names(words, years)
+            if roles:
+                return "\n".join(f"{r['name']}: {r['role']} of the R41 bureau ({r['academic_year']})." for r in roles)
+        return None
+
+    def _match_entries(self, words: set, years: list, upcoming: bool = False) -> list:
+        best, matches = (TITLE_MATCH, 1), []
+        for entry in self.entries:
+            if years and entry["academic_year"] not in years:
+                continue
+            for part in entry["parts"]:
+                if not (part - _GENERIC) & words:
+                    continue
+                score = _overlap(part, words)
+                if score > best:
+                    best, matches = score, [entry]
+                elif score == best and entry not in matches:
+                    matches.append(entry)
+        if upcoming:
+            today = datetime.now()
+            dated = sorted((d, e) for e in matches if (d := _parse_date(e["date"])) and d >= today)
+            return [dated[0][1]] if dated else []
+        return matches
+
+    def _match_roles(self, words: set, years: list) -> list:
+        best, matches = (ROLE_MATCH, 1), []
+        for role in self.roles:
+            if years and role["academic_year"] not in years:
+                continue
+            score = _overlap(role["keywords"], words)
+            if score > best:
+                best, matches = score, [role]
+            elif score == best:
+                matches.append(role)
+        if matches and not years:
+            # "who is the treasurer?" without a year: the latest bureau that has the role
+            latest = max(r["academic_year"] for r in matches)
+            matches = [r for r in matches if r["academic_year"] == latest]
+        return matches
+
+    def _match_names(self, words: set, years: list) -> list:
+        matches = []
+        for role in self.roles:
+            if years and role["academic_year"] not in years:
+                continue
+            if len(set(_words(role["name"])) & words) >= 2:
+                matches.append(role)
+        return matches
+
+
+def _entry_answer(entries: list, field: str):
+    lines = []
+    for entry in entries:
+        if field == "people":
+            if entry["mentor"]:
+                lines.append(f"Mentor of {entry['title']} ({entry['academic_year']}): {entry['mentor']}.")
+            elif entry["speakers"]:
+                lines.append(f"Speakers at {entry['title']} ({entry['academic_year']}): {entry['speakers']}.")
+        elif entry[field]:
+            label = "Date" if field == "date" else "Location"
+            lines.append(f"{label} of {entry['title']} ({entry['academic_year']}): {entry[field]}.")
+    # A field missing from any matched entry: let RAG say what it can
+    if len(lines) != len(entries):
+        return None
+    return "\n".join(lines)
+
+
+def load_fact_index(index_dir: str):
+    """The FactIndex of an index generation, or None for indexes built before it existed."""
+    path = os.path.join(index_dir, FACTS_FILE)
+    if not os.path.exists(path):
+        return None
+    return FactIndex.load(path)
@@ -0,0 +1,162 @@
+"""
+Scripted stand-in for the Gemini chat model (LLM_PROVIDER=fake).
+
+It recognizes each prompt of prompts.py and answers with well-formed output
+for it (rewritten question, router/planner/decomposition JSON, summary,
+answer), after a configurable latency and with the answer streamed token by
+token. No network, no API key: the /chat pipeline can be run end to end and
+load-tested for our own overhead (see scripts/load_test.py).
+
+Like the real API, it can refuse calls with a 429 error: beyond
+`max_concurrent` calls in flight, or at random with `error_rate`, to
+exercise admission control (see admission.py).
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from contextlib import contextmanager
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field, PrivateAttr
+
+# Off-topic questions the router and planner send to "irrelevant"
+IRRELEVANT_WORDS = ("weather", "capital of", "football", "recipe")
+# Questions the router and planner send to "fact_lookup", as the real prompts define them:
+# who held a bureau role, or the date, place, mentor or speakers of a named event
+FACT_QUESTION = re.compile(
+    r"^\s*(who\s+(is|was|were)\s+(the\s+)?(\w+\s+)?"
+    r"(president|vice[- ]president|treasurer|secretary|lead|designer|editor|manager|mentor|speakers?)\b"
+    r"|(when|where)\s+(is|was|did|does|will)\b.*\b(day|event|workshop|formation|training|conference|ceremony)\b)",
+    re.IGNORECASE,
+)
+
+# Prompt kinds, by a phrase of their template in prompts.py; any other prompt asks for an answer
+PROMPT_KINDS = (
+    ("query planner", "plan"),
+    ("expert at rewriting", "rewrite"),
+    ("expert at routing", "route"),
+    ("sub-questions", "decomposition"),
+    ("running summary", "summary"),
+)
+
+# The last quoted or line-wrapped question in a prompt
+_QUESTION = re.compile(r'question:\s*(?:"([^"\n]*)"|\n?([^\n]+))', re.IGNORECASE)
+
+
+def _last_question(prompt: str) -> str:
+    matches = _QUESTION.findall(prompt)
+    if not matches:
+        return ""
+    quoted, plain = matches[-1]
+    return (quoted or plain).strip()
+
+
+class FakeRateLimitError(Exception):
+    """What the fake upstream raises when over its limits (HTTP 429)."""
+
+    code = 429
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Deterministic fake LLM with Gemini-like latency."""
+
+    # Seconds before the first token (or the whole reply, when not streaming)
+    latency: float = 0.3
+    # Seconds between streamed tokens
+    token_delay: float = 0.02
+    # Words in a generated answer
+    answer_words: int = 40
+    # Calls in flight beyond this fail with FakeRateLimitError (0 = no limit)
+    max_concurrent: int = 0
+    # Share of calls failing with FakeRateLimitError (seeded, reproducible)
+    error_rate: float = 0.0
+    # Replies replacing the scripted ones, by prompt kind (see PROMPT_KINDS, or "answer")
+    replies: dict = Field(default_factory=dict)
+    # Prompt of every call that reached the model, in order
+    prompts: list = Field(default_factory=list)
+
+    _in_flight: int = PrivateAttr(default=0)
+    _random: random.Random = PrivateAttr(default_factory=lambda: random.Random(0))
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def reply(self, prompt: str) -> str:
+        kind = next((kind for phrase, kind in PROMPT_KINDS if phrase in prompt), "answer")
+        if kind in self.replies:
+            return self.replies[kind]
+        question = _last_question(prompt)
+        irrelevant = any(word in question.lower() for word in IRRELEVANT_WORDS)
+        route = "irrelevant" if irrelevant else "fact_lookup" if FACT_QUESTION.match(question) else "vector_search"
+
+        if kind == "plan":
+            return json.dumps({
+                "question": question,
+                "route": route,
+                "questions": [] if irrelevant else [question],
+            })
+        if kind == "rewrite":
+            return question
+        if kind == "route":
+            return json.dumps({"route": route})
+        if kind == "decomposition":
+            return json.dumps({"questions": [question]})
+        if kind == "summary":
+            return "The student asked about the R41 club."
+        words = f"Here is what the club's records say about {question}".split()
+        filler = ["R41", "ENSA", "Berrechid", "club", "members", "events", "formations"]
+        while len(words) < self.answer_words:
+            words.append(filler[len(words) % len(filler)])
+        return " ".join(words) + "."
+
+    @contextmanager
+    def _upstream(self):
+        """One call in flight, refused like an overloaded API would."""
+        if self.max_concurrent and self._in_flight >= self.max_concurrent:
+            raise FakeRateLimitError("429 Resource exhausted: too many concurrent requests")
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise FakeRateLimitError("429 Resource exhausted: quota exceeded")
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    def _prompt(self, messages) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        self.prompts.append(prompt)
+        return prompt
+
+    def _result(self, messages) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply(self._prompt(messages))))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._upstream():
+            time.sleep(self.latency)
+            return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._upstream():
+            await asyncio.sleep(self.latency)
+            return self._result(messages)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._upstream():
+            time.sleep(self.latency)
+            for i, token in enumerate(self.reply(self._prompt(messages)).split(" ")):
+                if i:
+                    time.sleep(self.token_delay)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=(" " if i else "") + token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._upstream():
+            await asyncio.sleep(self.latency)
+            for i, token in enumerate(self.reply(self._prompt(messages)).split(" ")):
+                if i:
+                    await asyncio.sleep(self.token_delay)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=(" " if i else "") + token))
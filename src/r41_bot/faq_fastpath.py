@@ -1,26 +1,134 @@
 import os, csv
+import threading
+import time
 from rapidfuzz import fuzz, process
-import json
+from rapidfuzz.utils import default_process
 
-def load_questions():
-    # repo root -> data/faq.csv
-    here = os.path.dirname(__file__)
-    root = os.path.abspath(os.path.join(here, "..", ".."))
-    path = os.path.join(root, "data", "faq.csv")
+from .config import FAQ_THRESHOLD
+
+# repo root -> data/faq.csv
+FAQ_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "faq.csv"))
+
+
+def load_questions(path: str = FAQ_PATH):
+    """(question, answer) pairs of the CSV; rows missing either are skipped."""
     items = []
     with open(path, encoding="utf-8") as f:
-        for r in csv.DictReader(f):
-            items.append((r["question"].strip(), r["answer"].strip()))
+        reader = csv.DictReader(f)
+        missing = {"question", "answer"} - set(reader.fieldnames or [])
+        if missing:
+            raise KeyError(f"missing column(s): {', '.join(sorted(missing))}")
+        for r in reader:
+            question, answer = (r.get("question") or "").strip(), (r.get("answer") or "").strip()
+            if question and answer:
+                items.append((question, answer))
     return items
 
-FAQ_PAIRS = load_questions()
-FAQ_QUESTIONS = [q for q,_ in FAQ_PAIRS]
-
-def try_fastpath(user_q: str, threshold: int = 85):
-    # fuzzy match against canonical FAQ questions
-    match = process.extractOne(user_q, FAQ_QUESTIONS, scorer=fuzz.token_set_ratio)
-    if match and match[1] >= threshold:
-        # return the matched answer
-        idx = FAQ_QUESTIONS.index(match[0])
-        return FAQ_PAIRS[idx][1]
-    return None
+
+class FaqIndex:
+    """
+    Fuzzy matcher over the canonical FAQ questions.
+    The CSV is loaded on first use and reloaded whenever its mtime changes;
+    a missing file simply disables the fast path, and so does a malformed
+    one (reported once per version of the file).
+    """
+
+    def __init__(self, path: str = FAQ_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        # Normalized questions (matched against) and answers, aligned by index
+        self._choices = []
+        self._answers = []
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                pairs = load_questions(self.path) if mtime is not None else []
+            except (KeyError, ValueError, csv.Error) as e:
+                # No "question"/"answer" header, not UTF-8 (UnicodeDecodeError), ...
+                # The mtime is still recorded: retried once the file changes, not on every request
+                print(f"[FAQ fast path disabled, cannot read {self.path}: {type(e).__name__}: {e}]")
+                pairs = []
+            # Swap both lists in one assignment so readers never see them misaligned
+            self._choices, self._answers = (
+                [default_process(q) for q, _ in pairs],
+                [a for _, a in pairs],
+            )
+            self._mtime = mtime
+
+    def match(self, user_q: str, threshold: int = FAQ_THRESHOLD):
+        """Returns the answer of the best matching FAQ question, or None."""
+        self._refresh()
+        choices, answers = self._choices, self._answers
+        if not choices:
+            return None
+        # fuzzy match against canonical FAQ questions; extractOne returns the index directly
+        match = process.extractOne(
+            default_process(user_q),
+            choices,
+            scorer=fuzz.token_set_ratio,
+            processor=None,
+            score_cutoff=threshold,
+        )
+        if match is None:
+            return None
+        return answers[match[2]]
+
+
+FAQ_INDEX = FaqIndex()
+
+# Counters behind fastpath_metrics()
+_METRICS = {
+    "lookups": 0,
+    "hits": 0,
+    "lookup_seconds": 0.0,
+    "pipeline_runs": 0,
+    "pipeline_seconds": 0.0,
+}
+
+
+def try_fastpath(user_q: str, threshold: int = FAQ_THRESHOLD):
+    start = time.perf_counter()
+    answer = FAQ_INDEX.match(user_q, threshold)
+    _METRICS["lookups"] += 1
+    _METRICS["lookup_seconds"] += time.perf_counter() - start
+    if answer is not None:
+        _METRICS["hits"] += 1
+    return answer
+
+
+def record_pipeline_latency(seconds: float):
+    """Records how long a question took through the full LLM pipeline."""
+    _METRICS["pipeline_runs"] += 1
+    _METRICS["pipeline_seconds"] += seconds
+
+
+def fastpath_metrics() -> dict:
+    """
+    Hit rate of the fast path and the latency it saved, estimated as
+    hits x (average pipeline latency - average lookup latency).
+    """
+    lookups = _METRICS["lookups"]
+    hits = _METRICS["hits"]
+    avg_lookup = _METRICS["lookup_seconds"] / lookups if lookups else 0.0
+    avg_pipeline = (
+        _METRICS["pipeline_seconds"] / _METRICS["pipeline_runs"] if _METRICS["pipeline_runs"] else 0.0
+    )
+    return {
+        "lookups": lookups,
+        "hits": hits,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "avg_lookup_ms": avg_lookup * 1000,
+        "avg_pipeline_s": avg_pipeline,
+        "estimated_seconds_saved": hits * max(avg_pipeline - avg_lookup, 0.0),
+    }
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+
+from .chains import estimate_tokens
+from .config import HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_SESSIONS
+
+# Message types used by langchain memory objects -> API roles
+_ROLES = {"human": "user", "ai": "assistant"}
+
+
+def normalize_history(chat_history: list) -> list:
+    """Converts API dicts, Pydantic models and langchain messages to {"role", "content"} dicts."""
+    messages = []
+    for msg in chat_history or []:
+        if hasattr(msg, "type") and hasattr(msg, "content"):
+            role, content = msg.type, msg.content
+        else:
+            if hasattr(msg, "model_dump"):
+                msg = msg.model_dump()
+            role = msg.get("role", msg.get("type", "unknown"))
+            content = msg.get("content", "")
+        messages.append({"role": _ROLES.get(role, role), "content": content})
+    return messages
+
+
+def _fingerprint(messages: list) -> str:
+    return hashlib.sha1(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class HistoryManager:
+    """
+    Bounds the chat history sent to the LLM.
+
+    The last `max_turns` turns are kept verbatim; older turns are folded into
+    a rolling summary, updated incrementally (only the newly aged-out lines
+    are summarized) and cached per session. The result is trimmed, oldest
+    first, to `token_budget` estimated tokens.
+
+    In the async path the summary is updated in the background, so a turn
+    never waits for it: until the update lands, the aged-out lines not yet
+    covered by the cached summary are kept verbatim if the budget allows.
+
+    Summaries count the messages they cover from the start of the
+    conversation. A server-side session only returns its last
+    SESSION_MAX_TURNS turns, so the caller passes `offset`, the number of
+    messages dropped before `chat_history`; the summary then stays valid as
+    the window slides. Client-sent histories (offset None) are complete, and
+    the summary must cover a prefix of exactly the same messages.
+    """
+
+    def __init__(
+        self,
+        summary_chain,
+        max_turns: int = HISTORY_MAX_TURNS,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        max_sessions: int = HISTORY_SUMMARY_SESSIONS,
+    ):
+        self.summary_chain = summary_chain
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        # session key -> {"covered": n messages summarized since the start of the conversation,
+        #                 "prefix": fingerprint of them (client-sent histories), "summary": str}
+        self._summaries = OrderedDict()
+        self._pending = {}
+
+    # --- Public API ---
+
+    def prepare(self, chat_history: list, session_id: str = None, offset: int = None) -> list:
+        """Returns the bounded history, updating the summary inline (blocking)."""
+        messages = normalize_history(chat_history)
+        older, window = self._split(messages)
+        if not older:
+            return self._fit(None, window)
+
+        key = self._key(older, session_id)
+        entry = self._cached(key, older, offset)
+        if entry is None or self._start(entry, offset) < len(older):
+            entry = self._store(key, older, offset, self._summarize(entry, older, offset))
+        return self._fit(entry["summary"], window)
+
+    async def aprepare(self, chat_history: list, session_id: str = None, offset: int = None) -> list:
+        """Returns the bounded history at once; the summary catches up in the background."""
+        messages = normalize_history(chat_history)
+        older, window = self._split(messages)
+        if not older:
+            return self._fit(None, window)
+
+        key = self._key(older, session_id)
+        entry = self._cached(key, older, offset)
+        start = self._start(entry, offset)
+        if start < len(older) and key not in self._pending:
+            task = asyncio.create_task(self._aupdate(key, entry, older, offset))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        summary = entry["summary"] if entry is not None else None
+        return self._fit(summary, older[start:] + window)
+
+    # --- Internals ---
+
+    def _split(self, messages: list):
+        keep = self.max_turns * 2
+        if len(messages) <= keep:
+            return [], messages
+        return messages[:-keep], messages[-keep:]
+
+    def _key(self, older: list, session_id: str = None) -> str:
+        # Clients resend the whole history, so its opening turn identifies the session
+        return session_id or _fingerprint(older[:2])
+
+    @staticmethod
+    def _start(entry, offset: int = None) -> int:
+        """Index in `older` of the first message the summary does not cover yet."""
+        if entry is None:
+            return 0
+        # Messages that slid out of a session before being summarized are lost
+        return max(0, entry["covered"] - (offset or 0))
+
+    def _cached(self, key: str, older: list, offset: int = None):
+        entry = self._summaries.get(key)
+        if entry is None:
+            return None
+        start = self._start(entry, offset)
+        if start > len(older):
+            # Ahead of this history: another conversation (or a restarted session)
+            return None
+        # A client-sent history must start with exactly the summarized messages
+        if offset is None and entry["prefix"] != _fingerprint(older[:start]):
+            return None
+        self._summaries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, older: list, offset: int, summary: str) -> dict:
+        entry = {"covered": (offset or 0) + len(older), "prefix": _fingerprint(older), "summary": summary}
+        self._summaries[key] = entry
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.max_sessions:
+            self._summaries.popitem(last=False)
+        return entry
+
+    def _summary_inputs(self, entry, older: list, offset: int = None) -> dict:
+        new_lines = "\n".join(
+            f"{m['role'].capitalize()}: {m['content']}" for m in older[self._start(entry, offset):]
+        )
+        summary = entry["summary"] if entry is not None else "No summary yet."
+        return {"summary": summary, "new_lines": new_lines}
+
+    def _summarize(self, entry, older: list, offset: int = None) -> str:
+        return self.summary_chain.invoke(self._summary_inputs(entry, older, offset)).strip()
+
+    async def _aupdate(self, key: str, entry, older: list, offset: int = None):
+        try:
+            summary = await self.summary_chain.ainvoke(self._summary_inputs(entry, older, offset))
+        except Exception as e:
+            # A failed summary only costs context on the next turn
+            print(f"[History summary failed: {e}]")
+            return
+        self._store(key, older, offset, summary.strip())
+
+    def _fit(self, summary, messages: list) -> list:
+        """
+        Keeps the summary and the newest messages that fit in the token budget.
+        The summary gets at most half of it, so the latest message always fits
+        at least in part.
+        """
+        budget = self.token_budget
+        head = []
+        if summary:
+            content = f"Summary of the earlier conversation: {summary}"
+            # Keep the end of an oversized summary: the most recently folded turns
+            content = content[max(0, len(content) - budget // 2 * 4):]
+            head = [{"role": "system", "content": content}]
+            budget -= estimate_tokens(content)
+
+        kept = []
+        for msg in reversed(messages):
+            cost = estimate_tokens(msg["content"])
+            if cost > budget:
+                if not kept:
+                    # Always keep (the end of) the latest message
+                    content = msg["content"]
+                    kept.append({**msg, "content": content[len(content) - max(budget, 1) * 4:]})
+                break
+            kept.append(msg)
+            budget -= cost
+        return head + kept[::-1]
@@ -0,0 +1,171 @@
+"""
+On-disk layout of the vector index.
+
+Each build of the index is written to its own generation directory under
+VECTOR_DIR. The CURRENT file names the live generation and is replaced
+atomically once a build is complete, so readers never see a half-built store:
+
+    .chroma/
+        CURRENT               {"current": "gen-...", "previous": "gen-..."}
+        gen-1700000000000/    chroma.sqlite3, manifest.json, ...
+        gen-1700000500000/
+
+Indexes built before generations existed live directly in VECTOR_DIR and are
+still readable.
+
+A process serving a generation holds a lease on it (a file named after its
+PID under `<generation>/.leases/`); publishing never deletes a generation
+that a live process still leases, however many reindexes happen meanwhile.
+Servers switch to a new generation on their own (see Registry) and release
+the old one.
+"""
+import atexit
+import json
+import os
+import shutil
+
+from .config import VECTOR_DIR
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+LEASES_DIR = ".leases"
+
+
+def read_current(vector_dir: str = VECTOR_DIR):
+    """Returns the parsed CURRENT file, or None for a legacy/missing index."""
+    try:
+        with open(os.path.join(vector_dir, CURRENT_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def live_index_dir(vector_dir: str = VECTOR_DIR) -> str:
+    """Directory of the live index generation."""
+    current = read_current(vector_dir)
+    if current is None:
+        return vector_dir
+    return os.path.join(vector_dir, current["current"])
+
+
+def live_index(vector_dir: str = VECTOR_DIR) -> tuple:
+    """(index_version, directory) of the live generation, from a single read of CURRENT."""
+    current = read_current(vector_dir)
+    if current is None:
+        return index_version(vector_dir), vector_dir
+    return current["current"], os.path.join(vector_dir, current["current"])
+
+
+def index_version(vector_dir: str = VECTOR_DIR) -> str:
+    """
+    Returns a fingerprint of the live index; it changes whenever a new
+    generation is published. Empty if no index exists.
+    """
+    current = read_current(vector_dir)
+    if current is not None:
+        return current["current"]
+    # Legacy index written straight into VECTOR_DIR
+    try:
+        stat = os.stat(os.path.join(vector_dir, "chroma.sqlite3"))
+    except FileNotFoundError:
+        return ""
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def load_manifest(index_dir: str) -> dict:
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"files": {}}
+
+
+def save_manifest(index_dir: str, manifest: dict):
+    with open(os.path.join(index_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def acquire_lease(index_dir: str):
+    """Marks `index_dir` as in use by this process until `release_lease` (or exit)."""
+    leases = os.path.join(index_dir, LEASES_DIR)
+    os.makedirs(leases, exist_ok=True)
+    open(os.path.join(leases, str(os.getpid())), "w").close()
+    atexit.register(release_lease, index_dir)
+
+
+def release_lease(index_dir: str):
+    try:
+        os.remove(os.path.join(index_dir, LEASES_DIR, str(os.getpid())))
+    except FileNotFoundError:
+        pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Someone else's process, but alive
+        return True
+    return True
+
+
+def in_use(index_dir: str) -> bool:
+    """Whether a live process holds a lease on `index_dir`; leases of dead processes are dropped."""
+    try:
+        names = os.listdir(os.path.join(index_dir, LEASES_DIR))
+    except FileNotFoundError:
+        return False
+    used = False
+    for name in names:
+        if name.isdigit() and _pid_alive(int(name)):
+            used = True
+        else:
+            try:
+                os.remove(os.path.join(index_dir, LEASES_DIR, name))
+            except FileNotFoundError:
+                pass
+    return used
+
+
+def publish(generation: str, vector_dir: str = VECTOR_DIR):
+    """
+    Atomically makes `generation` the live index, keeping the previous
+    generation on disk (a running server may not have switched yet) and
+    every generation still leased; anything older is deleted.
+    """
+    current = read_current(vector_dir)
+    # "" stands for a legacy index stored directly in VECTOR_DIR
+    previous = current["current"] if current is not None else ""
+
+    tmp_path = os.path.join(vector_dir, CURRENT_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"current": generation, "previous": previous}, f)
+    os.replace(tmp_path, os.path.join(vector_dir, CURRENT_FILE))
+
+    _remove_stale(vector_dir, keep={generation, previous})
+
+
+def _is_legacy_index_entry(path: str) -> bool:
+    """True for the files a pre-generation Chroma build left directly in VECTOR_DIR."""
+    name = os.path.basename(path)
+    if name in ("chroma.sqlite3", "index_version"):
+        return True
+    # HNSW segment directories are named by UUID and hold header.bin
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "header.bin"))
+
+
+def _remove_stale(vector_dir: str, keep: set):
+    for name in os.listdir(vector_dir):
+        if name in keep:
+            continue
+        path = os.path.join(vector_dir, name)
+        if name.startswith("gen-"):
+            if not in_use(path):
+                shutil.rmtree(path, ignore_errors=True)
+        elif "" not in keep and _is_legacy_index_entry(path):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
@@ -0,0 +1,111 @@
+"""
+Chunk metadata (category, academic year) and the retrieval filters derived
+from it.
+
+The knowledge base is laid out as data/knowledge_base/<category>/<year>.md,
+so every chunk gets a `category` ("bureau", "events", "formations",
+"general") and an `academic_year` ("2024-2025", or "" for year-independent
+files). The retriever extracts the same fields from the rewritten question
+(which already carries explicit academic years, see QUERY_REWRITER_PROMPT)
+and only scores the matching chunks. Year-independent chunks and the
+general club information always pass the filters.
+"""
+import os
+import re
+
+import numpy as np
+
+CATEGORIES = ("bureau", "events", "formations", "general")
+FILTER_FIELDS = ("category", "academic_year")
+# Field value that passes any filter on that field
+WILDCARDS = {"category": "general", "academic_year": ""}
+
+_YEAR_RE = re.compile(r"\b(20\d\d)\s*[-/–]\s*(20\d\d)\b")
+
+# Words that point a question at one category; questions matching several are not filtered
+_CATEGORY_WORDS = {
+    "bureau": re.compile(
+        r"\b(bureau|board|president|vice[- ]president|treasurer|secretary|lead|designer|editor|manager)s?\b"
+    ),
+    "events": re.compile(r"\b(events?|speakers?|spoke|ceremony|conference|data connect day|shape your future)\b"),
+    "formations": re.compile(r"\b(formations?|workshops?|trainings?|mentor(ed|s)?|courses?)\b"),
+}
+
+
+def academic_years(text: str) -> list:
+    """Academic years ("2024-2025") mentioned in `text`, in order of appearance."""
+    years = []
+    for start, end in _YEAR_RE.findall(text):
+        year = f"{start}-{end}"
+        if int(end) == int(start) + 1 and year not in years:
+            years.append(year)
+    return years
+
+
+def path_metadata(path: str, text: str = "") -> dict:
+    """Category and academic year of a knowledge-base file, from its path (or its `#` title)."""
+    parts = path.replace(os.sep, "/").split("/")
+    category = parts[-2] if len(parts) >= 2 and parts[-2] in CATEGORIES else "general"
+    years = academic_years(parts[-1]) or academic_years(text.split("\n", 1)[0])
+    return {"category": category, "academic_year": years[0] if years else ""}
+
+
+def extract_filters(question: str) -> dict:
+    """
+    Filters implied by a (rewritten) question: {"academic_year": [...],
+    "category": [...]}, each present only when the question is specific.
+    """
+    filters = {}
+    years = academic_years(question)
+    if years:
+        filters["academic_year"] = years
+    lowered = question.lower()
+    categories = [name for name, words in _CATEGORY_WORDS.items() if words.search(lowered)]
+    if len(categories) == 1:
+        filters["category"] = categories
+    return filters
+
+
+def matches(metadata: dict, filters: dict) -> bool:
+    """Whether a chunk passes `filters`."""
+    for field, values in filters.items():
+        value = metadata.get(field, "")
+        if value != WILDCARDS.get(field) and value not in values:
+            return False
+    return True
+
+
+def chroma_filter(filters: dict):
+    """The same filters as a Chroma `where` clause (None when there are none)."""
+    clauses = []
+    for field, values in filters.items():
+        values = list(values) + [WILDCARDS[field]]
+        clauses.append({field: {"$in": values}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class MetadataColumns:
+    """Filter fields of an index's chunks as arrays, to select candidate rows quickly."""
+
+    def __init__(self, docs: list):
+        self.columns = {
+            field: np.array([doc["metadata"].get(field, "") for doc in docs], dtype=object)
+            for field in FILTER_FIELDS
+        }
+        # Indexes built before metadata existed have empty columns; those are never filtered on
+        self.present = {field: any(column) for field, column in self.columns.items()}
+        self.size = len(docs)
+
+    def rows(self, filters: dict):
+        """Row numbers of the chunks passing `filters`, or None when nothing is filtered."""
+        if not filters:
+            return None
+        mask = np.ones(self.size, dtype=bool)
+        for field, values in filters.items():
+            column = self.columns.get(field)
+            if column is None or not self.present[field]:
+                continue
+            mask &= np.isin(column, list(values) + [WILDCARDS[field]])
+        return np.flatnonzero(mask)
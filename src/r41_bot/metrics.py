@@ -0,0 +1,118 @@
+"""
+Latency, token and cache metrics, exposed in the Prometheus text format by
+GET /metrics. They are fed by tracing.RequestTrace at the end of each request.
+
+Kept dependency-free (no prometheus_client, no langchain) so that main.py
+can import it without slowing down startup.
+"""
+import bisect
+import threading
+
+# Seconds; LLM stages take 0.3-5s, local ones a few ms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+CHAR_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels."""
+
+    def __init__(self, name: str, documentation: str, buckets: tuple, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., +Inf count], sum
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            counts, total = self._series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[labels] = (counts, total + value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}" for labels, value in values]
+        return lines
+
+
+# --- Metrics ---
+
+STAGE_SECONDS = Histogram("r41_stage_seconds", "Wall time of each pipeline stage.", LATENCY_BUCKETS, ("stage",))
+TTFT_SECONDS = Histogram("r41_time_to_first_token_seconds", "Time from request to first answer token.", LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram("r41_request_seconds", "Total time to answer a question.", LATENCY_BUCKETS, ("source",))
+LLM_TOKENS = Histogram("r41_llm_tokens", "Tokens per LLM call.", TOKEN_BUCKETS, ("stage", "kind"))
+CONTEXT_CHARS = Histogram("r41_context_chars", "Size of the retrieved context in characters.", CHAR_BUCKETS)
+CONTEXT_TOKENS = Histogram("r41_context_tokens", "Size of the retrieved context in estimated tokens.", TOKEN_BUCKETS)
+SUB_QUESTIONS = Histogram("r41_sub_questions", "Sub-questions retrieved per question.", (1, 2, 3, 4, 6, 8))
+CACHE_HITS = Counter("r41_cache_hits_total", "Questions answered without the RAG chain.", ("cache",))
+REQUESTS = Counter("r41_requests_total", "Answered questions by how they were answered.", ("source",))
+EMBED_BATCH_SIZE = Histogram("r41_embed_batch_size", "Queries per batched embedding call.", (1, 2, 4, 8, 16, 32, 64))
+EMBED_CACHE_LOOKUPS = Counter("r41_embed_cache_lookups_total", "Query embedding cache lookups.", ("result",))
+ROUTE_DECISIONS = Counter("r41_route_decisions_total", "Routing decisions by the router that made them.", ("router",))
+LLM_ADMISSION_SECONDS = Histogram(
+    "r41_llm_admission_seconds", "Time LLM calls waited for admission.", LATENCY_BUCKETS, ("call_type",)
+)
+LLM_REJECTED = Counter("r41_llm_rejected_total", "LLM calls refused as busy.", ("call_type", "reason"))
+LLM_RETRIES = Counter("r41_llm_retries_total", "LLM calls retried after an upstream rate limit.", ("call_type",))
+COALESCED_REQUESTS = Counter(
+    "r41_coalesced_requests_total",
+    "Requests that ran a pipeline step (leader) or shared an identical one in flight (follower).",
+    ("step", "role"),
+)
+
+METRICS = [
+    STAGE_SECONDS, TTFT_SECONDS, REQUEST_SECONDS, LLM_TOKENS,
+    CONTEXT_CHARS, CONTEXT_TOKENS, SUB_QUESTIONS, CACHE_HITS, REQUESTS,
+    EMBED_BATCH_SIZE, EMBED_CACHE_LOOKUPS, ROUTE_DECISIONS, COALESCED_REQUESTS,
+    LLM_ADMISSION_SECONDS, LLM_REJECTED, LLM_RETRIES,
+]
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
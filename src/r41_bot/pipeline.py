@@ -0,0 +1,341 @@
+import asyncio
+import time
+
+from langchain_core.exceptions import OutputParserException
+
+from .answer_cache import caches_as_typed, replay_stream
+from .chains import build_retrieval_chain, build_answer_chain, build_router_chain, build_query_rewriter_chain, build_planner_chain, build_summary_chain
+from .coalesce import SingleFlight, flight_key
+from .config import COALESCE_REQUESTS, DEBUG, PLANNER_MODE
+from .faq_fastpath import try_fastpath, record_pipeline_latency
+from .history import HistoryManager
+from .prompts import NO_INFO_REPLY
+from .sse import STAGE, TOKEN
+from .tracing import TRACE, RequestTrace
+
+IRRELEVANT_REPLY = "I can only answer questions about the R41 club. How can I help you with that?"
+FALLBACK_REPLY = "I'm not sure how to handle that question. Please try rephrasing."
+
+# Errors that make a planner output unusable; the pipeline then falls back to
+# the separate rewriter/router/decomposition chains.
+PLANNER_ERRORS = (OutputParserException, ValueError)
+
+
+class ChatPipeline:
+    """
+    The full rewrite -> route -> RAG pipeline.
+    `astream` is fully async (ainvoke/astream end to end) so that a single
+    worker can serve many conversations concurrently; `invoke` is the
+    blocking equivalent used by the CLI.
+
+    With `planner=True` the rewrite, route and decomposition steps are done by
+    one JSON-emitting LLM call, falling back to the three-chain path if the
+    planner's output is malformed.
+
+    With an AnswerCache, RAG answers are stored under the rewritten question
+    and replayed for semantically equivalent questions. A history-less
+    question is also looked up as typed, before any LLM call (and stored as
+    typed unless the rewrite resolved it to specific academic years).
+
+    Canned questions from data/faq.csv are answered by the FAQ fast path
+    before anything else runs.
+
+    Questions routed to `fact_lookup` are answered from the FactIndex (see
+    facts.py) with a template, skipping retrieval and generation; they go
+    through RAG when no fact matches.
+
+    When no retrieved chunk clears the relevance floor (see
+    HybridRetriever), the context is empty and the canned NO_INFO_REPLY is
+    sent without calling the generation model; it is not cached, so a
+    question becomes answerable as soon as the knowledge base covers it.
+
+    With a LocalRouter (see router.py), the rewritten question is routed by
+    an embedding classifier; the LLM router is only called when it is unsure.
+
+    The chat history is bounded by a HistoryManager (recent turns verbatim,
+    older ones summarized) before it reaches any prompt.
+
+    With `coalesce=True`, identical concurrent questions share one planning
+    step and one retrieval + generation step in the async path (see
+    coalesce.py); followers get the leader's events replayed. Those steps
+    are traced on their own and end with a (TRACE, step trace) event that
+    every request sharing them merges into its own trace.
+
+    `aevents` is `astream` with progress: it also yields a (STAGE, name)
+    event as each step starts (rewriting, routing, retrieving, generating).
+
+    Every request is traced (see tracing.py): stage timings, token usage and
+    cache hits end up in the /metrics histograms.
+    """
+
+    def __init__(
+        self,
+        retriever,
+        planner: bool = PLANNER_MODE,
+        cache=None,
+        fastpath: bool = True,
+        facts=None,
+        router=None,
+        coalesce: bool = COALESCE_REQUESTS,
+    ):
+        self.cache = cache
+        self.fastpath = fastpath
+        self.facts = facts
+        self.history = HistoryManager(build_summary_chain())
+        self.retrieval_chain = build_retrieval_chain(retriever)
+        self.answer_chain = build_answer_chain()
+        self.router_chain = build_router_chain(router)
+        self.rewriter_chain = build_query_rewriter_chain()
+        self.planner_chain = build_planner_chain() if planner else None
+        self.plan_flights = SingleFlight("plan") if coalesce else None
+        self.answer_flights = SingleFlight("answer") if coalesce else None
+
+    async def aplan(self, question: str, chat_history: list, config: dict = None) -> dict:
+        """Returns the rewritten question, its route and (if planned) its sub-questions."""
+        async for kind, data in self._aplan_events(question, chat_history, config):
+            if kind == "plan":
+                return data
+
+    async def _aplan_events(self, question: str, chat_history: list, config: dict = None):
+        """`aplan` as a stream of stage events, ending with ("plan", plan)."""
+        inputs = {"question": question, "chat_history": chat_history}
+
+        yield STAGE, "rewriting"
+        if self.planner_chain is not None:
+            try:
+                yield "plan", await self.planner_chain.ainvoke(inputs, config)
+                return
+            except PLANNER_ERRORS as e:
+                print(f"[Planner output rejected, using separate chains: {e}]")
+
+        # Rewrite the question, then route the rewritten question (both WITH history)
+        rewritten_q = await self.rewriter_chain.ainvoke(inputs, config)
+        yield STAGE, "routing"
+        route_decision = await self.router_chain.ainvoke(
+            {"question": rewritten_q, "chat_history": chat_history}, config
+        )
+        yield "plan", {"question": rewritten_q, "route": route_decision.get("route"), "questions": []}
+
+    def plan(self, question: str, chat_history: list, config: dict = None) -> dict:
+        """Blocking version of `aplan`."""
+        inputs = {"question": question, "chat_history": chat_history}
+
+        if self.planner_chain is not None:
+            try:
+                return self.planner_chain.invoke(inputs, config)
+            except PLANNER_ERRORS as e:
+                print(f"[Planner output rejected, using separate chains: {e}]")
+
+        rewritten_q = self.rewriter_chain.invoke(inputs, config)
+        route_decision = self.router_chain.invoke(
+            {"question": rewritten_q, "chat_history": chat_history}, config
+        )
+        return {"question": rewritten_q, "route": route_decision.get("route"), "questions": []}
+
+    def lookup_fact(self, question: str):
+        """Templated answer from the fact index, or None to fall back to RAG."""
+        if self.facts is None:
+            return None
+        start = time.perf_counter()
+        answer = self.facts.answer(question)
+        if DEBUG:
+            print(f"[Fact lookup: {'hit' if answer is not None else 'miss'} in {(time.perf_counter() - start) * 1000:.2f} ms]")
+        return answer
+
+    async def astream(self, question: str, chat_history: list, session_id: str = None, history_offset: int = None):
+        """Yields the answer to `question` chunk by chunk."""
+        async for kind, data in self.aevents(question, chat_history, session_id, history_offset):
+            if kind == TOKEN:
+                yield data
+
+    async def aevents(self, question: str, chat_history: list, session_id: str = None, history_offset: int = None):
+        """
+        Yields (STAGE, name) and (TOKEN, text) events while answering `question`.
+        `history_offset`: messages of a server-side session dropped before
+        `chat_history` (see HistoryManager).
+        """
+        trace = RequestTrace(question)
+        async for kind, data in self._aevents(question, chat_history, session_id, history_offset, trace):
+            if kind == TOKEN:
+                trace.first_token()
+            yield kind, data
+        await asyncio.to_thread(trace.finish, trace.source)
+
+    async def _aevents(self, question: str, chat_history: list, session_id: str, history_offset: int, trace: RequestTrace):
+        start = time.perf_counter()
+        if self.fastpath:
+            faq_answer = try_fastpath(question)
+            if faq_answer is not None:
+                trace.cache_hit("faq")
+                yield TOKEN, faq_answer
+                return
+
+        raw_vector = None
+        if self.cache is not None and not chat_history:
+            raw_vector = await self.cache.aembed(question)
+            cached = self.cache.get(question, raw_vector)
+            if cached is not None:
+                trace.cache_hit("answer_raw")
+                for chunk in replay_stream(cached):
+                    yield TOKEN, chunk
+                return
+
+        chat_history = await self.history.aprepare(chat_history, session_id, history_offset)
+        plan_events = lambda: self._traced(lambda step: self._aplan_events(question, chat_history, {"callbacks": [step]}))
+        leader = True
+        if self.plan_flights is not None:
+            flight, leader = self.plan_flights.join(flight_key(question, chat_history), plan_events)
+            plan_events = flight.subscribe
+        async for kind, data in plan_events():
+            if kind == STAGE:
+                yield kind, data
+            elif kind == TRACE:
+                trace.merge(data, shared=not leader)
+            else:
+                plan = data
+
+        if plan["route"] == "irrelevant":
+            trace.source = "irrelevant"
+            yield TOKEN, IRRELEVANT_REPLY
+            return
+
+        if plan["route"] == "fact_lookup":
+            # An in-memory lookup, cheap enough for the event loop
+            fact_answer = self.lookup_fact(plan["question"])
+            if fact_answer is not None:
+                trace.source = "facts"
+                yield TOKEN, fact_answer
+                return
+            plan = {**plan, "route": "vector_search"}
+
+        if plan["route"] != "vector_search":
+            trace.source = "fallback"
+            yield TOKEN, FALLBACK_REPLY
+            return
+
+        vector = None
+        if self.cache is not None:
+            vector = await self.cache.aembed(plan["question"])
+            cached = self.cache.get(plan["question"], vector)
+            if cached is not None:
+                trace.cache_hit("answer_rewritten")
+                for chunk in replay_stream(cached):
+                    yield TOKEN, chunk
+                return
+
+        answer_events = lambda: self._traced(
+            lambda step: self._aanswer_events(question, plan, chat_history, step, vector, raw_vector, start)
+        )
+        leader = True
+        if self.answer_flights is not None:
+            flight, leader = self.answer_flights.join(flight_key(plan["question"], chat_history), answer_events)
+            answer_events = flight.subscribe
+        async for kind, data in answer_events():
+            if kind == TRACE:
+                trace.merge(data, shared=not leader)
+                trace.source = "coalesced" if not leader and data.source == "rag" else data.source
+            else:
+                yield kind, data
+
+    async def _traced(self, step_events):
+        """
+        Runs a step that coalesced requests may share with a trace of its own
+        (`step_events(step_trace)`), not the trace of the request that started
+        it, which may end first. Ends with a (TRACE, step_trace) event.
+        """
+        step_trace = RequestTrace()
+        async for event in step_events(step_trace):
+            yield event
+        yield TRACE, step_trace
+
+    async def _aanswer_events(self, question, plan, chat_history, trace, vector, raw_vector, start):
+        """Retrieval + generation of a planned question; shared by coalesced requests."""
+        config = {"callbacks": [trace]}
+        yield STAGE, "retrieving"
+        inputs = {**plan, "chat_history": chat_history}
+        context = await self.retrieval_chain.ainvoke(inputs, config)
+        if not context:
+            trace.source = "no_context"
+            yield TOKEN, NO_INFO_REPLY
+            return
+
+        yield STAGE, "generating"
+        chunks = []
+        async for chunk in self.answer_chain.astream({**inputs, "context": context}, config):
+            chunks.append(chunk)
+            yield TOKEN, chunk
+        record_pipeline_latency(time.perf_counter() - start)
+
+        if self.cache is not None:
+            answer = "".join(chunks)
+            await self.cache.aput(plan["question"], vector, answer)
+            if raw_vector is not None and caches_as_typed(question, plan["question"]):
+                await self.cache.aput(question, raw_vector, answer)
+
+    def invoke(self, question: str, chat_history: list, session_id: str = None, history_offset: int = None) -> str:
+        """Blocking version of `astream` that returns the whole answer."""
+        trace = RequestTrace(question)
+        answer = self._invoke(question, chat_history, session_id, history_offset, trace)
+        trace.finish(trace.source)
+        return answer
+
+    def _invoke(self, question: str, chat_history: list, session_id: str, history_offset: int, trace: RequestTrace) -> str:
+        start = time.perf_counter()
+        config = {"callbacks": [trace]}
+        if self.fastpath:
+            faq_answer = try_fastpath(question)
+            if faq_answer is not None:
+                trace.cache_hit("faq")
+                return faq_answer
+
+        raw_vector = None
+        if self.cache is not None and not chat_history:
+            raw_vector = self.cache.embed(question)
+            cached = self.cache.get(question, raw_vector)
+            if cached is not None:
+                trace.cache_hit("answer_raw")
+                return cached
+
+        chat_history = self.history.prepare(chat_history, session_id, history_offset)
+        plan = self.plan(question, chat_history, config)
+        if DEBUG:
+            print(f"[Rewritten Question: {plan['question']}]")
+            print(f"[Route: {plan['route']}]")
+
+        if plan["route"] == "irrelevant":
+            trace.source = "irrelevant"
+            return IRRELEVANT_REPLY
+
+        if plan["route"] == "fact_lookup":
+            fact_answer = self.lookup_fact(plan["question"])
+            if fact_answer is not None:
+                trace.source = "facts"
+                return fact_answer
+            plan = {**plan, "route": "vector_search"}
+
+        if plan["route"] != "vector_search":
+            trace.source = "fallback"
+            return FALLBACK_REPLY
+
+        vector = None
+        if self.cache is not None:
+            vector = self.cache.embed(plan["question"])
+            cached = self.cache.get(plan["question"], vector)
+            if cached is not None:
+                trace.cache_hit("answer_rewritten")
+                return cached
+
+        inputs = {**plan, "chat_history": chat_history}
+        context = self.retrieval_chain.invoke(inputs, config)
+        if not context:
+            trace.source = "no_context"
+            return NO_INFO_REPLY
+        answer = self.answer_chain.invoke({**inputs, "context": context}, config)
+        record_pipeline_latency(time.perf_counter() - start)
+
+        if self.cache is not None:
+            self.cache.put(plan["question"], vector, answer)
+            if raw_vector is not None and caches_as_typed(question, plan["question"]):
+                self.cache.put(question, raw_vector, answer)
+
+        return answer
@@ -22,11 +22,15 @@ previous_academic_year = f"{academic_year_start - 1}-{academic_year_start}"
 
 # System and user prompts for the R41 ENSAB chatbot.
 
+# Reply when the knowledge base has nothing on the question; the pipeline
+# also sends it directly when retrieval finds no relevant chunk
+NO_INFO_REPLY = "I don’t have this info yet. Please contact us on Instagram @r.41_ensab."
+
 # High-level behavior for the model
 SYSTEM_PROMPT = (
     "You are the official R41 ENSAB assistant.\n"
     "Use ONLY the provided context to answer. If context is empty or insufficient, reply exactly:\n"
-    "\"I don’t have this info yet. Please contact us on Instagram @r.41_ensab.\"\n"
+    f"\"{NO_INFO_REPLY}\"\n"
     "Combine relevant snippets if multiple are retrieved. Prefer short, clear answers."
 )
 
@@ -66,8 +70,9 @@ You must determine if the question is about the R41 ENSAB club or if it is irrel
 
 **Use the provided chat history to understand the context of the question, especially if it contains pronouns like "he", "she", or "it".**
 
-Based on the user's question, you must classify it into one of two categories: `vector_search` or `irrelevant`.
-- Use `vector_search` for any question related to the R41 club.
+Based on the user's question, you must classify it into one of three categories: `fact_lookup`, `vector_search` or `irrelevant`.
+- Use `fact_lookup` for a question asking for one club fact: who held a bureau role (in a given year), or the date, mentor, speakers or location of a named formation or event.
+- Use `vector_search` for any other question related to the R41 club.
 - Use `irrelevant` for any question that is off-topic or has nothing to do with the club.
 
 Return a JSON object with a single key "route" and the chosen category as the value.
@@ -77,7 +82,20 @@ Return a JSON object with a single key "route" and the chosen category as the va
 --- END OF CHAT HISTORY ---
 
 --- EXAMPLES ---
-# ... existing code ...
+User question: "Who was the treasurer for the 2023-2024 academic year?"
+Your output: {{"route": "fact_lookup"}}
+
+User question: "When did Data Connect Day take place?"
+Your output: {{"route": "fact_lookup"}}
+
+User question: "How can I join the R41 club?"
+Your output: {{"route": "vector_search"}}
+
+User question: "What did students learn in the Arduino robotics workshop?"
+Your output: {{"route": "vector_search"}}
+
+User question: "What's the capital of France?"
+Your output: {{"route": "irrelevant"}}
 --- END OF EXAMPLES ---
 
 User question: "{question}"
@@ -138,4 +156,64 @@ Rewritten question: "thanks that's helpful"
 
 Original question: "{{question}}"
 Rewritten question:
-"""
\ No newline at end of file
+"""
+
+# Single-pass planner prompt: rewriting, routing and decomposition in one call.
+PLANNER_PROMPT = f"""You are the query planner of the R41 ENSAB club assistant.
+The current date is {current_date_str}.
+The current academic year is {current_academic_year}.
+The previous academic year was {previous_academic_year}.
+
+Using the chat history to resolve pronouns (like "he", "it", "that event"), do three things at once:
+1. "question": rewrite the user's question by replacing relative time-based terms ("current", "this year", "last year") with specific academic years. If it is already clear, or is a greeting or filler, keep it UNCHANGED.
+2. "route": `fact_lookup` if the question asks for one club fact (who held a bureau role, or the date, mentor, speakers or location of a named formation or event), `vector_search` for any other question about the R41 club, `irrelevant` if it is off-topic.
+3. "questions": break the rewritten question into a list of simple, self-contained sub-questions for document retrieval. Use an empty list when the route is `irrelevant`.
+
+Return ONLY a JSON object with exactly these three keys.
+
+--- CHAT HISTORY ---
+{{chat_history}}
+--- END OF CHAT HISTORY ---
+
+--- EXAMPLES ---
+User question: "who is the current president? and who founded the club?"
+Your output:
+{{{{
+    "question": "who is the president for the {current_academic_year} academic year? and who founded the club?",
+    "route": "vector_search",
+    "questions": [
+        "Who is the president of the R41 club for the {current_academic_year} academic year?",
+        "Who founded the R41 club?"
+    ]
+}}}}
+
+User question: "what's the capital of France?"
+Your output:
+{{{{
+    "question": "what's the capital of France?",
+    "route": "irrelevant",
+    "questions": []
+}}}}
+--- END OF EXAMPLES ---
+
+User question: "{{question}}"
+Your output:
+"""
+
+
+# Prompt for the rolling summary of older chat turns.
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a student and the R41 ENSAB club assistant.
+Update the current summary with the new lines of conversation.
+Keep names, roles, dates, academic years and events that were mentioned, since later questions may refer back to them ("he", "that event").
+Write at most 5 short sentences. Return ONLY the updated summary.
+
+--- CURRENT SUMMARY ---
+{summary}
+--- END OF CURRENT SUMMARY ---
+
+--- NEW LINES ---
+{new_lines}
+--- END OF NEW LINES ---
+
+Updated summary:
+"""
@@ -0,0 +1,159 @@
+"""
+Lazily built, process-wide chatbot components.
+
+Nothing heavy happens at import time: the LLM client, the FastEmbed model,
+the vector store, the BM25 index, the fact index and the local router are only loaded by `Registry.pipeline()`,
+either on the first request or by a background warm-up task started with the
+server. Heavy modules are imported inside the build as well, so importing
+this module (and main.py) stays fast.
+
+Every INDEX_RELOAD_INTERVAL seconds a request checks whether a new index
+generation was published. If so, a new pipeline (retriever, fact index,
+router, answer cache) is built on it in a background thread while the old
+one keeps serving, then swapped in; requests already running finish on the
+old one. The registry leases the generation it serves (see index_store.py),
+so a reindex never deletes it from under the server.
+"""
+import asyncio
+import os
+import threading
+import time
+
+from .config import INDEX_RELOAD_INTERVAL
+
+
+class Registry:
+    """Builds the ChatPipeline once, on first use or during warm-up, and again for each new index."""
+
+    def __init__(self, k: int = 3, reload_interval: float = INDEX_RELOAD_INTERVAL):
+        self.k = k
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._pipeline = None
+        self._index = None
+        self._state = "cold"
+        self._error = None
+        self._timings = {}
+        self._checked_at = 0.0
+        self._reloading = False
+
+    def pipeline(self):
+        """Returns the shared ChatPipeline, building it if needed (blocking)."""
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    self._build()
+        elif self._reload_due():
+            self.check_index()
+        return self._pipeline
+
+    async def apipeline(self):
+        """Async version of `pipeline`; waits for an in-progress warm-up off the event loop."""
+        if self._pipeline is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.pipeline)
+        if self._reload_due():
+            await asyncio.to_thread(self.check_index)
+        return self._pipeline
+
+    def _reload_due(self) -> bool:
+        return (
+            self.reload_interval > 0
+            and self._index is not None
+            and not self._reloading
+            and time.monotonic() - self._checked_at >= self.reload_interval
+        )
+
+    def check_index(self):
+        """Starts rebuilding the pipeline in the background if a new index generation is live."""
+        from .index_store import index_version
+        self._checked_at = time.monotonic()
+        if index_version() == self._index[0]:
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, name="index-reload", daemon=True).start()
+
+    def _reload(self):
+        from .index_store import release_lease
+        try:
+            pipeline, index = self._load()
+        except Exception as e:
+            # Retried at the next check
+            print(f"[Index reload failed, still serving {self._index[0]}: {type(e).__name__}: {e}]")
+        else:
+            old = self._index
+            self._pipeline, self._index = pipeline, index
+            release_lease(old[1])
+            print(f"[Switched to index {index[0]}]")
+        finally:
+            self._reloading = False
+
+    async def warm_up(self):
+        """Builds every component in the background; failures are reported by `status`."""
+        try:
+            await self.apipeline()
+        except Exception:
+            # Already recorded in self._error; the next request will retry the build
+            pass
+
+    def status(self) -> dict:
+        return {
+            "ready": self._pipeline is not None,
+            "state": self._state,
+            "error": self._error,
+            "load_seconds": self._timings,
+            "index_version": self._index[0] if self._index else None,
+            # Tells apart the workers of a multi-process deployment
+            "pid": os.getpid(),
+        }
+
+    def _build(self):
+        self._state = "warming"
+        self._error = None
+        try:
+            pipeline, index = self._load()
+        except Exception as e:
+            self._state = "failed"
+            self._error = f"{type(e).__name__}: {e}"
+            raise
+
+        self._pipeline, self._index = pipeline, index
+        self._checked_at = time.monotonic()
+        self._state = "ready"
+
+    def _load(self) -> tuple:
+        """Builds a pipeline on the live index generation: (pipeline, (index_version, index_dir))."""
+        start = time.perf_counter()
+        from .answer_cache import AnswerCache
+        from .config import ANSWER_CACHE_ENABLED, LOCAL_ROUTER
+        from .facts import load_fact_index
+        from .index_store import acquire_lease, live_index, release_lease
+        from .pipeline import ChatPipeline
+        from .retriever import get_retriever, get_embedding
+        from .router import load_local_router
+        self._timings["imports"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        embedding = get_embedding()
+        self._timings["embedding_model"] = time.perf_counter() - start
+
+        version, index_dir = live_index()
+        acquire_lease(index_dir)
+        try:
+            start = time.perf_counter()
+            retriever = get_retriever(k=self.k, index_dir=index_dir)
+            facts = load_fact_index(index_dir)
+            router = load_local_router(index_dir, embedding) if LOCAL_ROUTER else None
+            self._timings["indexes"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            cache = AnswerCache(embedding, version=version) if ANSWER_CACHE_ENABLED else None
+            pipeline = ChatPipeline(retriever, cache=cache, facts=facts, router=router)
+            self._timings["chains"] = time.perf_counter() - start
+        except Exception:
+            release_lease(index_dir)
+            raise
+        return pipeline, (version, index_dir)
@@ -1,42 +1,313 @@
-import csv
+import asyncio
+import os
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from langchain.docstore.document import Document
-from langchain.retrievers import EnsembleRetriever
 from langchain_community.retrievers import BM25Retriever
 from langchain_chroma import Chroma
 from langchain_community.embeddings import FastEmbedEmbeddings
-from langchain_community.document_loaders import DirectoryLoader
+from langchain_community.document_loaders import DirectoryLoader, TextLoader
+from langchain_core.retrievers import BaseRetriever
+from typing import Any
 
-from .config import VECTOR_DIR, EMBEDDING_MODEL
+from .config import (
+    EMBEDDING_THREADS, EMBED_BATCHING, RETRIEVAL_MAX_WORKERS, RRF_C, MAX_SUB_QUESTIONS,
+    VECTOR_BACKEND, RETRIEVAL_SCORE_FLOOR, RETRIEVAL_SCORE_GAP, DENSE_SCORE_BASELINE,
+)
+from .index_store import live_index_dir
+from .bm25_index import BM25Index, BM25IndexRetriever, BM25_DIR
+from .chunking import split_documents
+from .dense_index import DenseIndex, DENSE_DIR
+from .embedder import BatchingEmbedder, embed_queries
+from .metadata import chroma_filter, matches, path_metadata
 
 KNOWLEDGE_BASE_DIR = "data/knowledge_base"
 
-def _load_markdown_docs():
-    """Loads all markdown documents from the knowledge base directory."""
-    loader = DirectoryLoader(KNOWLEDGE_BASE_DIR, glob="**/*.md")
-    documents = loader.load()
-    return documents
+# Shared, bounded pool for the blocking parts of retrieval (ONNX query embedding,
+# BM25 scoring) so they never run on the event loop.
+RETRIEVAL_EXECUTOR = ThreadPoolExecutor(
+    max_workers=RETRIEVAL_MAX_WORKERS, thread_name_prefix="retrieval"
+)
+
 
-def get_retriever(k: int):
+async def aembed_queries(embedding, questions: list) -> list:
     """
-    Builds an ensemble retriever combining semantic and keyword search.
+    Async `embed_queries`: a BatchingEmbedder is awaited directly, other
+    embedders run on RETRIEVAL_EXECUTOR.
     """
-    # Initialize the embedding model for the vector store
-    embedding = FastEmbedEmbeddings(model_name="BAAI/bge-small-en-v1.5")
-    
-    # Initialize the Chroma vector store retriever
-    vectorstore = Chroma(persist_directory=VECTOR_DIR, embedding_function=embedding)
-    vs_retriever = vectorstore.as_retriever(search_kwargs={"k": k})
+    if isinstance(embedding, BatchingEmbedder):
+        return await embedding.aembed_many(questions)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(RETRIEVAL_EXECUTOR, embed_queries, embedding, questions)
+
+
+def reciprocal_rank_fusion(ranked_lists: list, c: int = RRF_C) -> list:
+    """
+    Merges ranked document lists into one ranking.
+    `ranked_lists` holds (weight, [Document, ...]) pairs; each document scores
+    weight / (c + rank) per list it appears in. Documents are deduplicated on
+    page_content. Returns [(Document, score)], best first.
+    """
+    scores = {}
+    docs = {}
+    for weight, ranked in ranked_lists:
+        for rank, doc in enumerate(ranked, start=1):
+            key = doc.page_content
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight / (c + rank)
+    order = sorted(scores, key=scores.get, reverse=True)
+    return [(docs[key], scores[key]) for key in order]
+
+
+def dense_relevance(similarity: float, baseline: float = DENSE_SCORE_BASELINE) -> float:
+    """Maps a cosine similarity to [0, 1], `baseline` (unrelated texts) and below to 0."""
+    return min(max((similarity - baseline) / (1 - baseline), 0.0), 1.0)
+
+
+def select_hits(scored: list, k: int, floor: float = RETRIEVAL_SCORE_FLOOR, gap: float = RETRIEVAL_SCORE_GAP) -> list:
+    """
+    Adaptive top-k over [(Document, score)], best first: hits under `floor`
+    are dropped, at most `k` are kept, and the ranking is cut at its largest
+    score drop if that drop is at least `gap` (one clear answer doesn't drag
+    weaker neighbours into the prompt).
+    """
+    kept = [(doc, score) for doc, score in scored[:k] if score >= floor]
+    drops = [kept[i - 1][1] - kept[i][1] for i in range(1, len(kept))]
+    if drops and max(drops) >= gap:
+        kept = kept[:drops.index(max(drops)) + 1]
+    return kept
+
+
+def merge_rankings(rankings: list) -> list:
+    """
+    Interleaves per-sub-question rankings of (Document, score): every
+    sub-question's best hit first, then the second ones, and so on.
+    Documents are deduplicated on page_content.
+    """
+    ordered = sorted(
+        ((rank, -score, i, doc) for i, ranking in enumerate(rankings) for rank, (doc, score) in enumerate(ranking)),
+        key=lambda hit: hit[:3],
+    )
+    seen, merged = set(), []
+    for _, score, _, doc in ordered:
+        if doc.page_content not in seen:
+            seen.add(doc.page_content)
+            merged.append((doc, -score))
+    return merged
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense (Chroma or DenseIndex) + keyword (BM25) retrieval with score fusion.
+    Each hit gets a relevance score in [0, 1]: the weighted sum of its dense
+    relevance (cosine similarity above DENSE_SCORE_BASELINE) and its BM25
+    score normalized by the query's maximum possible score. Per sub-question,
+    `select_hits` drops hits under `score_floor` and adapts k to the score
+    gap; when nothing clears the floor the ranking is empty and the pipeline
+    answers "no info" without calling the LLM.
+
+    `rank_many` handles a whole list of sub-questions at once: their query
+    embeddings are computed in one batch and the searches run concurrently
+    on RETRIEVAL_EXECUTOR in the async path. A DenseIndex searches all
+    sub-questions with one matrix multiply.
+
+    Metadata `filters` (see metadata.extract_filters) prune the dense and
+    BM25 candidates before scoring; if nothing passes them, the search is
+    repeated unfiltered.
+    """
+
+    vectorstore: Any
+    keyword_retriever: BaseRetriever
+    embedding: Any
+    k: int = 6
+    weights: list = [0.5, 0.5]
+    score_floor: float = RETRIEVAL_SCORE_FLOOR
+    score_gap: float = RETRIEVAL_SCORE_GAP
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.rank_many([query])
+
+    async def _aget_relevant_documents(self, query, *, run_manager):
+        return await self.arank_many([query])
+
+    def _fuse(self, dense_results: list, keyword_results: list) -> list:
+        """Per-sub-question fused scores, thresholded, merged into one ranking of (Document, score)."""
+        dense_weight, keyword_weight = self.weights
+        rankings = []
+        for dense_hits, keyword_hits in zip(dense_results, keyword_results):
+            scores, docs = {}, {}
+            for weight, hits in ((dense_weight, dense_hits), (keyword_weight, keyword_hits)):
+                for doc, score in hits:
+                    key = doc.page_content
+                    docs.setdefault(key, doc)
+                    scores[key] = scores.get(key, 0.0) + weight * score
+            scored = sorted(((docs[key], scores[key]) for key in docs), key=lambda hit: hit[1], reverse=True)
+            rankings.append(select_hits(scored, self.k, self.score_floor, self.score_gap))
+        return merge_rankings(rankings)
+
+    def _dense_search(self, vectors: list, filters: dict = None) -> list:
+        """[[(Document, relevance in [0, 1])] per vector]."""
+        if isinstance(self.vectorstore, DenseIndex):
+            results = self.vectorstore.similarity_search_many_with_scores(vectors, k=self.k, filters=filters)
+            return [[(doc, dense_relevance(sim)) for doc, sim in hits] for hits in results]
+        where = chroma_filter(filters or {})
+        kwargs = {"filter": where} if where else {}
+        results = [self.vectorstore.similarity_search_by_vector_with_relevance_scores(v, k=self.k, **kwargs) for v in vectors]
+        # Chroma returns squared L2 distances; on unit vectors cos = 1 - d / 2
+        return [[(doc, dense_relevance(1 - distance / 2)) for doc, distance in hits] for hits in results]
+
+    def _keyword_search(self, question: str, filters: dict = None) -> list:
+        """[(Document, relevance in [0, 1])]."""
+        if isinstance(self.keyword_retriever, BM25IndexRetriever):
+            return self.keyword_retriever.search_with_scores(question, filters)
+        # BM25 over whole files (indexes without postings) has no usable score
+        docs = self.keyword_retriever.invoke(question)
+        return [(doc, 1.0) for doc in docs if not filters or matches(doc.metadata, filters)]
+
+    def rank_many(self, questions: list, filters: dict = None) -> list:
+        """Retrieves for every question and returns one fused, deduplicated ranking."""
+        return [doc for doc, _ in self.rank_many_scored(questions, filters)]
+
+    async def arank_many(self, questions: list, filters: dict = None) -> list:
+        return [doc for doc, _ in await self.arank_many_scored(questions, filters)]
+
+    def rank_many_scored(self, questions: list, filters: dict = None) -> list:
+        """`rank_many` with the fused score of each document: [(Document, score)]."""
+        vectors = embed_queries(self.embedding, questions)
+        dense = self._dense_search(vectors, filters)
+        keyword = [self._keyword_search(q, filters) for q in questions]
+        hits = self._fuse(dense, keyword)
+        if filters and not hits:
+            return self._fuse(self._dense_search(vectors), [self._keyword_search(q) for q in questions])
+        return hits
+
+    async def arank_many_scored(self, questions: list, filters: dict = None) -> list:
+        vectors = await aembed_queries(self.embedding, questions)
+        hits = await self._asearch(vectors, questions, filters)
+        if filters and not hits:
+            return await self._asearch(vectors, questions, None)
+        return hits
+
+    async def _asearch(self, vectors: list, questions: list, filters: dict) -> list:
+        loop = asyncio.get_running_loop()
+        if isinstance(self.vectorstore, DenseIndex):
+            # One matrix multiply for every sub-question
+            dense_tasks = [loop.run_in_executor(RETRIEVAL_EXECUTOR, self._dense_search, vectors, filters)]
+        else:
+            dense_tasks = [
+                loop.run_in_executor(RETRIEVAL_EXECUTOR, self._dense_search, [v], filters) for v in vectors
+            ]
+        keyword_tasks = [
+            loop.run_in_executor(RETRIEVAL_EXECUTOR, self._keyword_search, q, filters) for q in questions
+        ]
+        results = await asyncio.gather(*dense_tasks, *keyword_tasks)
+        dense = [docs for batch in results[:len(dense_tasks)] for docs in batch]
+        return self._fuse(dense, results[len(dense_tasks):])
+
+
+def retrieve_many(retriever, questions: list, filters: dict = None) -> list:
+    """
+    Retrieves documents for a list of sub-questions and returns a single
+    fused ranking. Works with any retriever; a HybridRetriever batches the
+    query embeddings and applies `filters` before scoring, other retrievers
+    have their results filtered.
+    """
+    questions = questions[:MAX_SUB_QUESTIONS]
+    if not questions:
+        return []
+    if isinstance(retriever, HybridRetriever):
+        return retriever.rank_many(questions, filters)
+    ranked = retriever.batch(questions)
+    return _fuse_filtered(ranked, filters)
+
+
+async def aretrieve_many(retriever, questions: list, filters: dict = None) -> list:
+    """Async version of `retrieve_many`; sub-questions are retrieved concurrently."""
+    questions = questions[:MAX_SUB_QUESTIONS]
+    if not questions:
+        return []
+    if isinstance(retriever, HybridRetriever):
+        return await retriever.arank_many(questions, filters)
+    ranked = await retriever.abatch(questions)
+    return _fuse_filtered(ranked, filters)
+
+
+def _fuse_filtered(ranked: list, filters: dict = None) -> list:
+    docs = [doc for doc, _ in reciprocal_rank_fusion([(1.0, docs) for docs in ranked])]
+    if filters:
+        # Unfiltered results rather than none at all
+        return [doc for doc in docs if matches(doc.metadata, filters)] or docs
+    return docs
+
+
+@lru_cache(maxsize=None)
+def get_embedding():
+    """
+    Returns the FastEmbed model shared by the vector store and the answer cache.
+    Loaded once per process, with at most EMBEDDING_THREADS inference threads,
+    and wrapped in a BatchingEmbedder unless EMBED_BATCHING is off.
+    """
+    embedding = FastEmbedEmbeddings(model_name="BAAI/bge-small-en-v1.5", threads=EMBEDDING_THREADS or None)
+    return BatchingEmbedder(embedding) if EMBED_BATCHING else embedding
+
+
+def _load_vectorstore(index_dir: str, embedding):
+    """
+    Returns the dense store selected by VECTOR_BACKEND: Chroma, or the
+    in-process NumPy DenseIndex when it has been built for this generation.
+    """
+    dense_dir = os.path.join(index_dir, DENSE_DIR)
+    if VECTOR_BACKEND == "numpy" and os.path.isdir(dense_dir):
+        return DenseIndex.load(dense_dir)
+    return Chroma(persist_directory=index_dir, embedding_function=embedding)
+
+
+def _load_keyword_retriever(index_dir: str, k: int):
+    """
+    Loads the precomputed BM25 index of the live generation. Indexes built
+    before it existed fall back to BM25 over whole markdown files.
+    """
+    bm25_dir = os.path.join(index_dir, BM25_DIR)
+    if os.path.isdir(bm25_dir):
+        return BM25IndexRetriever(index=BM25Index.load(bm25_dir), k=k)
 
     # Load documents for the keyword retriever
     markdown_docs = _load_markdown_docs()
-
-    # Initialize the BM25 keyword retriever
     bm25_retriever = BM25Retriever.from_documents(markdown_docs)
     bm25_retriever.k = k
+    return bm25_retriever
 
-    # Initialize the ensemble retriever
-    ensemble_retriever = EnsembleRetriever(
-        retrievers=[vs_retriever, bm25_retriever], weights=[0.5, 0.5]
-    )
 
-    return ensemble_retriever
\ No newline at end of file
+def _load_markdown_docs():
+    """Loads the knowledge base as one document per markdown entry, like the indexer."""
+    # Raw markdown: the headings delimit the chunks
+    loader = DirectoryLoader(KNOWLEDGE_BASE_DIR, glob="**/*.md", loader_cls=TextLoader, loader_kwargs={"encoding": "utf-8"})
+    documents = loader.load()
+    for doc in documents:
+        doc.metadata.update(path_metadata(doc.metadata.get("source", ""), doc.page_content))
+    return split_documents(documents)
+
+def get_retriever(k: int, index_dir: str = None):
+    """
+    Builds a hybrid retriever combining semantic and keyword search over
+    `index_dir` (default: the live generation).
+    Both searches run on the bounded retrieval pool when called asynchronously.
+    """
+    # Initialize the embedding model for the vector store
+    embedding = get_embedding()
+
+    # Initialize the dense store on the live index generation
+    index_dir = index_dir or live_index_dir()
+    vectorstore = _load_vectorstore(index_dir, embedding)
+
+    # Initialize the BM25 keyword retriever over the same chunks
+    bm25_retriever = _load_keyword_retriever(index_dir, k)
+
+    # Fuse their normalized scores (weighted) and keep the hits above the relevance floor
+    return HybridRetriever(
+        vectorstore=vectorstore,
+        keyword_retriever=bm25_retriever,
+        embedding=embedding,
+        k=k,
+        weights=[0.5, 0.5],
+    )
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Local question router on top of the FastEmbed query embeddings.
+
+Routing only picks one of three labels (fact_lookup, vector_search,
+irrelevant), which doesn't need an LLM round-trip with the whole chat
+history. `LocalRouter` is a multinomial logistic regression over normalized
+query embeddings, trained by scripts/index_faq.py for each index generation
+from:
+
+- the labeled questions of data/router/examples.jsonl,
+- the knowledge-base chunks themselves, as on-topic (vector_search) samples.
+
+Everything is embedded as a query (embed_queries, with the bge query prefix),
+like the questions routed at inference: the chunks' stored passage
+embeddings live in a different region of the space and would let the
+classifier separate the classes by embedding type rather than by topic.
+
+It is stored with the generation:
+
+    router.npz      weights float32[dim, routes], bias float32[routes], routes
+
+The router chain (see chains.build_router_chain) uses the local prediction
+when its probability is at least ROUTER_CONFIDENCE (ROUTER_IRRELEVANT_CONFIDENCE
+for `irrelevant`, which refuses the question) and asks the LLM router
+otherwise. The question it sees has already been rewritten with the chat
+history, so pronouns are resolved. scripts/eval_router.py compares both
+routers on a held-out set.
+"""
+import json
+import os
+
+import numpy as np
+
+from .config import ROUTER_CONFIDENCE, ROUTER_IRRELEVANT_CONFIDENCE
+from .retriever import aembed_queries, embed_queries
+
+ROUTER_FILE = "router.npz"
+ROUTE_EXAMPLES_PATH = "data/router/examples.jsonl"
+ROUTES = ("fact_lookup", "vector_search", "irrelevant")
+
+
+def load_route_examples(path: str = ROUTE_EXAMPLES_PATH) -> list:
+    """[{"question", "route"}] from a JSONL file."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def train_router(vectors, labels: list, routes: tuple = ROUTES, epochs: int = 500, lr: float = 2.0, l2: float = 1e-3):
+    """
+    Fits a softmax regression on `vectors` (one embedding per label) with
+    full-batch gradient descent. Classes are weighted to an equal share of the
+    loss, so the many knowledge-base chunks don't drown the labeled questions.
+    Deterministic: same data, same weights.
+    """
+    x = _normalize(vectors)
+    y = np.array([routes.index(label) for label in labels])
+    onehot = np.eye(len(routes), dtype=np.float32)[y]
+    counts = np.bincount(y, minlength=len(routes)).astype(np.float32)
+    sample_weight = (1.0 / (len(routes) * np.maximum(counts, 1)))[y][:, None]
+
+    weights = np.zeros((x.shape[1], len(routes)), dtype=np.float32)
+    bias = np.zeros(len(routes), dtype=np.float32)
+    for _ in range(epochs):
+        grad = (_softmax(x @ weights + bias) - onehot) * sample_weight
+        weights -= lr * (x.T @ grad + l2 * weights)
+        bias -= lr * grad.sum(axis=0)
+    return weights, bias
+
+
+class LocalRouter:
+    """Routes questions with a linear classifier over their query embeddings."""
+
+    def __init__(
+        self,
+        weights,
+        bias,
+        routes: tuple = ROUTES,
+        embedding=None,
+        threshold: float = ROUTER_CONFIDENCE,
+        irrelevant_threshold: float = ROUTER_IRRELEVANT_CONFIDENCE,
+    ):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.routes = tuple(routes)
+        self.embedding = embedding
+        self.threshold = threshold
+        self.irrelevant_threshold = irrelevant_threshold
+
+    @classmethod
+    def train(cls, embedding, examples: list, chunks: list = (), **kwargs):
+        """
+        Trains on labeled `examples` ({"question", "route"}) and on the
+        knowledge-base `chunks` as vector_search samples, all embedded as queries.
+        """
+        texts = [e["question"] for e in examples] + [c.page_content for c in chunks]
+        labels = [e["route"] for e in examples] + ["vector_search"] * len(chunks)
+        vectors = embed_queries(embedding, texts)
+        weights, bias = train_router(vectors, labels)
+        return cls(weights, bias, ROUTES, embedding, **kwargs)
+
+    def save(self, path: str):
+        np.savez(path, weights=self.weights, bias=self.bias, routes=np.array(self.routes))
+
+    @classmethod
+    def load(cls, path: str, embedding=None, **kwargs):
+        with np.load(path) as data:
+            return cls(data["weights"], data["bias"], tuple(str(r) for r in data["routes"]), embedding, **kwargs)
+
+    def predict(self, vector) -> tuple:
+        """(route, probability) for one query embedding."""
+        probabilities = _softmax(_normalize(vector) @ self.weights + self.bias)
+        best = int(np.argmax(probabilities))
+        return self.routes[best], float(probabilities[best])
+
+    def route(self, question: str) -> tuple:
+        return self.predict(embed_queries(self.embedding, [question])[0])
+
+    async def aroute(self, question: str) -> tuple:
+        return self.predict((await aembed_queries(self.embedding, [question]))[0])
+
+    def confident(self, route: str, confidence: float) -> bool:
+        """Whether to use the local prediction instead of asking the LLM."""
+        if route == "irrelevant":
+            return confidence >= max(self.threshold, self.irrelevant_threshold)
+        return confidence >= self.threshold
+
+
+def load_local_router(index_dir: str, embedding):
+    """The LocalRouter of an index generation, or None for indexes built before it existed."""
+    path = os.path.join(index_dir, ROUTER_FILE)
+    if not os.path.exists(path):
+        return None
+    return LocalRouter.load(path, embedding)
@@ -0,0 +1,182 @@
+"""
+Server-side chat sessions, so clients only send the new question.
+
+Each turn is stored as one compact (question, answer) record. Two stores are
+available, selected with SESSION_STORE:
+
+- "memory" (default): in-process LRU, for a single worker.
+- "sqlite": a SQLite file shared by every worker on the machine.
+
+Both evict sessions idle for more than SESSION_TTL seconds and keep at most
+SESSION_MAX_TURNS turns per session (older turns are only needed through the
+rolling summary, see history.py). `get_window` also tells how many messages
+were dropped before the returned ones, so the rolling summary can keep
+track of what it covers as the window slides.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .config import SESSION_STORE, SESSION_DB_PATH, SESSION_TTL, SESSION_MAX_SESSIONS, SESSION_MAX_TURNS
+
+
+def turns_to_messages(turns: list) -> list:
+    """Expands (question, answer) records into chat messages."""
+    messages = []
+    for question, answer in turns:
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": answer})
+    return messages
+
+
+class InMemorySessionStore:
+    """LRU of sessions held in this process."""
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX_SESSIONS, max_turns: int = SESSION_MAX_TURNS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        # session_id -> (last update time, [(question, answer), ...], turns dropped before them)
+        self._sessions = OrderedDict()
+
+    def get_history(self, session_id: str) -> list:
+        return self.get_window(session_id)[1]
+
+    def get_window(self, session_id: str) -> tuple:
+        """(messages dropped before the history, the history)."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return 0, []
+            updated_at, turns, dropped = entry
+            if updated_at < time.time() - self.ttl:
+                del self._sessions[session_id]
+                return 0, []
+            self._sessions.move_to_end(session_id)
+            return dropped * 2, turns_to_messages(turns)
+
+    def append_turn(self, session_id: str, question: str, answer: str):
+        with self._lock:
+            _, turns, dropped = self._sessions.get(session_id, (0, [], 0))
+            turns = turns + [(question, answer)]
+            dropped += max(0, len(turns) - self.max_turns)
+            self._sessions[session_id] = (time.time(), turns[-self.max_turns:], dropped)
+            self._sessions.move_to_end(session_id)
+            self._evict()
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        cutoff = time.time() - self.ttl
+        # The LRU end holds the least recently used sessions
+        while self._sessions:
+            session_id, (updated_at, _, _) = next(iter(self._sessions.items()))
+            if updated_at >= cutoff:
+                break
+            del self._sessions[session_id]
+
+
+class SqliteSessionStore:
+    """Sessions in a SQLite file, shared by every worker process."""
+
+    # Run the TTL sweep at most this often (seconds)
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl: float = SESSION_TTL, max_turns: int = SESSION_MAX_TURNS):
+        self.path = path
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS turns (
+                    session_id TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id);
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL,
+                    turn_count INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at);
+                """
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+            if "turn_count" not in columns:
+                # Databases created before turns were counted
+                conn.execute("ALTER TABLE sessions ADD COLUMN turn_count INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get_history(self, session_id: str) -> list:
+        return self.get_window(session_id)[1]
+
+    def get_window(self, session_id: str) -> tuple:
+        """(messages dropped before the history, the history)."""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT updated_at, turn_count FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or row[0] < time.time() - self.ttl:
+            return 0, []
+        turns = conn.execute(
+            "SELECT question, answer FROM turns WHERE session_id = ? ORDER BY rowid DESC LIMIT ?",
+            (session_id, self.max_turns),
+        ).fetchall()
+        return max(0, row[1] - len(turns)) * 2, turns_to_messages(reversed(turns))
+
+    def append_turn(self, session_id: str, question: str, answer: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO turns (session_id, created_at, question, answer) VALUES (?, ?, ?, ?)",
+                (session_id, now, question, answer),
+            )
+            conn.execute(
+                "INSERT INTO sessions (session_id, updated_at, turn_count) VALUES (?, ?, 1) "
+                "ON CONFLICT(session_id) DO UPDATE SET updated_at = excluded.updated_at, "
+                "turn_count = turn_count + 1",
+                (session_id, now),
+            )
+            # Drop turns beyond the per-session limit
+            conn.execute(
+                "DELETE FROM turns WHERE session_id = ? AND rowid NOT IN "
+                "(SELECT rowid FROM turns WHERE session_id = ? ORDER BY rowid DESC LIMIT ?)",
+                (session_id, session_id, self.max_turns),
+            )
+        if now - self._last_sweep > self.SWEEP_INTERVAL:
+            self._last_sweep = now
+            self._sweep(now - self.ttl)
+
+    def _sweep(self, cutoff: float):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM turns WHERE session_id IN (SELECT session_id FROM sessions WHERE updated_at < ?)",
+                (cutoff,),
+            )
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+
+
+def get_session_store():
+    """Returns the store selected by SESSION_STORE."""
+    if SESSION_STORE == "sqlite":
+        return SqliteSessionStore()
+    return InMemorySessionStore()
@@ -0,0 +1,52 @@
+"""
+Server-sent events framing for the /chat stream.
+
+Each event is `event: <kind>` plus one JSON `data:` line, so tokens keep
+their newlines. Idle periods (slow LLM calls) are filled with SSE comment
+lines that clients ignore but that keep proxies from closing the stream.
+"""
+import asyncio
+import json
+from contextlib import suppress
+
+from .config import SSE_HEARTBEAT_INTERVAL
+
+HEARTBEAT = ": keep-alive\n\n"
+
+# Event kinds yielded by ChatPipeline.aevents
+STAGE = "stage"
+TOKEN = "token"
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def with_heartbeats(events, interval: float = SSE_HEARTBEAT_INTERVAL):
+    """
+    Re-yields `events`, yielding HEARTBEAT whenever nothing arrived for
+    `interval` seconds. If the consumer goes away (client disconnect), the
+    pending step of `events` is cancelled and the generator closed, which
+    aborts any upstream LLM stream at once.
+    """
+    iterator = events.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield HEARTBEAT
+                continue
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                return
+            yield item
+            pending = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        if not pending.done():
+            pending.cancel()
+            with suppress(BaseException):
+                await pending
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
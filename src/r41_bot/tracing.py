@@ -0,0 +1,175 @@
+"""
+Per-request tracing of the chain pipeline.
+
+Stages are the named runnables of chains.py (rewrite, route, plan,
+decomposition, retrieval, context, generation). A RequestTrace is a
+langchain callback handler: passed in the config of every chain call of one
+request, it times those runs, collects the token usage of the LLM calls
+inside them and the size of the retrieved context. When the request ends,
+`finish` feeds everything into the metrics and, if TRACE_LOG_PATH is set,
+appends the trace as one JSON line.
+
+Steps that coalesced requests share (see coalesce.py) are traced on their
+own; each request then `merge`s the step's trace into its own.
+"""
+import json
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .chains import estimate_tokens
+from .config import TRACE_LOG_PATH
+from .metrics import (
+    CACHE_HITS, CONTEXT_CHARS, CONTEXT_TOKENS, LLM_TOKENS, REQUEST_SECONDS,
+    REQUESTS, STAGE_SECONDS, SUB_QUESTIONS, TTFT_SECONDS,
+)
+
+# Pipeline event carrying the RequestTrace of a finished shared step
+TRACE = "trace"
+
+STAGES = ("rewrite", "route", "plan", "decomposition", "retrieval", "context", "generation")
+
+_TRACE_LOCK = threading.Lock()
+
+
+class RequestTrace(BaseCallbackHandler):
+    """
+    Collects the stages, token usage and cache hits of one request.
+    Pass it as `config={"callbacks": [trace]}` to every chain call.
+    """
+
+    def __init__(self, question: str = "", trace_path: str = None):
+        self.question = question
+        self.trace_path = TRACE_LOG_PATH if trace_path is None else trace_path
+        self.start = time.perf_counter()
+        self.spans = []
+        self.ttft = None
+        # How the question was answered: "rag", "faq", "answer_cache", "facts", "no_context",
+        # "coalesced" (shared another request's answer), "irrelevant" or "fallback"
+        self.source = "rag"
+        self.cache = None
+        self.context = None
+        self.sub_questions = None
+        # run id -> (stage, start time) for stage runs; run id -> stage for every run below one
+        self._open = {}
+        self._stage_of = {}
+        # LLM run id -> (stage, estimated prompt tokens)
+        self._llm_runs = {}
+
+    # --- Recording ---
+
+    def span(self, stage: str, seconds: float, **fields):
+        self.spans.append({"stage": stage, "ms": round(seconds * 1000, 2), **fields})
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start
+
+    def cache_hit(self, cache: str):
+        self.cache = cache
+        self.source = "faq" if cache == "faq" else "answer_cache"
+
+    def merge(self, step: "RequestTrace", shared: bool = False):
+        """
+        Adds the spans of a step traced on its own. `shared`: this request
+        only joined the step, so its LLM tokens were paid for by another.
+        """
+        for span in step.spans:
+            self.spans.append({**span, "shared": True} if shared and span.get("llm") else span)
+        self.context = step.context or self.context
+        if step.sub_questions is not None:
+            self.sub_questions = step.sub_questions
+
+    # --- Callbacks ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name")
+        if name in STAGES:
+            self._open[run_id] = (name, time.perf_counter())
+            self._stage_of[run_id] = name
+            if name == "retrieval" and isinstance(inputs, dict):
+                self.sub_questions = len(inputs.get("questions") or [])
+        elif parent_run_id in self._stage_of:
+            self._stage_of[run_id] = self._stage_of[parent_run_id]
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._stage_of.pop(run_id, None)
+        opened = self._open.pop(run_id, None)
+        if opened is None:
+            return
+        stage, started = opened
+        fields = {}
+        if stage == "context" and isinstance(outputs, str):
+            self.context = {"chars": len(outputs), "tokens": estimate_tokens(outputs)}
+            fields = dict(self.context)
+        self.span(stage, time.perf_counter() - started, **fields)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._stage_of.pop(run_id, None)
+        opened = self._open.pop(run_id, None)
+        if opened is not None:
+            self.span(opened[0], time.perf_counter() - opened[1], error=type(error).__name__)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        stage = self._stage_of.get(parent_run_id, "other")
+        prompt = "".join(str(m.content) for batch in messages for m in batch)
+        self._llm_runs[run_id] = (stage, estimate_tokens(prompt))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        stage, prompt_estimate = self._llm_runs.pop(run_id, ("other", 0))
+        usage = None
+        text = ""
+        for generations in response.generations:
+            for generation in generations:
+                text += generation.text
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or usage
+        if usage:
+            prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        else:
+            # Not every model reports usage; fall back to the estimate
+            prompt_tokens, completion_tokens = prompt_estimate, estimate_tokens(text)
+        self.spans.append({"stage": stage, "llm": True, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+
+    # --- Reporting ---
+
+    def finish(self, source: str):
+        """Records the request in the metrics (and the trace log). `source`: how it was answered."""
+        total = time.perf_counter() - self.start
+        REQUESTS.inc(source)
+        REQUEST_SECONDS.observe(total, source)
+        if self.cache is not None:
+            CACHE_HITS.inc(self.cache)
+        if self.ttft is not None:
+            TTFT_SECONDS.observe(self.ttft)
+        if self.context is not None:
+            CONTEXT_CHARS.observe(self.context["chars"])
+            CONTEXT_TOKENS.observe(self.context["tokens"])
+        if self.sub_questions is not None:
+            SUB_QUESTIONS.observe(self.sub_questions)
+        for span in self.spans:
+            if span.get("shared"):
+                continue
+            if span.get("llm"):
+                LLM_TOKENS.observe(span["prompt_tokens"], span["stage"], "prompt")
+                LLM_TOKENS.observe(span["completion_tokens"], span["stage"], "completion")
+            else:
+                STAGE_SECONDS.observe(span["ms"] / 1000, span["stage"])
+
+        if self.trace_path:
+            record = {
+                "time": time.time(),
+                "question": self.question,
+                "source": source,
+                "total_ms": round(total * 1000, 2),
+                "ttft_ms": round(self.ttft * 1000, 2) if self.ttft is not None else None,
+                "cache": self.cache,
+                "spans": self.spans,
+            }
+            directory = os.path.dirname(self.trace_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with _TRACE_LOCK, open(self.trace_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,55 @@
+"""
+Shared fixtures: a stub LLM with canned replies and ChatPipelines built on it.
+"""
+import time
+
+import pytest
+from langchain.docstore.document import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.r41_bot import chains
+from src.r41_bot.fake_llm import ScriptedChatModel
+from src.r41_bot.pipeline import ChatPipeline
+
+LLM_DELAY = 0.2
+RETRIEVAL_DELAY = 0.05
+
+# What the stub LLM answers, by prompt kind (see fake_llm.PROMPT_KINDS)
+STUB_REPLIES = {
+    "rewrite": "who is the president for the 2024-2025 academic year?",
+    "route": '{"route": "vector_search"}',
+    "decomposition": '{"questions": ["Who is the president?"]}',
+    "answer": "The president is Ait Alla Latifa.",
+}
+
+
+class SlowRetriever(BaseRetriever):
+    """Blocks like a real query embedding + BM25 scoring would."""
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        time.sleep(RETRIEVAL_DELAY)
+        return [Document(page_content="- **President** Ait Alla Latifa")]
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    """The LLM every chain gets from chains.get_llm: STUB_REPLIES after LLM_DELAY seconds."""
+    llm = ScriptedChatModel(latency=LLM_DELAY, token_delay=0, replies=dict(STUB_REPLIES))
+    monkeypatch.setattr(chains, "get_llm", lambda: llm)
+    return llm
+
+
+@pytest.fixture
+def make_pipeline(monkeypatch, stub_llm):
+    """
+    Returns `make(llm=None, retriever=None, **options)`, which builds a
+    ChatPipeline on `llm` (default: the stub LLM) and `retriever` (default:
+    a SlowRetriever).
+    """
+
+    def make(llm=None, retriever=None, **options):
+        if llm is not None:
+            monkeypatch.setattr(chains, "get_llm", lambda: llm)
+        return ChatPipeline(SlowRetriever() if retriever is None else retriever, **options)
+
+    return make
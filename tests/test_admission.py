@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from src.r41_bot.admission import AdmissionController, LLMBusy
+from src.r41_bot.admitted_llm import AdmittedChatModel
+from src.r41_bot.fake_llm import FakeRateLimitError, ScriptedChatModel
+from src.r41_bot.sse import TOKEN
+
+
+class RecordingAdmission(AdmissionController):
+    """AdmissionController that records the call type of every call."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.call_types = []
+
+    def slot(self, call_type="prepass"):
+        self.call_types.append(call_type)
+        return super().slot(call_type)
+
+
+async def _answer(pipeline, question):
+    return "".join([data async for kind, data in pipeline.aevents(question, []) if kind == TOKEN])
+
+
+def test_burst_stays_under_the_upstream_concurrency_limit(make_pipeline):
+    # The fake upstream refuses a 3rd concurrent call with a 429
+    upstream = ScriptedChatModel(latency=0.02, token_delay=0, max_concurrent=2)
+    questions = [f"Who is the president of club {i}?" for i in range(8)]
+
+    async def burst(llm):
+        pipeline = make_pipeline(llm=llm, planner=False, fastpath=False, coalesce=False)
+        return await asyncio.gather(*(_answer(pipeline, q) for q in questions), return_exceptions=True)
+
+    unguarded = asyncio.run(burst(upstream))
+    assert any(isinstance(r, FakeRateLimitError) for r in unguarded)
+
+    admission = RecordingAdmission(max_concurrency=2, rate_limits={}, max_retries=0)
+    answers = asyncio.run(burst(AdmittedChatModel(llm=upstream, admission=admission)))
+    assert all(isinstance(a, str) and a for a in answers)
+    # rewrite, route, decomposition, generation per question, typed by their stage's tags
+    assert sorted(set(admission.call_types)) == ["generation", "prepass"]
+    assert admission.call_types.count("generation") == len(questions)
+
+
+def test_generation_is_served_first_and_full_queues_fail_fast():
+    async def run():
+        admission = AdmissionController(max_concurrency=1, rate_limits={}, queue_limit=3, queue_timeout=1)
+        order = []
+
+        async def call(call_type, name):
+            async with admission.slot(call_type):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        holder = asyncio.create_task(call("prepass", "holder"))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(call("background", "summary")),
+            asyncio.create_task(call("prepass", "route")),
+            asyncio.create_task(call("generation", "answer")),
+        ]
+        await asyncio.sleep(0)
+        # Three calls already queued: the next one is refused at once
+        assert admission.saturated()
+        with pytest.raises(LLMBusy):
+            await call("generation", "rejected")
+        await asyncio.gather(holder, *waiters)
+        assert order == ["holder", "answer", "route", "summary"]
+
+        # A call that cannot get a slot before the queue deadline gets LLMBusy too
+        admission.queue_timeout = 0.02
+        holder = asyncio.create_task(call("prepass", "holder"))
+        await asyncio.sleep(0)
+        admission.queue_timeout = 0.005
+        with pytest.raises(LLMBusy):
+            await call("generation", "late")
+        await holder
+
+    asyncio.run(run())
+
+
+def test_rate_limit_errors_are_retried_with_backoff():
+    async def run(error_rate, max_retries):
+        upstream = ScriptedChatModel(latency=0, token_delay=0, error_rate=error_rate)
+        admission = AdmissionController(rate_limits={}, max_retries=max_retries, retry_base=0.001)
+        llm = AdmittedChatModel(llm=upstream, admission=admission)
+        return await asyncio.gather(
+            *(llm.ainvoke("Summarize the conversation") for _ in range(10)), return_exceptions=True
+        )
+
+    # A third of the calls hit a 429, but none three times in a row
+    assert all(not isinstance(r, Exception) for r in asyncio.run(run(0.3, 5)))
+    # Without retries, the 429s surface as LLMBusy
+    results = asyncio.run(run(0.3, 0))
+    assert any(isinstance(r, LLMBusy) for r in results)
+
+
+def test_full_queue_gets_a_429_event_stream(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    monkeypatch.setattr(main.ADMISSION, "saturated", lambda: True)
+    response = TestClient(main.app).post("/chat", json={"question": "hi"})
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == str(main.ADMISSION.retry_after())
+    assert response.text.startswith("event: error\n")
+    assert '"status": 429' in response.text
@@ -0,0 +1,70 @@
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.r41_bot.answer_cache import AnswerCache, caches_as_typed, replay_stream
+
+
+def _cache(tmp_path, version="v1", **kwargs):
+    return AnswerCache(
+        DeterministicFakeEmbedding(size=32),
+        path=str(tmp_path / "cache.json"),
+        version=version,
+        **kwargs,
+    )
+
+
+def test_hit_on_same_question_miss_on_other(tmp_path):
+    cache = _cache(tmp_path)
+    vector = cache.embed("who is the president?")
+    cache.put("who is the president?", vector, "Ait Alla Latifa.")
+
+    assert cache.get("who is the president?", cache.embed("who is the president?")) == "Ait Alla Latifa."
+    assert cache.get("how do I join the club?", cache.embed("how do I join the club?")) is None
+
+
+def test_lru_eviction(tmp_path):
+    cache = _cache(tmp_path, max_entries=2)
+    for q in ("a", "b"):
+        cache.put(q, cache.embed(q), q.upper())
+    cache.get("a", cache.embed("a"))  # "a" is now the most recently used
+    cache.put("c", cache.embed("c"), "C")
+
+    assert cache.get("b", cache.embed("b")) is None
+    assert cache.get("a", cache.embed("a")) == "A"
+
+
+def test_ttl_expiry(tmp_path):
+    cache = _cache(tmp_path, ttl=-1)
+    cache.put("a", cache.embed("a"), "A")
+    assert cache.get("a", cache.embed("a")) is None
+
+
+def test_survives_restart_and_is_invalidated_by_reindex(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("a", cache.embed("a"), "A")
+
+    reloaded = _cache(tmp_path)
+    assert reloaded.get("a", reloaded.embed("a")) == "A"
+
+    rebuilt = _cache(tmp_path, version="v2")
+    assert len(rebuilt) == 0
+
+
+def test_questions_about_other_years_do_not_share_answers(tmp_path):
+    # Embeddings so close the threshold alone would match them
+    cache = _cache(tmp_path, threshold=-1)
+    question = "Who was the president in 2023-2024?"
+    cache.put(question, cache.embed(question), "Ait Alla Latifa.")
+
+    assert cache.get(question, cache.embed(question)) == "Ait Alla Latifa."
+    other = "Who was the president in 2024-2025?"
+    assert cache.get(other, cache.embed(other)) is None
+    # "current" only means a year once rewritten, so it is not cached as typed
+    assert not caches_as_typed("Who is the current president?", "Who is the president for the 2025-2026 academic year?")
+    assert caches_as_typed("how do i join?", "How do I join the club?")
+
+
+def test_replay_stream_reassembles_answer():
+    answer = "The president is Ait Alla Latifa."
+    chunks = list(replay_stream(answer))
+    assert len(chunks) > 1
+    assert "".join(chunks) == answer
@@ -0,0 +1,42 @@
+"""
+Load test for the async /chat pipeline against a stubbed LLM and retriever.
+N concurrent conversations should finish in about the time a single one does.
+"""
+import asyncio
+import time
+
+
+async def _run_conversation(pipeline):
+    return "".join([chunk async for chunk in pipeline.astream("who is the current president?", [])])
+
+
+async def _run_burst(pipeline, n):
+    return await asyncio.gather(*(_run_conversation(pipeline) for _ in range(n)))
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
+
+
+def test_single_conversation_streams_answer(make_pipeline):
+    pipeline = make_pipeline()
+    answer = asyncio.run(_run_conversation(pipeline))
+    assert "Ait Alla Latifa" in answer
+
+
+def test_concurrent_conversations_do_not_serialize(make_pipeline, stub_llm):
+    # Without coalescing, so each conversation runs the whole pipeline itself
+    pipeline = make_pipeline(coalesce=False)
+    n = 16
+
+    _, single = asyncio.run(_timed(_run_conversation(pipeline)))
+    stub_llm.prompts.clear()
+    answers, burst = asyncio.run(_timed(_run_burst(pipeline, n)))
+
+    assert all("Ait Alla Latifa" in a for a in answers)
+    # rewrite, route, decomposition and generation for every conversation
+    assert len(stub_llm.prompts) == 4 * n
+    # Serial execution would take ~n * single; allow generous scheduling slack.
+    assert burst < single * 2, f"{n} streams took {burst:.2f}s vs {single:.2f}s for one"
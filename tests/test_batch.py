@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+from src.r41_bot.batch import load_questions, run_batch
+from src.r41_bot.faq_fastpath import load_questions as load_faq
+
+QUESTIONS = [f"Who is the president of club {i}?" for i in range(6)]
+
+
+def test_batch_streams_answers_and_resumes_after_an_interruption(make_pipeline, stub_llm, tmp_path):
+    source = tmp_path / "questions.jsonl"
+    source.write_text("".join(json.dumps({"question": q, "expect": "Latifa"}) + "\n" for q in QUESTIONS))
+    output = tmp_path / "answers.jsonl"
+    # An interrupted run: two answers, then a truncated line
+    output.write_text(
+        "".join(json.dumps({"question": q, "answer": "Ait Alla Latifa"}) + "\n" for q in QUESTIONS[:2])
+        + '{"question": "Who is the pres'
+    )
+    stub_llm.latency = 0.02
+    pipeline = make_pipeline(planner=False, fastpath=False)
+
+    report = asyncio.run(run_batch(pipeline, load_questions(str(source)), str(output), concurrency=3))
+    assert (report["questions"], report["skipped"], report["answered"], report["failed"]) == (6, 2, 4, 0)
+    assert {"rewriting", "routing", "retrieving", "generating"} <= set(report["stages"])
+    assert report["throughput_qps"] > 0
+
+    records = []
+    for line in output.read_text().splitlines():
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    assert sorted(r["question"] for r in records) == sorted(QUESTIONS)
+    assert all("Latifa" in r["answer"] for r in records)
+    assert all(r["expect"] == "Latifa" and r["stages"] for r in records[2:])
+
+    # Nothing left to do
+    report = asyncio.run(run_batch(pipeline, load_questions(str(source)), str(output), concurrency=3))
+    assert (report["skipped"], report["answered"]) == (6, 0)
+
+
+def test_csv_batch_output_prefills_the_faq(make_pipeline, stub_llm, tmp_path):
+    source = tmp_path / "sheet.csv"
+    source.write_text("Question\n" + "\n".join(QUESTIONS[:3]) + "\n\n")
+    output = tmp_path / "faq.csv"
+
+    rows = load_questions(str(source))
+    assert [row["question"] for row in rows] == QUESTIONS[:3]
+    stub_llm.latency = 0.02
+    report = asyncio.run(run_batch(make_pipeline(planner=False, fastpath=False), rows, str(output), concurrency=2))
+
+    assert report["answered"] == 3
+    faq = load_faq(str(output))
+    assert sorted(q for q, _ in faq) == QUESTIONS[:3]
+    assert all("Latifa" in a for _, a in faq)
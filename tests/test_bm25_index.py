@@ -0,0 +1,30 @@
+import numpy as np
+from langchain.docstore.document import Document
+
+from src.r41_bot.bm25_index import BM25Index, BM25IndexRetriever
+
+DOCS = [
+    Document(page_content="# Bureau 2024-2025\n- **President** Ait Alla Latifa\n- **Treasurer** Tahir Aboubakr", metadata={"source": "bureau/2024-2025.md"}),
+    Document(page_content="## Machine Learning Training\n**Mentor:** Salma Bouziane", metadata={"source": "formations/2024-2025.md"}),
+    Document(page_content="## Data Connect Day\nAlumni from the Big Data program", metadata={"source": "events/2024-2025.md"}),
+]
+
+
+def test_search_ranks_matching_chunk_first():
+    index = BM25Index.build(DOCS, ids=["a", "b", "c"])
+    hits = index.search("who is treasurer?", k=3)
+    assert hits[0][0] == 0
+    # Chunks without any query term are not returned
+    assert all(score > 0 for _, score in hits)
+
+
+def test_save_and_memory_mapped_load_round_trip(tmp_path):
+    index = BM25Index.build(DOCS, ids=["a", "b", "c"])
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+
+    assert isinstance(loaded.postings_doc, np.memmap)
+    np.testing.assert_allclose(loaded.scores("machine learning mentor"), index.scores("machine learning mentor"))
+
+    docs = BM25IndexRetriever(index=loaded, k=1).invoke("Data Connect Day")
+    assert docs[0].metadata == {"source": "events/2024-2025.md", "id": "c"}
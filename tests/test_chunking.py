@@ -0,0 +1,48 @@
+from src.r41_bot.chunking import parse_fields, split_markdown
+
+FORMATIONS = """# Formations for the 2024-2025 Academic Year
+
+## Algorithms Workshop: Session 1
+
+**Date:** October 9, 2024
+**Mentor:** Badr Kandri, Big Data Engineering Student
+**Location:** Salle D9, ENSA Berrechid
+**Description:** The first session of a workshop on algorithms.
+
+## Machine Learning Training
+
+**Date:** October 15, 2024
+**Mentor:** Salma Bouziane
+**Description:** A training course on machine learning.
+"""
+
+
+def test_one_chunk_per_entry_with_title_and_fields():
+    chunks = split_markdown(FORMATIONS, {"category": "formations"})
+
+    assert len(chunks) == 2
+    first, second = chunks
+    assert first.page_content.startswith("# Formations for the 2024-2025 Academic Year\n\n## Algorithms Workshop")
+    assert "Machine Learning" not in first.page_content
+    assert first.metadata == {
+        "category": "formations",
+        "section": "Algorithms Workshop: Session 1",
+        "date": "October 9, 2024",
+        "mentor": "Badr Kandri, Big Data Engineering Student",
+        "location": "Salle D9, ENSA Berrechid",
+    }
+    assert second.metadata["mentor"] == "Salma Bouziane"
+    assert "location" not in second.metadata
+
+
+def test_list_files_and_oversized_entries():
+    bureau = "# Club Bureau for the 2024-2025 Academic Year\n\n- **President** Ait Alla Latifa\n- **Treasurer** Tahir Aboubakr\n"
+    chunks = split_markdown(bureau)
+    assert [c.page_content for c in chunks] == [bureau.strip()]
+    assert parse_fields(bureau) == {}
+
+    long_entry = "# Events 2024-2025\n\n## Long Event\n\n" + "\n\n".join(f"Paragraph {i} " + "x" * 150 for i in range(10))
+    pieces = split_markdown(long_entry, max_chars=400)
+    assert len(pieces) > 1
+    assert all(p.page_content.startswith("# Events 2024-2025\n\n## Long Event") for p in pieces)
+    assert all(p.metadata["section"] == "Long Event" for p in pieces)
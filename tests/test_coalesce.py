@@ -0,0 +1,95 @@
+import asyncio
+import json
+import time
+
+from langchain_core.retrievers import BaseRetriever
+
+from src.r41_bot import tracing
+from src.r41_bot.coalesce import SingleFlight
+from src.r41_bot.metrics import COALESCED_REQUESTS
+from src.r41_bot.sse import TOKEN
+
+
+async def _answer(pipeline, question):
+    return "".join([data async for kind, data in pipeline.aevents(question, []) if kind == TOKEN])
+
+
+def test_identical_concurrent_questions_share_one_pipeline_run(make_pipeline, stub_llm):
+    stub_llm.latency = 0.05
+    pipeline = make_pipeline(planner=False, fastpath=False)
+    before = COALESCED_REQUESTS.value("answer", "follower")
+
+    async def burst():
+        return await asyncio.gather(
+            *(_answer(pipeline, "who is the current president?") for _ in range(4)),
+            # Same question once normalized
+            _answer(pipeline, "Who is the current  president"),
+        )
+
+    answers = asyncio.run(burst())
+    assert len(set(answers)) == 1 and "Ait Alla Latifa" in answers[0]
+    # rewrite, route, decomposition, generation: once for all five requests
+    assert len(stub_llm.prompts) == 4
+    assert COALESCED_REQUESTS.value("answer", "follower") - before == 4
+    assert len(pipeline.plan_flights) == len(pipeline.answer_flights) == 0
+
+
+class EmptyRetriever(BaseRetriever):
+    """Finds nothing, a little slowly."""
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        time.sleep(0.05)
+        return []
+
+
+def test_every_coalesced_request_records_the_shared_steps(make_pipeline, monkeypatch, tmp_path):
+    trace_log = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_LOG_PATH", str(trace_log))
+
+    async def burst(retriever):
+        pipeline = make_pipeline(retriever=retriever, planner=False, fastpath=False)
+        await asyncio.gather(*(_answer(pipeline, "who is the current president?") for _ in range(3)))
+
+    asyncio.run(burst(None))
+    asyncio.run(burst(EmptyRetriever()))
+
+    traces = [json.loads(line) for line in trace_log.read_text().splitlines()]
+    assert sorted(t["source"] for t in traces) == ["coalesced"] * 2 + ["no_context"] * 3 + ["rag"]
+    for trace in traces:
+        stages = {span["stage"] for span in trace["spans"] if not span.get("llm")}
+        assert {"rewrite", "route", "retrieval"} <= stages
+    # Only the leader of each burst pays for the LLM calls
+    paying = [t for t in traces if any(span.get("llm") and not span.get("shared") for span in t["spans"])]
+    assert sorted(t["source"] for t in paying) == ["no_context", "rag"]
+
+
+def test_late_joiner_gets_the_prefix_and_abandoned_flights_are_cancelled():
+    flights = SingleFlight("answer")
+
+    async def produce():
+        for i in range(4):
+            await asyncio.sleep(0.01)
+            yield TOKEN, str(i)
+
+    async def run():
+        leader, is_leader = flights.join("k", produce)
+        first = leader.subscribe()
+        events = [await first.__anext__(), await first.__anext__()]
+
+        # Joins after two events were streamed: replayed from the start
+        follower, is_leader_too = flights.join("k", produce)
+        assert is_leader and not is_leader_too and follower is leader
+        late = [event async for event in follower.subscribe()]
+        events += [event async for event in first]
+        assert late == events == [(TOKEN, str(i)) for i in range(4)]
+
+        # Everyone disconnects: the step is cancelled
+        flight, _ = flights.join("k2", produce)
+        stream = flight.subscribe()
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        assert flight.task.cancelled()
+        assert len(flights) == 0
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+import numpy as np
+from langchain.docstore.document import Document
+
+from src.r41_bot.dense_index import DenseIndex
+
+
+def _index(n=50, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim))
+    docs = [Document(page_content=f"chunk {i}", metadata={"source": "kb.md"}) for i in range(n)]
+    return DenseIndex.build(docs, vectors, ids=[f"id{i}" for i in range(n)]), rng
+
+
+def test_exact_top_k_matches_brute_force():
+    index, rng = _index()
+    query = rng.normal(size=8)
+    hits = index.search_many([query], k=5)[0]
+
+    expected = np.argsort(-(index.vectors @ (query / np.linalg.norm(query))))[:5]
+    assert [i for i, _ in hits] == expected.tolist()
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+
+
+def test_batched_search_equals_single_queries():
+    index, rng = _index()
+    queries = rng.normal(size=(3, 8))
+    batched = index.search_many(queries, k=4)
+    single = [index.search_many([q], k=4)[0] for q in queries]
+    assert [[i for i, _ in hits] for hits in batched] == [[i for i, _ in hits] for hits in single]
+    np.testing.assert_allclose([[s for _, s in hits] for hits in batched], [[s for _, s in hits] for hits in single], rtol=1e-5)
+
+
+def test_save_load_memory_maps_vectors(tmp_path):
+    index, rng = _index()
+    index.save(str(tmp_path))
+    loaded = DenseIndex.load(str(tmp_path))
+
+    assert isinstance(loaded.vectors, np.memmap)
+    query = rng.normal(size=8)
+    docs = loaded.similarity_search_by_vector(query, k=2)
+    assert [d.page_content for d in docs] == [index.document(i).page_content for i, _ in index.search_many([query], 2)[0]]
+    assert docs[0].id.startswith("id")
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+from langchain_community.embeddings import FastEmbedEmbeddings
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.r41_bot.embedder import BatchingEmbedder
+
+
+class CountingModel:
+    """Mimics FastEmbed's TextEmbedding.query_embed, recording every batch."""
+
+    def __init__(self, fail: bool = False):
+        self.embedding = DeterministicFakeEmbedding(size=8)
+        self.batches = []
+        self.fail = fail
+
+    def query_embed(self, texts, batch_size=256, parallel=None):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        time.sleep(0.01)
+        return [np.asarray(self.embedding.embed_query(t)) for t in texts]
+
+
+def _embedder(**kwargs):
+    model = CountingModel(**kwargs)
+    # The langchain wrapper around the stub model, without loading a real one
+    base = FastEmbedEmbeddings.model_construct(model=model)
+    return BatchingEmbedder(base, max_batch=16, max_wait=0.02), model
+
+
+def test_concurrent_queries_share_one_batch_and_the_cache():
+    embedder, model = _embedder()
+    questions = [f"question {i % 5}" for i in range(12)]
+    results = [None] * len(questions)
+
+    def ask(i):
+        results[i] = embedder.embed_query(questions[i])
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(questions))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Duplicates are embedded once, and far fewer calls than callers
+    assert sum(len(b) for b in model.batches) == 5
+    assert len(model.batches) <= 2
+    assert results[0] == pytest.approx(model.embedding.embed_query("question 0"))
+
+    # Recent queries come from the LRU cache
+    calls = len(model.batches)
+    assert embedder.embed_query("question 3") == pytest.approx(results[3], rel=1e-6)
+    assert len(model.batches) == calls
+
+
+def test_async_callers_and_errors():
+    embedder, model = _embedder()
+
+    async def burst():
+        return await asyncio.gather(*(embedder.aembed_query(f"q{i}") for i in range(10)))
+
+    vectors = asyncio.run(burst())
+    assert len(vectors) == 10 and len(model.batches) == 1
+
+    failing, _ = _embedder(fail=True)
+    with pytest.raises(RuntimeError, match="model crashed"):
+        failing.embed_many(["a", "b"])
+
+
+def test_cancelled_caller_does_not_stop_the_batcher():
+    embedder, model = _embedder()
+
+    async def cancel_one():
+        task = asyncio.create_task(embedder.aembed_query("abandoned"))
+        await asyncio.sleep(0.005)
+        # A client disconnect cancels the step while its query is queued
+        task.cancel()
+        await asyncio.sleep(0.1)
+        return await asyncio.wait_for(embedder.aembed_query("next"), timeout=2)
+
+    assert len(asyncio.run(cancel_one())) == 8
+    assert embedder._worker.is_alive()
+    assert ["abandoned"] not in model.batches
@@ -0,0 +1,80 @@
+import asyncio
+
+from src.r41_bot.chunking import split_markdown
+from src.r41_bot.facts import FactIndex, extract_facts, save_facts
+from src.r41_bot.fake_llm import ScriptedChatModel
+
+
+BUREAU = """# Club Bureau for the 2023-2024 Academic Year
+
+- **President** Achraf Oujjir
+- **Vice President** Salma Bouziane Ouaritini
+- **Treasurer** Latifa Ait Alla
+"""
+
+BUREAU_2025 = """# Club Bureau for the 2025-2026 Academic Year (current year)
+
+- **President:** Badr Kandri
+- **Robotics Lead** Mohamed Reda Zrik
+"""
+
+EVENTS = """# Events for the 2024-2025 Academic Year
+
+## Data Connect Day
+
+**Date:** December 7, 2024
+**Speakers:** Achraf Oujjir, Othman Moussaoui
+**Description:** Alumni of the Big Data program.
+
+## Closing Ceremony & Delivery of Certificates
+
+**Date:** June 2025 (approximated)
+**Description:** A ceremony to celebrate the year.
+"""
+
+
+def _facts(tmp_path):
+    chunks = (
+        split_markdown(BUREAU, {"category": "bureau", "academic_year": "2023-2024"})
+        + split_markdown(BUREAU_2025, {"category": "bureau", "academic_year": "2025-2026"})
+        + split_markdown(EVENTS, {"category": "events", "academic_year": "2024-2025"})
+    )
+    roles, entries = extract_facts(chunks)
+    path = str(tmp_path / "facts.sqlite3")
+    save_facts(path, roles, entries)
+    return FactIndex.load(path)
+
+
+def test_lookups_answered_from_the_fact_table(tmp_path):
+    facts = _facts(tmp_path)
+    assert len(facts) == 5 + 2
+
+    assert facts.answer("Who was the treasurer in 2023-2024?") == "Treasurer of the R41 bureau (2023-2024): Latifa Ait Alla."
+    # The longest matching role wins; without a year, the latest bureau
+    assert facts.answer("Who is the vice president?") == "Vice President of the R41 bureau (2023-2024): Salma Bouziane Ouaritini."
+    assert facts.answer("who is the president?") == "President of the R41 bureau (2025-2026): Badr Kandri."
+    assert facts.answer("Who leads robotics in 2025-2026?") == "Robotics Lead of the R41 bureau (2025-2026): Mohamed Reda Zrik."
+    assert facts.answer("When was Data Connect Day?") == "Date of Data Connect Day (2024-2025): December 7, 2024."
+    assert facts.answer("Who spoke at Data Connect Day?").startswith("Speakers at Data Connect Day (2024-2025): Achraf Oujjir")
+
+    # No record, or a record without the field: RAG answers instead
+    assert facts.answer("Who founded the club?") is None
+    assert facts.answer("Who spoke at the closing ceremony?") is None
+    assert facts.answer("Who was the treasurer in 2019-2020?") is None
+
+
+async def _events(pipeline, question):
+    return [event async for event in pipeline.aevents(question, [])]
+
+
+def test_fact_route_skips_generation_and_falls_back_to_rag(make_pipeline, tmp_path):
+    # The scripted fake routes single-fact questions to fact_lookup
+    llm = ScriptedChatModel(latency=0.01, token_delay=0)
+    pipeline = make_pipeline(llm=llm, planner=False, fastpath=False, facts=_facts(tmp_path))
+
+    events = asyncio.run(_events(pipeline, "who was the treasurer in 2023-2024?"))
+    assert [data for kind, data in events if kind == "stage"] == ["rewriting", "routing"]
+    assert [data for kind, data in events if kind == "token"] == ["Treasurer of the R41 bureau (2023-2024): Latifa Ait Alla."]
+
+    events = asyncio.run(_events(pipeline, "who was the treasurer in 2019-2020?"))
+    assert [data for kind, data in events if kind == "stage"][-2:] == ["retrieving", "generating"]
@@ -0,0 +1,49 @@
+import asyncio
+
+from src.r41_bot import chains
+from src.r41_bot.chains import get_llm
+from src.r41_bot.fake_llm import ScriptedChatModel
+from src.r41_bot.pipeline import IRRELEVANT_REPLY
+
+
+async def _events(pipeline, question):
+    return [event async for event in pipeline.aevents(question, [])]
+
+
+def _pipeline(monkeypatch, make_pipeline, planner):
+    monkeypatch.setattr(chains, "LLM_PROVIDER", "fake")
+    monkeypatch.setattr(chains, "FAKE_LLM_LATENCY", 0.01)
+    monkeypatch.setattr(chains, "FAKE_LLM_TOKEN_DELAY", 0.0)
+    # The provider's own get_llm: make_pipeline's stub LLM replaces chains.get_llm
+    get_llm.cache_clear()
+    try:
+        llm = get_llm()
+        # Wrapped in admission control (LLM_ADMISSION) unless disabled
+        assert isinstance(getattr(llm, "llm", llm), ScriptedChatModel)
+        return make_pipeline(llm=llm, planner=planner, fastpath=False)
+    finally:
+        get_llm.cache_clear()
+
+
+def test_fake_provider_runs_the_pipeline_end_to_end(monkeypatch, make_pipeline):
+    for planner in (False, True):
+        pipeline = _pipeline(monkeypatch, make_pipeline, planner)
+        events = asyncio.run(_events(pipeline, "who organized Data Connect Day?"))
+
+        stages = [data for kind, data in events if kind == "stage"]
+        assert stages[-2:] == ["retrieving", "generating"]
+        tokens = [data for kind, data in events if kind == "token"]
+        assert len(tokens) > 10
+        assert "who organized Data Connect Day?" in "".join(tokens)
+
+        events = asyncio.run(_events(pipeline, "what's the weather tomorrow?"))
+        assert [data for kind, data in events if kind == "token"] == [IRRELEVANT_REPLY]
+
+
+def test_only_single_fact_questions_are_routed_to_fact_lookup():
+    llm = ScriptedChatModel(latency=0, token_delay=0)
+    route = lambda q: llm.reply(f'You are an expert at routing a user question.\nUser question: "{q}"')
+    assert route("Who is the president for the 2024-2025 academic year?") == '{"route": "fact_lookup"}'
+    assert route("When did Data Connect Day take place?") == '{"route": "fact_lookup"}'
+    assert route("Who can join the club?") == '{"route": "vector_search"}'
+    assert route("Where can I find the club's events?") == '{"route": "vector_search"}'
@@ -0,0 +1,71 @@
+import os
+
+from src.r41_bot.faq_fastpath import FaqIndex
+
+
+def _write_faq(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("question,answer\n")
+        for q, a in rows:
+            f.write(f'"{q}","{a}"\n')
+
+
+def test_missing_file_disables_fastpath(tmp_path):
+    index = FaqIndex(str(tmp_path / "faq.csv"))
+    assert index.match("how do I join the club?") is None
+
+
+def test_match_returns_aligned_answer(tmp_path):
+    path = tmp_path / "faq.csv"
+    _write_faq(path, [("How do I join R41?", "Fill the form."), ("Who founded R41?", "The founders.")])
+    index = FaqIndex(str(path))
+
+    assert index.match("who FOUNDED r41 ??") == "The founders."
+    assert index.match("what's the weather like in Paris") is None
+
+
+def test_hot_reload_on_change(tmp_path):
+    path = tmp_path / "faq.csv"
+    _write_faq(path, [("How do I join R41?", "Fill the form.")])
+    index = FaqIndex(str(path))
+    assert index.match("how do I join R41") == "Fill the form."
+
+    _write_faq(path, [("How do I join R41?", "Send us a DM.")])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert index.match("how do I join R41") == "Send us a DM."
+
+    os.remove(path)
+    assert index.match("how do I join R41") is None
+
+
+def test_malformed_file_disables_fastpath_until_fixed(tmp_path, capsys):
+    path = tmp_path / "faq.csv"
+    path.write_text("q,a\nHow do I join R41?,Fill the form.\n", encoding="utf-8")
+    index = FaqIndex(str(path))
+
+    assert index.match("how do I join R41") is None
+    assert index.match("how do I join R41") is None
+    assert capsys.readouterr().out.count("FAQ fast path disabled") == 1
+
+    _write_faq(path, [("How do I join R41?", "Fill the form.")])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert index.match("how do I join R41") == "Fill the form."
+
+
+def test_short_rows_are_skipped(tmp_path):
+    path = tmp_path / "faq.csv"
+    path.write_text("question,answer\nHow do I join R41?\nWho founded R41?,The founders.\n", encoding="utf-8")
+    index = FaqIndex(str(path))
+    assert index.match("who founded r41") == "The founders."
+    assert index.match("how do I join R41") is None
+
+
+def test_undecodable_file_disables_fastpath_once(tmp_path, capsys):
+    path = tmp_path / "faq.csv"
+    path.write_bytes(b"question,answer\n\xff\xfe join?,Fill the form.\n")
+    index = FaqIndex(str(path))
+    assert index.match("how do I join R41") is None
+    assert index.match("how do I join R41") is None
+    assert capsys.readouterr().out.count("FAQ fast path disabled") == 1
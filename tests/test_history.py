@@ -0,0 +1,108 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.r41_bot.chains import estimate_tokens
+from src.r41_bot.history import HistoryManager, normalize_history
+
+
+def _conversation(turns, length=40):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i} " + "q" * length})
+        messages.append({"role": "assistant", "content": f"answer {i} " + "a" * length})
+    return messages
+
+
+def _manager(calls, **kwargs):
+    def summarize(inputs):
+        calls.append(inputs["new_lines"])
+        return f"{inputs['summary']} + {inputs['new_lines'].count('User:')} turns"
+
+    return HistoryManager(RunnableLambda(summarize), **kwargs)
+
+
+def test_short_history_is_untouched():
+    calls = []
+    history = _conversation(2)
+    assert _manager(calls, max_turns=4).prepare(history) == history
+    assert calls == []
+
+
+def test_older_turns_are_summarized_incrementally():
+    calls = []
+    manager = _manager(calls, max_turns=2, token_budget=10_000)
+    history = _conversation(5)
+
+    prepared = manager.prepare(history)
+    assert prepared[0]["role"] == "system"
+    assert prepared[1:] == history[-4:]
+    assert len(calls) == 1 and calls[0].count("User:") == 3
+
+    # Next turn: only the newly aged-out turn is summarized
+    history += _conversation(6)[-2:]
+    manager.prepare(history)
+    assert len(calls) == 2 and calls[1].count("User:") == 1
+
+
+def test_prompt_size_stays_flat_as_conversation_grows():
+    calls = []
+    manager = _manager(calls, max_turns=3, token_budget=200)
+    sizes = [
+        sum(estimate_tokens(m["content"]) for m in manager.prepare(_conversation(turns, length=200)))
+        for turns in (10, 50, 200)
+    ]
+    assert max(sizes) <= 200
+
+
+def test_async_path_does_not_wait_for_summary():
+    calls = []
+    manager = _manager(calls, max_turns=1, token_budget=10_000)
+    history = _conversation(3)
+
+    async def run():
+        first = await manager.aprepare(history)
+        while manager._pending:  # let the background summary finish
+            await asyncio.sleep(0.01)
+        second = await manager.aprepare(history)
+        return first, second
+
+    first, second = asyncio.run(run())
+    # First turn: no summary yet, the aged-out lines are still sent verbatim
+    assert first == history
+    assert second[0]["role"] == "system" and second[1:] == history[-2:]
+    assert len(calls) == 1
+
+
+def test_normalizes_langchain_messages():
+    assert normalize_history([HumanMessage(content="hi"), AIMessage(content="hello")]) == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+    ]
+
+
+def test_summary_survives_the_session_window_sliding():
+    from src.r41_bot.sessions import InMemorySessionStore
+
+    calls = []
+    manager = _manager(calls, max_turns=2, token_budget=10_000)
+    store = InMemorySessionStore(max_turns=5)
+    for i in range(12):
+        store.append_turn("s", f"question {i}", f"answer {i}")
+        offset, history = store.get_window("s")
+        manager.prepare(history, "s", offset)
+
+    # Past 5 turns the oldest slide out, but each turn still summarizes only the newly aged-out one
+    assert [c.count("User:") for c in calls] == [1] * 10
+    offset, _ = store.get_window("s")
+    assert offset == 14
+
+
+def test_oversized_summary_leaves_room_for_the_latest_message():
+    manager = HistoryManager(RunnableLambda(lambda inputs: "s" * 4000), max_turns=1, token_budget=100)
+    prepared = manager.prepare(_conversation(3, length=400))
+
+    assert prepared[0]["role"] == "system"
+    assert prepared[-1]["role"] == "assistant" and prepared[-1]["content"]
+    assert sum(estimate_tokens(m["content"]) for m in prepared) <= 100
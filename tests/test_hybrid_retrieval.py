@@ -0,0 +1,102 @@
+import asyncio
+
+import numpy as np
+
+from langchain.docstore.document import Document
+from langchain_chroma import Chroma
+from langchain_community.embeddings import FastEmbedEmbeddings
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.r41_bot.bm25_index import BM25Index, BM25IndexRetriever
+from src.r41_bot.chains import format_context, estimate_tokens
+from src.r41_bot.prompts import NO_INFO_REPLY
+from src.r41_bot.retriever import HybridRetriever, reciprocal_rank_fusion, select_hits
+
+DOCS = [
+    Document(page_content="- **President** Ait Alla Latifa"),
+    Document(page_content="- **Treasurer** Tahir Aboubakr"),
+    Document(page_content="## Data Connect Day\nAlumni of the Big Data program"),
+    Document(page_content="## Machine Learning Training\n**Mentor:** Salma Bouziane"),
+]
+
+
+class BatchModel:
+    """Mimics FastEmbed's TextEmbedding.query_embed."""
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+        self.calls = 0
+
+    def query_embed(self, texts, batch_size=256, parallel=None):
+        self.calls += 1
+        return [np.asarray(self.embedding.embed_query(t)) for t in texts]
+
+
+def _retriever(tmp_path):
+    embedding = DeterministicFakeEmbedding(size=16)
+    store = Chroma.from_documents(DOCS, embedding, persist_directory=str(tmp_path))
+    keyword = BM25IndexRetriever(index=BM25Index.build(DOCS), k=2)
+    return HybridRetriever(vectorstore=store, keyword_retriever=keyword, embedding=embedding, k=2)
+
+
+def test_rrf_merges_and_dedupes():
+    a, b, c = DOCS[:3]
+    fused = reciprocal_rank_fusion([(1.0, [a, b]), (1.0, [b, c])])
+    assert [doc for doc, _ in fused][0] is b
+    assert len(fused) == 3
+
+
+def test_sub_questions_embedded_in_one_batch(tmp_path):
+    retriever = _retriever(tmp_path)
+    model = BatchModel(retriever.embedding)
+    retriever.embedding = FastEmbedEmbeddings.model_construct(model=model)
+
+    questions = ["who is the president?", "who is the treasurer?", "what is Data Connect Day?"]
+    docs = asyncio.run(retriever.arank_many(questions))
+
+    assert model.calls == 1
+    contents = [d.page_content for d in docs]
+    assert len(contents) == len(set(contents))
+    assert "- **Treasurer** Tahir Aboubakr" in contents
+
+
+def test_context_respects_token_budget():
+    docs = [Document(page_content="x" * 400) for _ in range(10)]
+    context = format_context(docs, max_tokens=250)
+    assert estimate_tokens(context) <= 250 + 1
+    assert context.count("x" * 400) == 2
+
+    # A single oversized best hit is truncated rather than dropped
+    assert format_context([Document(page_content="y" * 4000)], max_tokens=100) == "y" * 400
+
+
+def test_score_floor_and_gap_adapt_k():
+    a, b, c, d = DOCS
+    # Hits under the floor are dropped, whatever k is
+    assert select_hits([(a, 0.6), (b, 0.55), (c, 0.02)], k=3, floor=0.05, gap=0.2) == [(a, 0.6), (b, 0.55)]
+    # One clear winner: cut at the largest drop
+    assert select_hits([(a, 0.8), (b, 0.3), (c, 0.25), (d, 0.2)], k=4, floor=0.05, gap=0.2) == [(a, 0.8)]
+    # Nothing relevant at all
+    assert select_hits([(a, 0.03)], k=3, floor=0.05, gap=0.2) == []
+
+    # BM25 scores are normalized to [0, 1]
+    keyword = BM25IndexRetriever(index=BM25Index.build(DOCS), k=4)
+    scores = [score for _, score in keyword.search_with_scores("who is the treasurer?")]
+    assert all(0 < score <= 1 for score in scores)
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_no_relevant_chunk_skips_generation(make_pipeline, stub_llm, tmp_path):
+    stub_llm.latency = 0
+    retriever = _retriever(tmp_path)
+    # A floor no chunk clears
+    retriever.score_floor = 1.01
+    pipeline = make_pipeline(retriever=retriever, planner=False, fastpath=False)
+
+    async def run():
+        return [event async for event in pipeline.aevents("who is the current president?", [])]
+
+    events = asyncio.run(run())
+    assert [data for kind, data in events if kind == "stage"][-1] == "retrieving"
+    assert [data for kind, data in events if kind == "token"] == [NO_INFO_REPLY]
+    assert pipeline.invoke("who is the current president?", []) == NO_INFO_REPLY
@@ -0,0 +1,82 @@
+import importlib.util
+import os
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.r41_bot.index_store import acquire_lease, index_version, live_index_dir, load_manifest, publish, release_lease
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "..", "scripts", "index_faq.py")
+
+
+def _load_indexer(monkeypatch, tmp_path):
+    spec = importlib.util.spec_from_file_location("index_faq", SCRIPT)
+    indexer = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(indexer)
+
+    kb = tmp_path / "data" / "knowledge_base" / "bureau"
+    kb.mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(indexer, "VECTOR_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(indexer, "FastEmbedEmbeddings", lambda **kwargs: DeterministicFakeEmbedding(size=16))
+    monkeypatch.setattr("sys.argv", ["index_faq.py"])
+    return indexer, kb
+
+
+def _chunk_count(vector_dir):
+    store = Chroma(persist_directory=live_index_dir(vector_dir), embedding_function=DeterministicFakeEmbedding(size=16))
+    return len(store.get()["ids"])
+
+
+def test_incremental_reindex(monkeypatch, tmp_path):
+    indexer, kb = _load_indexer(monkeypatch, tmp_path)
+    vector_dir = indexer.VECTOR_DIR
+    (kb / "2023-2024.md").write_text("# Bureau 2023-2024\n\n- **President** A\n", encoding="utf-8")
+    (kb / "2024-2025.md").write_text("# Bureau 2024-2025\n\n- **President** B\n", encoding="utf-8")
+
+    indexer.main()
+    first = index_version(vector_dir)
+    assert _chunk_count(vector_dir) == 2
+
+    # Nothing changed: no new generation
+    indexer.main()
+    assert index_version(vector_dir) == first
+
+    embedded = []
+    original_split = indexer.split_file
+    monkeypatch.setattr(indexer, "split_file", lambda path, splitter: embedded.append(path) or original_split(path, splitter))
+
+    # One file edited, one removed, one added
+    (kb / "2024-2025.md").write_text("# Bureau 2024-2025\n\n- **President** C\n", encoding="utf-8")
+    os.remove(kb / "2023-2024.md")
+    (kb / "2025-2026.md").write_text("# Bureau 2025-2026\n\n- **President** D\n", encoding="utf-8")
+    indexer.main()
+
+    assert index_version(vector_dir) != first
+    assert sorted(embedded) == ["data/knowledge_base/bureau/2024-2025.md", "data/knowledge_base/bureau/2025-2026.md"]
+    assert _chunk_count(vector_dir) == 2
+    manifest = load_manifest(live_index_dir(vector_dir))
+    assert sorted(manifest["files"]) == embedded
+    assert os.path.isdir(os.path.join(live_index_dir(vector_dir), "bm25"))
+    assert os.path.isdir(os.path.join(live_index_dir(vector_dir), "dense"))
+    # The previous generation is kept for readers that still have it open
+    assert len([n for n in os.listdir(vector_dir) if n.startswith("gen-")]) == 2
+
+
+def test_leased_generations_survive_reindexes(tmp_path):
+    vector_dir = str(tmp_path)
+
+    def build(generation):
+        os.makedirs(tmp_path / generation)
+        publish(generation, vector_dir)
+
+    build("gen-0")
+    # A server serves gen-0 while two reindexes are published
+    acquire_lease(str(tmp_path / "gen-0"))
+    build("gen-1")
+    build("gen-2")
+    assert sorted(n for n in os.listdir(vector_dir) if n.startswith("gen-")) == ["gen-0", "gen-1", "gen-2"]
+
+    release_lease(str(tmp_path / "gen-0"))
+    build("gen-3")
+    assert sorted(n for n in os.listdir(vector_dir) if n.startswith("gen-")) == ["gen-2", "gen-3"]
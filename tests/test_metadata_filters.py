@@ -0,0 +1,64 @@
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.r41_bot.bm25_index import BM25Index, BM25IndexRetriever
+from src.r41_bot.dense_index import DenseIndex
+from src.r41_bot.metadata import extract_filters, matches, path_metadata
+from src.r41_bot.retriever import HybridRetriever
+
+DOCS = [
+    Document(page_content="- **President** Ait Alla Latifa", metadata={"category": "bureau", "academic_year": "2024-2025"}),
+    Document(page_content="- **President** Hamza Idrissi", metadata={"category": "bureau", "academic_year": "2025-2026"}),
+    Document(page_content="## Data Connect Day\nThe president opened the day", metadata={"category": "events", "academic_year": "2024-2025"}),
+    Document(page_content="R41 is the AI club of ENSA Berrechid", metadata={"category": "general", "academic_year": ""}),
+]
+
+
+def test_path_metadata_and_question_filters():
+    assert path_metadata("data/knowledge_base/bureau/2024-2025.md") == {"category": "bureau", "academic_year": "2024-2025"}
+    assert path_metadata("data/knowledge_base/general/club_info.md") == {"category": "general", "academic_year": ""}
+
+    assert extract_filters("Who was the president of the bureau in 2024-2025?") == {
+        "academic_year": ["2024-2025"],
+        "category": ["bureau"],
+    }
+    # Several categories mentioned: only the year is used
+    assert extract_filters("Which bureau members spoke at events in 2023-2024?") == {"academic_year": ["2023-2024"]}
+    assert extract_filters("How can I join the club?") == {}
+
+    # Year-independent and general chunks always pass
+    assert matches(DOCS[3].metadata, {"category": ["bureau"], "academic_year": ["2025-2026"]})
+    assert not matches(DOCS[0].metadata, {"academic_year": ["2025-2026"]})
+
+
+def test_filters_prune_dense_and_bm25_candidates():
+    filters = {"category": ["bureau"], "academic_year": ["2025-2026"]}
+    index = BM25Index.build(DOCS)
+    assert [i for i, _ in index.search("president", k=4, filters=filters)] == [1]
+
+    vectors = np.random.default_rng(0).normal(size=(len(DOCS), 8))
+    dense = DenseIndex.build(DOCS, vectors, ids=[str(i) for i in range(len(DOCS))])
+    hits = dense.similarity_search_by_vector(vectors[0], k=4, filters=filters)
+    assert {d.page_content for d in hits} == {DOCS[1].page_content, DOCS[3].page_content}
+
+
+def test_hybrid_filters_chroma_and_falls_back_when_nothing_matches(tmp_path):
+    embedding = DeterministicFakeEmbedding(size=16)
+    # Without the general chunk, which passes every filter
+    docs = DOCS[:3]
+    store = Chroma.from_documents(docs, embedding, persist_directory=str(tmp_path))
+    keyword = BM25IndexRetriever(index=BM25Index.build(docs), k=4)
+    # Score thresholds off: "president" is in every chunk, so its BM25 scores are near zero
+    retriever = HybridRetriever(
+        vectorstore=store, keyword_retriever=keyword, embedding=embedding, k=4, score_floor=0.0, score_gap=1.0
+    )
+
+    docs = retriever.rank_many(["who is the president?"], {"academic_year": ["2024-2025"]})
+    assert DOCS[1].page_content not in [d.page_content for d in docs]
+    assert all(d.metadata["academic_year"] == "2024-2025" for d in docs)
+
+    # No chunk for that year at all: unfiltered results rather than none
+    docs = retriever.rank_many(["who is the president?"], {"academic_year": ["1999-2000"]})
+    assert DOCS[1].page_content in [d.page_content for d in docs]
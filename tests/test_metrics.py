@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+from src.r41_bot import tracing
+from src.r41_bot.metrics import Histogram
+
+
+async def _answer(pipeline, question):
+    return "".join([chunk async for chunk in pipeline.astream(question, [])])
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("h", "Test.", (1, 5), ("stage",))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value, "a")
+    lines = histogram.render()
+    assert 'h_bucket{stage="a",le="1"} 2' in lines
+    assert 'h_bucket{stage="a",le="5"} 3' in lines
+    assert 'h_bucket{stage="a",le="+Inf"} 4' in lines
+    assert 'h_count{stage="a"} 4' in lines
+
+
+def test_request_trace_covers_every_stage(make_pipeline, monkeypatch, tmp_path):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_LOG_PATH", str(path))
+    pipeline = make_pipeline()
+
+    asyncio.run(_answer(pipeline, "who is the current president?"))
+
+    record = json.loads(path.read_text().splitlines()[-1])
+    assert record["source"] == "rag"
+    assert record["ttft_ms"] <= record["total_ms"]
+    timed = {span["stage"] for span in record["spans"] if "ms" in span}
+    assert timed == {"rewrite", "route", "decomposition", "retrieval", "context", "generation"}
+    llm_calls = [span for span in record["spans"] if span.get("llm")]
+    assert {span["stage"] for span in llm_calls} == {"rewrite", "route", "decomposition", "generation"}
+    assert all(span["prompt_tokens"] > 0 and span["completion_tokens"] > 0 for span in llm_calls)
+    context = next(span for span in record["spans"] if span["stage"] == "context")
+    assert context["chars"] > 0
+
+    body = TestClient(main.app).get("/metrics").text
+    assert 'r41_stage_seconds_count{stage="retrieval"}' in body
+    assert 'r41_llm_tokens_bucket{stage="generation",kind="completion",le="+Inf"}' in body
+    assert 'r41_requests_total{source="rag"}' in body
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from src.r41_bot.chains import validate_plan
+from src.r41_bot.pipeline import IRRELEVANT_REPLY
+
+VALID_PLAN = '{"question": "who is the president for 2025-2026?", "route": "vector_search", "questions": ["Who is the president?"]}'
+
+
+@pytest.fixture
+def planned(make_pipeline, stub_llm):
+    """Returns `plan_with(reply)`: a planner pipeline whose planner call returns `reply`, and the stub LLM."""
+
+    def plan_with(reply):
+        stub_llm.latency = 0
+        stub_llm.replies["plan"] = reply
+        return make_pipeline(planner=True), stub_llm
+
+    return plan_with
+
+
+def test_planner_replaces_three_pre_pass_calls(planned):
+    pipeline, llm = planned(VALID_PLAN)
+    answer = "".join(asyncio.run(_collect(pipeline)))
+    assert "Ait Alla Latifa" in answer
+    # One planner call + one generation call
+    assert len(llm.prompts) == 2
+
+
+@pytest.mark.parametrize("reply", ["not json at all", '{"route": "vector_search"}', '{"question": "q", "route": "maybe"}'])
+def test_malformed_plan_falls_back_to_separate_chains(planned, reply):
+    pipeline, llm = planned(reply)
+    answer = pipeline.invoke("who is the current president?", [])
+    assert "Ait Alla Latifa" in answer
+    # Planner + rewriter + router + decomposition + generation
+    assert len(llm.prompts) == 5
+
+
+def test_validate_plan_routes_irrelevant(planned):
+    plan = validate_plan({"question": "capital of France?", "route": "irrelevant"})
+    assert plan["questions"] == []
+
+    pipeline, _ = planned('{"question": "capital of France?", "route": "irrelevant", "questions": []}')
+    assert pipeline.invoke("capital of France?", []) == IRRELEVANT_REPLY
+
+
+async def _collect(pipeline):
+    return [chunk async for chunk in pipeline.astream("who is the current president?", [])]
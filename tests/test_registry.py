@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from src.r41_bot.registry import Registry
+
+
+def test_pipeline_is_built_once_under_concurrency(monkeypatch):
+    registry = Registry()
+    builds = []
+
+    def fake_build():
+        builds.append(threading.get_ident())
+        registry._pipeline = object()
+        registry._state = "ready"
+
+    monkeypatch.setattr(registry, "_build", fake_build)
+
+    async def many():
+        return await asyncio.gather(*(registry.apipeline() for _ in range(8)))
+
+    pipelines = asyncio.run(many())
+    assert len(builds) == 1
+    assert all(p is pipelines[0] for p in pipelines)
+    assert registry.status()["ready"]
+
+
+def test_ready_endpoint_reports_warm_up_state(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr(main, "registry", registry)
+    # Without the lifespan context no warm-up runs, so nothing is loaded
+    client = TestClient(main.app)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["state"] == "cold"
+
+    registry._pipeline, registry._state = object(), "ready"
+    assert client.get("/ready").status_code == 200
+
+
+def test_new_index_generation_is_swapped_in_without_downtime(monkeypatch):
+    from src.r41_bot import index_store
+    registry = Registry(reload_interval=0.01)
+    live = ["gen-1"]
+    loads = []
+
+    def fake_load():
+        loads.append(live[0])
+        time.sleep(0.05)
+        return object(), (live[0], f"/index/{live[0]}")
+
+    monkeypatch.setattr(registry, "_load", fake_load)
+    monkeypatch.setattr(index_store, "index_version", lambda: live[0])
+    monkeypatch.setattr(index_store, "release_lease", lambda index_dir: None)
+
+    first = registry.pipeline()
+    live[0] = "gen-2"
+    time.sleep(0.02)
+    # The old pipeline keeps serving while the new one is built
+    assert registry.pipeline() is first
+    time.sleep(0.1)
+    assert registry.pipeline() is not first
+    assert registry.status()["index_version"] == "gen-2"
+    assert loads == ["gen-1", "gen-2"]
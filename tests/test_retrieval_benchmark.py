@@ -0,0 +1,15 @@
+"""
+Retrieval quality regression check on the labeled query set, with the
+BM25 side only (deterministic without the FastEmbed model).
+Run scripts/bench_retrieval.py for the full quality/latency report.
+"""
+from scripts.bench_retrieval import CONFIGS, DEFAULT, Corpus, build_retriever, evaluate, get_benchmark_embedding, load_queries
+
+
+def test_keyword_retrieval_recall_on_labeled_queries():
+    corpus = Corpus(get_benchmark_embedding("fake"))
+    config = {**DEFAULT, **CONFIGS["bm25_only"]}
+    result = evaluate(build_retriever(corpus, config), load_queries(), config["k"])
+
+    assert result["recall_at_k"] >= 0.95, result["misses"]
+    assert result["mrr"] >= 0.9
@@ -0,0 +1,62 @@
+import asyncio
+import re
+import zlib
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+
+from src.r41_bot.chains import build_router_chain
+from src.r41_bot.router import LocalRouter, load_route_examples
+
+
+class BagOfWordsEmbedding(Embeddings):
+    """Hashed word counts: unlike random fake embeddings, similar questions get similar vectors."""
+
+    def _vector(self, text):
+        vector = np.zeros(256)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode()) % 256] += 1
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def test_local_router_learns_routes_from_labeled_questions(tmp_path):
+    embedding = BagOfWordsEmbedding()
+    router = LocalRouter.train(embedding, load_route_examples())
+    held_out = load_route_examples("data/eval/route_queries.jsonl")
+
+    correct = sum(router.route(q["question"])[0] == q["route"] for q in held_out)
+    assert correct / len(held_out) >= 0.75
+
+    path = str(tmp_path / "router.npz")
+    router.save(path)
+    loaded = LocalRouter.load(path, embedding)
+    assert loaded.routes == router.routes
+    assert loaded.route("Tell me a joke") == router.route("Tell me a joke")
+
+
+def test_llm_router_only_asked_when_local_router_is_unsure(stub_llm):
+    # The stub LLM routes everything to vector_search
+    stub_llm.latency = 0
+    router = LocalRouter.train(BagOfWordsEmbedding(), load_route_examples(), threshold=0.0, irrelevant_threshold=0.0)
+    inputs = {"question": "Tell me a joke", "chat_history": []}
+
+    assert build_router_chain(router).invoke(inputs) == {"route": "irrelevant"}
+    router.threshold = 1.01
+    assert asyncio.run(build_router_chain(router).ainvoke(inputs)) == {"route": "vector_search"}
+
+
+def test_chunks_are_embedded_as_queries_like_the_questions():
+    class QueryOnlyEmbedding(BagOfWordsEmbedding):
+        def embed_documents(self, texts):
+            raise AssertionError("passage embeddings are another space than routed questions")
+
+    chunks = [Document(page_content="## Data Connect Day\nAlumni of the Big Data program")]
+    router = LocalRouter.train(QueryOnlyEmbedding(), load_route_examples(), chunks)
+    assert router.route("Tell me about Data Connect Day")[0] == "vector_search"
@@ -0,0 +1,30 @@
+import json
+
+import serve
+
+
+def test_thread_budget_split_between_workers():
+    env = serve.worker_environment(workers=4, cpus=16)
+    assert env["EMBEDDING_THREADS"] == env["OMP_NUM_THREADS"] == "4"
+    assert env["VECTOR_BACKEND"] == "numpy"
+    assert env["SESSION_STORE"] == "sqlite"
+    # Never less than one thread
+    assert serve.worker_environment(workers=8, cpus=2)["EMBEDDING_THREADS"] == "1"
+
+
+def test_shared_index_needs_dense_and_bm25_in_a_generation(tmp_path):
+    assert not serve.shared_index_ready(str(tmp_path))
+
+    generation = tmp_path / "gen-1"
+    (generation / "dense").mkdir(parents=True)
+    (tmp_path / "CURRENT").write_text(json.dumps({"current": "gen-1"}), encoding="utf-8")
+    assert not serve.shared_index_ready(str(tmp_path))
+
+    (generation / "bm25").mkdir()
+    assert serve.shared_index_ready(str(tmp_path))
+
+
+def test_llm_admission_limits_are_split_between_workers():
+    env = serve.admission_environment(workers=4, max_concurrency=8, rate_limits="generation=60,prepass=120")
+    assert env == {"LLM_MAX_CONCURRENCY": "2", "LLM_RATE_LIMITS": "generation=15,prepass=30"}
+    assert serve.admission_environment(workers=16, max_concurrency=8, rate_limits="")["LLM_MAX_CONCURRENCY"] == "1"
@@ -0,0 +1,70 @@
+from fastapi.testclient import TestClient
+
+import main
+from src.r41_bot.registry import Registry
+from src.r41_bot.sessions import InMemorySessionStore, SqliteSessionStore
+
+
+class EchoPipeline:
+    """Answers with the number of history messages it was given."""
+
+    def __init__(self):
+        self.histories = []
+
+    async def aevents(self, question, chat_history, session_id=None, history_offset=None):
+        self.histories.append(chat_history)
+        yield "token", f"{len(chat_history)} messages before '{question}'"
+
+
+def test_memory_store_keeps_recent_turns_and_evicts_lru():
+    store = InMemorySessionStore(ttl=3600, max_sessions=2, max_turns=2)
+    for i in range(3):
+        store.append_turn("a", f"q{i}", f"a{i}")
+    assert [m["content"] for m in store.get_history("a")] == ["q1", "a1", "q2", "a2"]
+
+    store.append_turn("b", "q", "a")
+    store.append_turn("c", "q", "a")
+    assert store.get_history("a") == []
+    assert len(store.get_history("c")) == 2
+
+
+def test_expired_sessions_are_dropped(tmp_path):
+    for store in (InMemorySessionStore(ttl=-1), SqliteSessionStore(str(tmp_path / "s.db"), ttl=-1)):
+        store.append_turn("a", "q", "a")
+        assert store.get_history("a") == []
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    SqliteSessionStore(path, max_turns=2).append_turn("a", "q0", "a0")
+    other = SqliteSessionStore(path, max_turns=2)
+    other.append_turn("a", "q1", "a1")
+    other.append_turn("a", "q2", "a2")
+
+    history = SqliteSessionStore(path, max_turns=2).get_history("a")
+    assert history == [
+        {"role": "user", "content": "q1"},
+        {"role": "assistant", "content": "a1"},
+        {"role": "user", "content": "q2"},
+        {"role": "assistant", "content": "a2"},
+    ]
+
+
+def test_chat_endpoint_keeps_history_server_side(monkeypatch):
+    pipeline = EchoPipeline()
+    registry = Registry()
+    registry._pipeline, registry._state = pipeline, "ready"
+    monkeypatch.setattr(main, "registry", registry)
+    monkeypatch.setattr(main, "sessions", InMemorySessionStore())
+    client = TestClient(main.app)
+
+    for question in ("hi", "who is the president?", "and the treasurer?"):
+        response = client.post("/chat", json={"question": question, "session_id": "s1"})
+        assert response.status_code == 200
+
+    assert [len(h) for h in pipeline.histories] == [0, 2, 4]
+    assert pipeline.histories[-1][-1]["content"] == "2 messages before 'who is the president?'"
+
+    # Requests without a session_id still use the history they carry
+    client.post("/chat", json={"question": "x", "chat_history": [{"role": "human", "content": "hey"}]})
+    assert len(pipeline.histories[-1]) == 1
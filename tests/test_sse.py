@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+from src.r41_bot.registry import Registry
+from src.r41_bot.sse import HEARTBEAT, with_heartbeats
+
+
+def _parse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_streams_stages_tokens_and_timings(make_pipeline, monkeypatch):
+    registry = Registry()
+    registry._pipeline, registry._state = make_pipeline(), "ready"
+    monkeypatch.setattr(main, "registry", registry)
+    client = TestClient(main.app)
+
+    response = client.post("/chat", json={"question": "who is the current president?"})
+    events = _parse(response.text)
+
+    stages = [data["stage"] for kind, data in events if kind == "stage"]
+    assert stages == ["rewriting", "routing", "retrieving", "generating"]
+    # Progress is reported before the first token
+    assert events[0][0] == "stage"
+    answer = "".join(data["text"] for kind, data in events if kind == "token")
+    assert "Ait Alla Latifa" in answer
+
+    kind, done = events[-1]
+    assert kind == "done"
+    assert set(done["stages"]) == set(stages)
+    assert done["ttft_ms"] <= done["total_ms"]
+
+
+async def _slow_events(log):
+    try:
+        yield "first"
+        await asyncio.sleep(0.25)
+        yield "second"
+        await asyncio.sleep(10)
+        yield "never"
+    except asyncio.CancelledError:
+        log.append("cancelled")
+        raise
+
+
+async def _consume(n):
+    log = []
+    stream = with_heartbeats(_slow_events(log), interval=0.1)
+    items = []
+    async for item in stream:
+        items.append(item)
+        if len([i for i in items if i != HEARTBEAT]) == n:
+            break
+    # What Starlette does when the client disconnects
+    await stream.aclose()
+    return items, log
+
+
+def test_heartbeats_fill_idle_gaps_and_disconnect_cancels_upstream():
+    items, log = asyncio.run(_consume(2))
+    assert items[0] == "first" and items[-1] == "second"
+    assert HEARTBEAT in items
+    assert log == []
+
+    async def _disconnect_mid_wait():
+        log = []
+        stream = with_heartbeats(_slow_events(log), interval=0.05)
+        assert await stream.__anext__() == "first"
+        assert await stream.__anext__() == HEARTBEAT
+        # The upstream step is now pending inside asyncio.sleep
+        await stream.aclose()
+        return log
+
+    assert asyncio.run(_disconnect_mid_wait()) == ["cancelled"]